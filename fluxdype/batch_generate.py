@@ -10,11 +10,26 @@ import json
 import time
 import uuid
 import random
+import hashlib
 import argparse
-import requests
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, wait as wait_futures
+
+from comfy_router import ServerRouter
+from comfy_ws import describe_sampling
+from conditioning_reuse import EncodeTimer, describe_reuse, group_repeats
+from latency_model import Estimate, ExecutionTimer, LatencyModel, format_duration, job_features, sampling_record
+from memory_sampler import MemorySampler, describe_memory
+from model_scheduler import ModelAffinityScheduler, model_signature
+from node_profiler import NodeProfiler
+from job_journal import DEFAULT_JOURNAL_PATH, SUBMITTED, SUCCESS, JobJournal, format_sampling_stats, item_key
+from prompt_source import PromptItem, PromptSource, output_slug, prompt_items
+from workflow_graph import canonicalize_workflow
+from workflow_template import WorkflowTemplate, slot
+from workflow_validator import WorkflowValidator
 
 # Configuration
 COMFY_HOST = "localhost"
@@ -31,6 +46,59 @@ RESOLUTIONS = {
     "story": (1080, 1920),         # Instagram/TikTok story
 }
 
+# Latent pixels one job may sample at once (RTX 3090 24GB with Flux FP8:
+# 4x 1024x1024 per batch, see TURBO_SPEED_OPTIMIZATION_GUIDE.md)
+LATENT_BATCH_BUDGET_MP = 4.2
+
+# Seconds a job may go without finishing before it is cancelled on the
+# server (pipelined: without any job finishing)
+JOB_TIMEOUT = 300
+
+# Packed batches are kept small enough that their estimated upper time stays
+# within this (below JOB_TIMEOUT)
+PACKED_JOB_MAX_SECONDS = 240
+
+# Prompts are reordered (by model and latent size, or to share text
+# encodings) within windows of this many, so a streamed prompt file is never
+# held in memory whole
+REORDER_WINDOW = 10000
+
+# A prompt's (resolution, quality preset, LoRA stack or None for the preset's)
+Profile = Tuple[tuple, str, Optional[Tuple[Tuple[str, float], ...]]]
+
+
+def parse_resolution(value: str) -> tuple:
+    """A RESOLUTIONS name or "WIDTHxHEIGHT" as (width, height)"""
+    if value in RESOLUTIONS:
+        return RESOLUTIONS[value]
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"unknown resolution {value!r} (use {', '.join(RESOLUTIONS)} or WIDTHxHEIGHT)") from None
+    if width % 8 or height % 8 or width <= 0 or height <= 0:
+        raise ValueError(f"resolution {value!r} must be positive multiples of 8")
+    return (width, height)
+
+
+def lora_dicts(loras: Optional[Tuple[Tuple[str, float], ...]]) -> Optional[List[Dict]]:
+    """A PromptItem LoRA stack in QUALITY_PRESETS form (None keeps the preset's)"""
+    return None if loras is None else [{"name": name, "strength": strength} for name, strength in loras]
+
+
+def describe_profile(profile: Profile) -> str:
+    """Short label of a profile, e.g. 512x512 fast, LoRAs: ultrafluxV1 0.8"""
+    (width, height), quality, loras = profile
+    if loras is None:
+        return f"{width}x{height} {quality}"
+    stack = ", ".join(f"{name.split('.')[0]} {strength:g}" for name, strength in loras)
+    return f"{width}x{height} {quality}, LoRAs: {stack or 'none'}"
+
+
+def max_latent_batch(resolution: tuple, budget_mp: float = LATENT_BATCH_BUDGET_MP) -> int:
+    """Largest batch_size whose latents fit the VRAM budget at this resolution"""
+    width, height = resolution
+    return max(1, int(budget_mp * 1_000_000 // (width * height)))
+
 # Quality presets
 QUALITY_PRESETS = {
     "ultra": {
@@ -73,20 +141,65 @@ QUALITY_PRESETS = {
 class BatchImageGenerator:
     """Batch image generation for ultra-realistic phone app content"""
 
-    def __init__(self, host: str = COMFY_HOST, port: int = COMFY_PORT):
+    def __init__(
+        self,
+        host: str = COMFY_HOST,
+        port: int = COMFY_PORT,
+        servers: Optional[List[str]] = None,
+        journal: Optional[JobJournal] = None,
+        free_on_timeout: bool = False,
+        profile_nodes: bool = False,
+        memory_interval: float = 0
+    ):
         self.host = host
         self.port = port
         self.base_url = f"http://{host}:{port}"
-        self.session_id = str(uuid.uuid4())
-        self.generated_images = []
+        # A resumed run reuses its journaled client_id so events for its
+        # still-queued jobs are delivered to this session
+        self.journal = journal
+        self.session_id = journal.client_id if journal else str(uuid.uuid4())
+        # Images of the current generate_batch() run are counted; per-image
+        # records are kept only for the --pack-variations mapping
+        self.images_submitted = 0
+        self.images_resumed = 0
+        self.images_finished: Dict[str, int] = {}  # job status -> images
+        self.packed_images: List[Dict] = []
+        self._keep_images = False
+        self._job_images: Dict[str, List[Dict]] = {}  # unfinished prompt_id -> its images
+        self._templates: Dict[Tuple, WorkflowTemplate] = {}
+        # Jobs go to the least-loaded server; a single host is a one-server router
+        self.router = ServerRouter(servers or [self.base_url], client_id=self.session_id)
+        # Measures text-encoder time and how much of it ComfyUI's cache saved
+        self.encode_timer = EncodeTimer()
+        self.router.add_listener(self.encode_timer)
+        # Execution times train the latency model behind the ETAs
+        self.latency = LatencyModel.load()
+        self.execution_timer = ExecutionTimer()
+        self.router.add_listener(self.execution_timer)
+        self._samples: Dict[Profile, Dict] = {}
+        self._submitted: Dict[str, Tuple[bytes, Tuple]] = {}
+        # ((resolution, quality, loras, batch_size), cold) -> [latency features, jobs not finished yet]
+        self._remaining: Dict[Tuple[Tuple, bool], List] = {}
+        # Unload models after interrupting a timed-out job (recovers from
+        # a stuck sampler or VRAM thrashing at the cost of a cold reload)
+        self.free_on_timeout = free_on_timeout
+        # (model, resolution, batch_size) of jobs whose sampling speed was measured
+        self._sampled = set()
+        # VRAM / RAM sampled on each server and attributed to its jobs
+        self.memory_samplers: List[MemorySampler] = []
+        if memory_interval > 0:
+            for server in self.router.servers:
+                sampler = MemorySampler(server.client, memory_interval)
+                server.tracker.add_listener(sampler)
+                self.memory_samplers.append(sampler)
+        # Per-node timing of every job, reported by class_type and job shape
+        self.node_profiler = NodeProfiler() if profile_nodes else None
+        if self.node_profiler:
+            self.router.add_listener(self.node_profiler)
 
     def check_server(self) -> bool:
         """Check if ComfyUI server is running"""
-        try:
-            response = requests.get(f"{self.base_url}/system_stats", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+        return self.router.ping()
 
     def create_workflow(
         self,
@@ -95,9 +208,20 @@ class BatchImageGenerator:
         resolution: tuple,
         quality: str = "high",
         seed: Optional[int] = None,
-        batch_size: int = 1
+        batch_size: int = 1,
+        latent_batch_index: Optional[int] = None,
+        filename_prefix: Optional[str] = None,
+        loras: Optional[List[Dict]] = None
     ) -> Dict:
-        """Create workflow JSON for image generation"""
+        """Create workflow JSON for image generation
+
+        loras ({"name", "strength"} dicts) replaces the preset's LoRA stack.
+        latent_batch_index re-renders a single image of a packed batch: with
+        the batch's seed it regenerates exactly that image's noise slice.
+        The graph is returned in canonical form (sorted LoRA stack, structural
+        node IDs) so every preset listing the same LoRAs builds the same graph
+        and ComfyUI's cache carries over between jobs.
+        """
 
         if seed is None:
             seed = random.randint(0, 2**32 - 1)
@@ -159,7 +283,7 @@ class BatchImageGenerator:
             },
             "7": {
                 "inputs": {
-                    "filename_prefix": f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                    "filename_prefix": filename_prefix or f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
                     "images": ["6", 0]
                 },
                 "class_type": "SaveImage"
@@ -170,7 +294,7 @@ class BatchImageGenerator:
         current_node_id = 10
         prev_model_node = "1"
 
-        for i, lora in enumerate(preset["loras"]):
+        for i, lora in enumerate(preset["loras"] if loras is None else loras):
             workflow[str(current_node_id)] = {
                 "inputs": {
                     "lora_name": lora["name"],
@@ -187,19 +311,44 @@ class BatchImageGenerator:
         # Update sampler to use the last LoRA node
         workflow["4"]["inputs"]["model"] = [prev_model_node, 0]
 
-        return {"prompt": workflow}
+        if latent_batch_index is not None:
+            workflow["5"]["inputs"]["batch_size"] = max(batch_size, latent_batch_index + 1)
+            workflow["8"] = {
+                "inputs": {
+                    "samples": ["5", 0],
+                    "batch_index": latent_batch_index,
+                    "length": 1
+                },
+                "class_type": "LatentFromBatch"
+            }
+            workflow["4"]["inputs"]["latent_image"] = ["8", 0]
+
+        return {"prompt": canonicalize_workflow(workflow)}
 
-    def submit_workflow(self, workflow: Dict) -> Optional[str]:
+    def workflow_template(self, resolution: tuple, quality: str, batch_size: int = 1,
+                          loras: Optional[Tuple[Tuple[str, float], ...]] = None) -> WorkflowTemplate:
+        """create_workflow compiled once per shape, with prompt, negative,
+        seed and filename_prefix slots"""
+        key = (resolution, quality, batch_size, loras)
+        if key not in self._templates:
+            workflow = self.create_workflow(slot("prompt"), slot("negative"), resolution, quality,
+                                            seed=slot("seed"), batch_size=batch_size,
+                                            filename_prefix=slot("filename_prefix"),
+                                            loras=lora_dicts(loras))
+            self._templates[key] = WorkflowTemplate.for_prompt(workflow, {})
+        return self._templates[key]
+
+    def submit_workflow(self, workflow: Union[Dict, bytes], affinity: Optional[str] = None) -> Optional[str]:
         """Submit workflow to ComfyUI and return prompt_id"""
         try:
-            response = requests.post(
-                f"{self.base_url}/prompt",
-                json=workflow,
-                timeout=10
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("prompt_id")
+            submitted = time.time()
+            result = self.router.submit(workflow, affinity=affinity)
+            prompt_id = result.get("prompt_id")
+            if prompt_id:
+                self.encode_timer.expect(prompt_id, workflow)
+                if self.node_profiler:
+                    self.node_profiler.expect(prompt_id, workflow, submitted)
+            return prompt_id
         except Exception as e:
             print(f"✗ Error submitting workflow: {e}")
             return None
@@ -207,41 +356,511 @@ class BatchImageGenerator:
     def check_status(self, prompt_id: str) -> Optional[Dict]:
         """Check if generation is complete"""
         try:
-            response = requests.get(f"{self.base_url}/history/{prompt_id}", timeout=5)
-            response.raise_for_status()
-            history = response.json()
+            history = self.router.history(prompt_id)
             return history.get(prompt_id)
         except:
             return None
 
-    def wait_for_completion(self, prompt_id: str, timeout: int = 300) -> bool:
-        """Wait for image generation to complete"""
-        start_time = time.time()
+    def get_queue_depth(self) -> Optional[int]:
+        """Number of jobs running or pending on the server (via /queue)"""
+        try:
+            return self.router.queue_depth()
+        except:
+            return None
 
+    def wait_for_completion(self, prompt_id: str, timeout: int = JOB_TIMEOUT) -> bool:
+        """Wait for image generation to complete (websocket events, polling fallback)"""
         print(f"  Generating (ID: {prompt_id[:8]}...)...", end="", flush=True)
 
-        while time.time() - start_time < timeout:
-            status = self.check_status(prompt_id)
-            if status:
-                print(" ✓ Complete")
-                return True
+        result = self.router.wait(prompt_id, timeout=timeout)
+
+        if result is None:
+            result, outcome = self.cancel_job(prompt_id, timeout)
+            if result is None:
+                print(f" ✗ Timeout ({outcome})")
+                return False
+        else:
+            self.finish_job(prompt_id, result)
+
+        if result["status"] != "success":
+            print(f" ✗ {result['status'].capitalize()}: {result['error']}")
+            return False
 
-            time.sleep(2)
-            print(".", end="", flush=True)
+        note = describe_reuse(self.encode_timer.job(prompt_id))
+        speed = ", ".join(filter(None, [describe_sampling(result.get("sampling")),
+                                        describe_memory(self.job_memory(prompt_id))]))
+        eta = self.eta()
+        print(f" ✓ Complete{f' ({speed})' if speed else ''}{f' [text encoders: {note}]' if note else ''}"
+              f"{f' {eta}' if eta else ''}")
+        return True
 
-        print(" ✗ Timeout")
-        return False
+    def sample_workflow(self, profile: Profile) -> Dict:
+        """API graph shared by every job of a profile, up to text, seed and
+        batch size (cached; for validation, latency features and scheduling)"""
+        if profile not in self._samples:
+            resolution, quality, loras = profile
+            self._samples[profile] = self.create_workflow("", "", resolution, quality, seed=0,
+                                                          loras=lora_dicts(loras))["prompt"]
+        return self._samples[profile]
+
+    def profile(self, item: PromptItem, resolution: tuple, quality: str) -> Profile:
+        """An item's profile: its overrides, else the run's resolution and quality"""
+        return (parse_resolution(item.resolution) if item.resolution else resolution,
+                item.preset or quality, item.loras)
+
+    def pack_size(self, resolution: tuple, quality: str,
+                  latent_budget_mp: float = LATENT_BATCH_BUDGET_MP,
+                  loras: Optional[Tuple[Tuple[str, float], ...]] = None) -> int:
+        """Variations per packed job: the VRAM cap, lowered if the latency
+        model expects a batch that large to overrun PACKED_JOB_MAX_SECONDS"""
+        limit = max_latent_batch(resolution, latent_budget_mp)
+        features = job_features(self.sample_workflow((resolution, quality, loras)))
+        return self.latency.largest_batch({**features, "cold": False}, limit, PACKED_JOB_MAX_SECONDS)
+
+    def survey(self, prompts: Iterable[Union[str, PromptItem]], resolution: tuple,
+               quality: str) -> Dict[Profile, int]:
+        """Prompts per profile after per-item overrides, in one streaming
+        pass; raises ValueError for an unknown resolution or preset"""
+        profiles: Dict[Profile, int] = {}
+        for item in prompt_items(prompts):
+            try:
+                profile = self.profile(item, resolution, quality)
+            except ValueError as e:
+                raise ValueError(f"Prompt {item.index}: {e}") from None
+            if profile[1] not in QUALITY_PRESETS:
+                raise ValueError(f"Prompt {item.index}: unknown preset {profile[1]!r} "
+                                 f"(use {', '.join(QUALITY_PRESETS)})")
+            profiles[profile] = profiles.get(profile, 0) + 1
+        return profiles
+
+    def estimate_run(self, profiles: Dict[Profile, int], variations: int,
+                     pack_variations: bool = False,
+                     latent_budget_mp: float = LATENT_BATCH_BUDGET_MP) -> Estimate:
+        """Latency estimate of the whole run (profiles from survey); also primes the per-job ETA"""
+        self._remaining = {}
+        for (resolution, quality, loras), prompts in profiles.items():
+            pack_size = self.pack_size(resolution, quality, latent_budget_mp, loras) if pack_variations else 1
+            features = job_features(self.sample_workflow((resolution, quality, loras)))
+            for first in range(0, variations, pack_size):
+                size = min(pack_size, variations - first)
+                shape = self._remaining.setdefault(((resolution, quality, loras, size), False),
+                                                   [{**features, "batch_size": size, "cold": False}, 0])
+                shape[1] += prompts
+        if profiles and variations > 0:
+            # The first job on each server loads the model
+            key = next(key for key, cold in self._remaining if not cold)
+            warm = self._remaining[(key, False)]
+            cold = min(len(self.router), warm[1])
+            warm[1] -= cold
+            self._remaining[(key, True)] = [{**warm[0], "cold": True}, cold]
+        return self.eta_estimate()
+
+    def eta_estimate(self) -> Estimate:
+        """Latency estimate of the jobs not finished yet"""
+        shapes = [shape for shape in self._remaining.values() if shape[1] > 0]
+        return self.latency.estimate_batch([features for features, _ in shapes],
+                                           [count for _, count in shapes])
+
+    def job_finished(self, shape: Optional[Tuple]):
+        """Take one job of shape (resolution, quality, loras, batch_size) off the remaining estimate"""
+        for key in ((shape, True), (shape, False)):
+            shape = self._remaining.get(key)
+            if shape and shape[1] > 0:
+                shape[1] -= 1
+                return
+
+    def eta(self) -> str:
+        """Estimated time left for the jobs not finished yet, '' when done"""
+        if not any(count > 0 for _, count in self._remaining.values()):
+            return ""
+        # Servers work in parallel
+        return f"ETA {format_duration(self.eta_estimate().seconds / len(self.router))}"
+
+    def plan_jobs(
+        self,
+        prompts: Iterable[Union[str, PromptItem]],
+        resolution: tuple,
+        quality: str,
+        variations: int,
+        negative_prompt: str,
+        pack_variations: bool = False,
+        latent_budget_mp: float = LATENT_BATCH_BUDGET_MP,
+        seed: Optional[int] = None,
+        share_conditioning: bool = False,
+        total_prompts: Optional[int] = None,
+        group_models: bool = False
+    ) -> Iterator[Dict]:
+        """Yield one job per submission, built lazily
+
+        Each job is {"label", "workflow", "images", "preset", "resolution", "shape"}, where workflow is
+        the rendered /prompt payload (bytes) and images holds the metadata of
+        every image the job produces, in latent batch order.
+        prompts may be plain strings or PromptItems (e.g. a streamed
+        PromptSource, counted by total_prompts); an item's resolution,
+        preset, LoRA stack and seed override the run's, its section travels
+        with its images and its output (or section) names the saved files.
+        With group_models, prompts are reordered so those sharing a model
+        and LoRA stack, then a latent size, run back to back (see
+        ModelAffinityScheduler) and one warm session serves mixed assets.
+        With pack_variations the variations of a prompt share one latent
+        batch (capped by the VRAM budget, see pack_size) and one seed; each image keeps its
+        batch_index so it can be re-rendered alone via create_workflow.
+        A fixed seed makes the run reproducible (job n uses seed + n).
+        With share_conditioning, repeated prompts are moved next to their
+        first occurrence and each job carries its prompt as "conditioning"
+        affinity key, so consecutive jobs on a server share text encodings
+        through ComfyUI's cache (the negative is the same for every job).
+        Reordering works within windows of REORDER_WINDOW prompts.
+        """
+        if total_prompts is None:
+            total_prompts = len(prompts)
+        total_images = total_prompts * variations
+        pack_sizes: Dict[Profile, int] = {}
+        current = 0
+        job_number = 0
+
+        items = prompt_items(prompts)
+        if share_conditioning or group_models:
+            stream = items
+            items = (item for window in iter(lambda: list(islice(stream, REORDER_WINDOW)), [])
+                     for item in self.reorder(window, resolution, quality, share_conditioning, group_models))
+
+        for item in items:
+            profile = self.profile(item, resolution, quality)
+            res, preset, loras = profile
+            if profile not in pack_sizes:
+                pack_sizes[profile] = (self.pack_size(res, preset, latent_budget_mp, loras)
+                                       if pack_variations else 1)
+            pack_size = pack_sizes[profile]
+
+            for first in range(0, variations, pack_size):
+                count = min(pack_size, variations - first)
+                if item.seed is not None:
+                    job_seed = (item.seed + first // pack_size) % 2**32
+                elif seed is None:
+                    job_seed = random.randint(0, 2**32 - 1)
+                else:
+                    job_seed = (seed + job_number) % 2**32
+                job_number += 1
+                images = [
+                    {
+                        "prompt": item.prompt,
+                        "prompt_index": item.index,
+                        "section": item.section,
+                        "variation": first + i + 1,
+                        "seed": job_seed,
+                        "batch_index": i if pack_variations else None,
+                        "prompt_id": None,
+                        "filename": None,
+                    }
+                    for i in range(count)
+                ]
+
+                if count == 1:
+                    label = f"[{current + 1}/{total_images}] Variation {first + 1}/{variations}"
+                else:
+                    label = (f"[{current + 1}-{current + count}/{total_images}] "
+                             f"Variations {first + 1}-{first + count}/{variations} (latent batch)")
+                current += count
+
+                filename_prefix = item.output or f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                if item.section and not item.output:
+                    filename_prefix += f"_{output_slug(item.section)}"
+
+                yield {
+                    "label": f"{label}: {item.prompt[:40]}...",
+                    "workflow": self.workflow_template(res, preset, count, loras).render(
+                        prompt=item.prompt,
+                        negative=negative_prompt,
+                        seed=job_seed,
+                        filename_prefix=filename_prefix,
+                        client_id=self.session_id
+                    ),
+                    "images": images,
+                    "preset": preset,
+                    "resolution": f"{res[0]}x{res[1]}",
+                    "shape": (res, preset, loras, count),
+                    "conditioning": item.prompt if share_conditioning else None,
+                }
+
+    def reorder(self, items: List[PromptItem], resolution: tuple, quality: str,
+                share_conditioning: bool = False, group_models: bool = False) -> List[PromptItem]:
+        """One window of plan_jobs' prompts in submission order"""
+        if share_conditioning:
+            items = group_repeats(items, key=lambda item: item.prompt)
+        if group_models:
+            scheduler = ModelAffinityScheduler(self.latency)
+            signatures = {}
+            for item in items:
+                profile = self.profile(item, resolution, quality)
+                workflow = self.sample_workflow(profile)
+                if profile not in signatures:
+                    signatures[profile] = model_signature(workflow)
+                scheduler.add(item, workflow, signatures[profile], shape=profile[0])
+            items = scheduler.order()
+        return items
+
+    def resume_jobs(self, jobs: Iterator[Dict]) -> Iterator[Dict]:
+        """Drop jobs the journal has finished; reattach ones still on a server
+
+        A reattached job carries its journaled "prompt_id" and is tracked
+        instead of resubmitted. Jobs that failed, timed out or vanished from
+        the server (e.g. after a server restart) are rendered again.
+        """
+        for job in jobs:
+            keys = [item_key(image) for image in job["images"]]
+            rows = self.journal.lookup(keys)
+            if len(rows) == len(keys):
+                prompt_ids = {row["prompt_id"] for row in rows.values()}
+                statuses = {row["status"] for row in rows.values()}
+
+                if statuses == {SUCCESS}:
+                    for image, key in zip(job["images"], keys):
+                        image.update(seed=rows[key]["seed"], prompt_id=rows[key]["prompt_id"],
+                                     filename=rows[key]["filename"], resumed=True)
+                    self.images_resumed += len(job["images"])
+                    if self._keep_images:
+                        self.packed_images.extend(job["images"])
+                    self.job_finished(job["shape"])
+                    print(f"  {job['label']} ✓ Already complete (journal)")
+                    continue
+
+                if statuses == {SUBMITTED} and len(prompt_ids) == 1:
+                    prompt_id = prompt_ids.pop()
+                    server = rows[keys[0]]["server"]
+                    if self.router.adopt(prompt_id, server, cost=len(keys)):
+                        for image, key in zip(job["images"], keys):
+                            image["seed"] = rows[key]["seed"]
+                        job["prompt_id"] = prompt_id
+            yield job
+
+    def dispatch(self, job: Dict) -> Optional[str]:
+        """Submit a planned job (or take over its reattached one) and journal it"""
+        prompt_id = job.get("prompt_id")
+        if not prompt_id:
+            prompt_id = self.submit_workflow(job["workflow"], affinity=job.get("conditioning"))
+            if prompt_id and self.journal:
+                server = self.router.server_for(prompt_id)
+                self.journal.submitted(prompt_id, server.url if server else None, job["images"],
+                                       job.get("preset"), job.get("resolution"))
+        if prompt_id:
+            self._submitted[prompt_id] = (job["workflow"], job["shape"])
+            self.track_images(prompt_id, job["images"])
+        return prompt_id
+
+    def cancel_job(self, prompt_id: str, timeout: float) -> Tuple[Optional[Dict], str]:
+        """Give up on a job that ran past its timeout
+
+        The job is deleted from the server queue, or interrupted if it is
+        running, so the jobs behind it start instead of timing out in turn;
+        the outcome goes to the journal. Returns (result, outcome), with the
+        job's result if it turned out to have finished after all.
+        """
+        try:
+            outcome = self.router.cancel(prompt_id, free=self.free_on_timeout)
+        except Exception as e:
+            self.router.forget(prompt_id)
+            outcome = f"cancel failed: {e}"
+        if outcome == "finished":
+            result = self.router.wait(prompt_id, timeout=10)
+            if result is not None:
+                self.finish_job(prompt_id, result)
+                return result, outcome
+            self.router.forget(prompt_id)
+        elif outcome == "interrupted" and self.free_on_timeout:
+            outcome += ", models unloaded"
+        self.finish_job(prompt_id, None, f"timeout after {timeout:g}s ({outcome})")
+        return None, outcome
+
+    def finish_job(self, prompt_id: str, result: Optional[Dict], error: str = "timeout"):
+        """Record a finished job's outputs (result None means timed out, see error)"""
+        workflow, shape = self._submitted.pop(prompt_id, (None, None))
+        self.job_finished(shape)
+        sampling = memory = None
+        if result and result["status"] == "success":
+            self.record_outputs(prompt_id, result)
+            if workflow is not None:
+                features = self.latency.record(workflow, self.execution_timer.result(prompt_id))
+                sampling = sampling_record(workflow, result.get("sampling"), features)
+                if sampling and sampling["it_per_s"] is not None:
+                    self._sampled.add((sampling["model"], sampling["resolution"], sampling["batch_size"]))
+            if self.node_profiler and shape:
+                self.node_profiler.record(prompt_id, describe_profile(shape[:3]))
+            memory = self.job_memory(prompt_id)
+        images = self._job_images.pop(prompt_id, [])
+        status = result["status"] if result else "timeout"
+        self.images_finished[status] = self.images_finished.get(status, 0) + len(images)
+        if self.journal:
+            self.journal.finished(
+                prompt_id,
+                status,
+                result.get("outputs") if result else None,
+                result.get("error") if result else error,
+                images,
+                sampling,
+                memory
+            )
+
+    def job_memory(self, prompt_id: str) -> Optional[Dict]:
+        """Sampled memory use of a finished job, None unless sampling is on"""
+        for sampler in self.memory_samplers:
+            usage = sampler.job(prompt_id)
+            if usage:
+                return usage
+        return None
+
+    def record_outputs(self, prompt_id: str, result: Optional[Dict]):
+        """Map a finished job's saved images back to their variations"""
+        if not result:
+            return
+        saved = []
+        for node_output in result.get("outputs", {}).values():
+            saved += [img["filename"] for img in (node_output or {}).get("images", [])]
+        for image, filename in zip(self._job_images.get(prompt_id, []), saved):
+            image["filename"] = filename
+
+    def run_pipelined(
+        self,
+        jobs: Iterator[Dict],
+        queue_depth: int,
+        timeout: int = JOB_TIMEOUT
+    ) -> List[str]:
+        """Keep queue_depth jobs queued per server, refilling as each completes
+
+        Jobs (see plan_jobs) are consumed lazily, so each workflow is built
+        while the GPU is still busy with earlier ones. timeout is the longest
+        a server may go without finishing any of its jobs; its oldest job is
+        then cancelled (see cancel_job). Each server has its own clock, so a
+        job stuck on one server is cancelled even while others keep finishing.
+        """
+        queue_depth *= len(self.router)
+        generated_ids = []
+        inflight = {}  # future -> (label, prompt_id, server URL)
+        exhausted = False
+        last_progress: Dict[Optional[str], float] = {}  # server URL -> last finish (or first job)
+
+        while True:
+            # Refill up to the target depth, measured live on the server
+            if not exhausted and len(inflight) < queue_depth:
+                depth = self.get_queue_depth()
+                if depth is None:
+                    depth = len(inflight)
+
+                while depth < queue_depth:
+                    job = next(jobs, None)
+                    if job is None:
+                        exhausted = True
+                        break
+
+                    label = job["label"]
+                    reattached = "prompt_id" in job
+                    prompt_id = self.dispatch(job)
+                    if not prompt_id:
+                        print(f"  {label} ✗ Failed to submit")
+                        continue
+
+                    generated_ids.append(prompt_id)
+                    server = self.router.server_for(prompt_id)
+                    url = server.url if server else None
+                    if all(entry[2] != url for entry in inflight.values()):
+                        last_progress[url] = time.time()
+                    inflight[self.router.watch(prompt_id)] = (label, prompt_id, url)
+                    if reattached:
+                        # Already counted in the server's queue depth
+                        print(f"  {label} ↻ Reattached (ID: {prompt_id[:8]}...)")
+                    else:
+                        print(f"  {label} ✓ Queued (ID: {prompt_id[:8]}...)")
+                        depth += 1
+
+            if not inflight:
+                if exhausted:
+                    break
+                # Server queue is full of other clients' work; check again shortly
+                time.sleep(1)
+                continue
+
+            done, _ = wait_futures(list(inflight), timeout=1.0, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                label, prompt_id, url = inflight.pop(future)
+                result = future.result()
+                last_progress[url] = time.time()
+                self.finish_job(prompt_id, result)
+                if result["status"] == "success":
+                    note = describe_reuse(self.encode_timer.job(prompt_id))
+                    speed = ", ".join(filter(None, [describe_sampling(result.get("sampling")),
+                                                    describe_memory(self.job_memory(prompt_id))]))
+                    eta = self.eta()
+                    print(f"  {label} ✓ Complete (ID: {prompt_id[:8]}...{f', {speed}' if speed else ''})"
+                          f"{f' [text encoders: {note}]' if note else ''}{f' {eta}' if eta else ''}")
+                else:
+                    print(f"  {label} ✗ {result['status'].capitalize()}: {result['error']}")
+
+            stalled = {url for _, _, url in inflight.values()
+                       if time.time() - last_progress.get(url, 0) > timeout}
+            for url in stalled:
+                # The server's oldest job has made no progress; cancel it so
+                # the jobs queued behind it can run, and keep going
+                future = next(future for future, entry in inflight.items() if entry[2] == url)
+                label, prompt_id, _ = inflight.pop(future)
+                result, outcome = self.cancel_job(prompt_id, timeout)
+                last_progress[url] = time.time()
+                if result is None:
+                    print(f"  {label} ✗ Timeout (ID: {prompt_id[:8]}..., {outcome}), moving to next...")
+                else:
+                    print(f"  {label} {'✓' if result['status'] == 'success' else '✗'} "
+                          f"{result['status'].capitalize()} as it timed out (ID: {prompt_id[:8]}...)")
+
+        return generated_ids
+
+    def track_images(self, prompt_id: str, images: List[Dict]):
+        """Attach a submitted job's per-image metadata to this session"""
+        for image in images:
+            image["prompt_id"] = prompt_id
+        self.images_submitted += len(images)
+        if self._keep_images:
+            self.packed_images.extend(images)
+        self._job_images[prompt_id] = images
 
     def generate_batch(
         self,
-        prompts: List[str],
+        prompts: Iterable[Union[str, PromptItem]],
         resolution: str = "portrait",
         quality: str = "high",
         variations: int = 1,
         negative_prompt: str = "",
-        wait: bool = True
+        wait: bool = True,
+        queue_depth: int = 0,
+        pack_variations: bool = False,
+        latent_budget_mp: float = LATENT_BATCH_BUDGET_MP,
+        seed: Optional[int] = None,
+        validate: bool = True,
+        share_conditioning: bool = False,
+        timeout: int = JOB_TIMEOUT,
+        group_models: bool = True
     ) -> List[str]:
-        """Generate batch of images from prompts"""
+        """Generate batch of images from prompts
+
+        prompts may be a list of strings or a PromptSource, which is
+        streamed rather than loaded: its items' resolution, preset, LoRA
+        stack and seed override the run's, and their sections and output
+        names carry through to the journal and saved files (see plan_jobs).
+        With group_models, a run mixing such profiles is ordered by model
+        and latent size so one warm server session handles all of it.
+        With queue_depth > 0 (and wait=True) submission is pipelined so the
+        server always has queue_depth jobs queued and the sampler never idles.
+        With pack_variations the variations of each prompt are sampled as one
+        latent batch instead of one workflow each. When the generator's
+        journal resumed an earlier run, finished items are skipped and jobs
+        still queued on the server are reattached rather than resubmitted.
+        With validate, the workflow of each preset is checked against the
+        node schema and local model files first, since every job of the
+        batch with that preset shares it.
+        With share_conditioning, jobs are ordered and routed so identical
+        prompts run back to back and reuse their cached text encodings.
+        A job still unfinished after timeout seconds is cancelled on the
+        server (see cancel_job) and the batch moves on.
+        """
 
         if not self.check_server():
             print("✗ ComfyUI server is not running!")
@@ -261,6 +880,32 @@ class BatchImageGenerator:
         res = RESOLUTIONS[resolution]
         preset = QUALITY_PRESETS[quality]
 
+        try:
+            profiles = self.survey(prompts, res, quality)
+        except (OSError, ValueError) as e:
+            print(f"✗ {e}")
+            return []
+        total_prompts = sum(profiles.values())
+        group_models = group_models and len(profiles) > 1
+
+        if validate and profiles:
+            # Jobs with the same preset and LoRAs differ only in text, seed
+            # and size: one check covers them. Any server may get any job,
+            # and each may have different custom nodes installed
+            validators = {server.url: WorkflowValidator.from_server(server.url, client=server.client)
+                          for server in self.router.servers}
+            checks = {(q, loras): (r, q, loras) for r, q, loras in profiles}
+            for profile in checks.values():
+                workflow = {"prompt": self.sample_workflow(profile)}
+                for url, validator in validators.items():
+                    problems = validator.validate(workflow)
+                    if not problems.ok:
+                        where = f" on {url}" if len(validators) > 1 else ""
+                        print(f"✗ Workflow ({describe_profile(profile)}) failed validation{where}:")
+                        for line in problems.messages():
+                            print(f"  {line}")
+                        return []
+
         print("=" * 70)
         print("ULTRA-REALISTIC BATCH IMAGE GENERATOR")
         print("=" * 70)
@@ -268,40 +913,64 @@ class BatchImageGenerator:
         print(f"Quality: {quality} - {preset['description']}")
         print(f"Steps: {preset['steps']} | CFG: {preset['cfg']}")
         print(f"LoRAs: {', '.join([l['name'].split('.')[0] for l in preset['loras']])}")
-        print(f"Prompts: {len(prompts)} | Variations: {variations}")
-        print(f"Total images: {len(prompts) * variations}")
+        if len(profiles) > 1 or (res, quality, None) not in profiles:
+            print("Per-prompt overrides:")
+            for profile, count in profiles.items():
+                print(f"  {count:>6} x {describe_profile(profile)}")
+        print(f"Prompts: {total_prompts} | Variations: {variations}")
+        print(f"Total images: {total_prompts * variations}")
+        if pack_variations:
+            print(f"Packing: up to {self.pack_size(res, quality, latent_budget_mp)} variations per latent batch")
+        if wait and queue_depth > 0:
+            print(f"Pipelined: keeping {queue_depth} jobs queued")
+        if share_conditioning:
+            print("Conditioning: repeated prompts grouped, one server per prompt where possible")
+        if group_models:
+            print("Scheduling: prompts grouped by model/LoRAs, then latent size")
+        if self.journal and self.journal.resumed:
+            print(f"Resuming: {self.journal.summary()}")
+        estimate = self.estimate_run(profiles, variations, pack_variations, latent_budget_mp)
+        print(f"Estimated GPU time: {estimate.describe()} ({format_duration(estimate.seconds)})")
         print("=" * 70)
         print()
 
-        generated_ids = []
-        total_images = len(prompts) * variations
-        current = 0
-
-        for prompt_idx, prompt in enumerate(prompts, 1):
-            print(f"[{prompt_idx}/{len(prompts)}] Prompt: {prompt[:60]}...")
+        # Started only once the batch is going to run, since stop() below is
+        # the only thing that ends them
+        for sampler in self.memory_samplers:
+            sampler.start()
+        if not self.router.start():
+            print("⚠ Websocket not connected; jobs will have no timing or progress events")
 
-            for var in range(variations):
-                current += 1
-                print(f"  [{current}/{total_images}] Variation {var + 1}/{variations}")
+        generated_ids = []
+        total_images = total_prompts * variations
+        self.images_submitted = self.images_resumed = 0
+        self.images_finished = {}
+        self.packed_images = []
+        self._keep_images = pack_variations and wait
+        jobs = self.plan_jobs(prompts, res, quality, variations, negative_prompt,
+                              pack_variations, latent_budget_mp, seed, share_conditioning,
+                              total_prompts, group_models)
+        if self.journal and self.journal.resumed:
+            jobs = self.resume_jobs(jobs)
 
-                # Create and submit workflow
-                workflow = self.create_workflow(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    resolution=res,
-                    quality=quality,
-                    seed=None  # Random seed for each variation
-                )
+        if wait and queue_depth > 0:
+            generated_ids = self.run_pipelined(jobs, queue_depth, timeout)
+            print()
+        else:
+            for job in jobs:
+                print(f"  {job['label']}")
 
-                prompt_id = self.submit_workflow(workflow)
+                if "prompt_id" in job:
+                    print(f"  ↻ Reattached to queued job (ID: {job['prompt_id'][:8]}...)")
+                prompt_id = self.dispatch(job)
 
                 if prompt_id:
                     generated_ids.append(prompt_id)
 
                     if wait:
-                        success = self.wait_for_completion(prompt_id)
+                        success = self.wait_for_completion(prompt_id, timeout)
                         if not success:
-                            print(f"  ⚠ Generation timed out, moving to next...")
+                            print(f"  ⚠ Generation did not complete, moving to next...")
                     else:
                         print(f"  ✓ Submitted (ID: {prompt_id[:8]}...)")
                 else:
@@ -309,8 +978,61 @@ class BatchImageGenerator:
 
             print()
 
+        if pack_variations and wait:
+            print("Variation mapping (re-render one with --seed/--batch-index):")
+            for img in self.packed_images:
+                if img["filename"]:
+                    print(f"  P{img['prompt_index']} v{img['variation']}: seed={img['seed']} "
+                          f"batch_index={img['batch_index']} -> {img['filename']}")
+            print()
+
+        reuse = self.encode_timer.summary()
+        if wait and (reuse["encoded"] or reuse["reused"]):
+            print(f"Text encoding: {describe_reuse(reuse)} across {reuse['jobs']} jobs")
+            print()
+
+        if self.journal and self._sampled:
+            stats = [entry for entry in self.journal.sampling_stats()
+                     if (entry["model"], entry["resolution"], entry["batch_size"]) in self._sampled]
+            print("Sampling speed (recent jobs across runs):")
+            print("\n".join(format_sampling_stats(stats)))
+            print()
+
+        for server, sampler in zip(self.router.servers, self.memory_samplers):
+            sampler.stop()
+            usage = sampler.peak()
+            if usage:
+                ram = f", RAM peak {usage['peak_ram_gb']:.1f}GB" if usage["peak_ram_gb"] is not None else ""
+                print(f"Memory{f' ({server.url})' if len(self.router) > 1 else ''}: "
+                      f"{describe_memory(usage)} ({usage['vram_total_gb'] - usage['peak_vram_gb']:.1f}GB headroom), "
+                      f"mean {usage['mean_vram_gb']:.1f}GB{ram}")
+                print()
+
+        if self.node_profiler and self.node_profiler.templates():
+            print("Node profile:")
+            print(self.node_profiler.report())
+            print()
+
+        if len(self.router) > 1:
+            for server in self.router.summary():
+                print(f"  {server['url']}: {server['completed']} completed")
+            print()
+
         print("=" * 70)
-        print(f"BATCH COMPLETE: {len(generated_ids)}/{total_images} images generated")
+        if wait:
+            # Only successful jobs count; whatever else was planned either
+            # errored, timed out (and was cancelled) or never got submitted
+            images_done = self.images_finished.get(SUCCESS, 0) + self.images_resumed
+            timed_out = self.images_finished.get("timeout", 0) + self.images_finished.get("interrupted", 0)
+            failed = total_images - images_done - timed_out
+            print(f"BATCH COMPLETE: {images_done}/{total_images} images generated")
+            if timed_out:
+                print(f"  {timed_out} timed out or cancelled")
+            if failed:
+                print(f"  {failed} failed")
+        else:
+            images_queued = self.images_submitted + self.images_resumed
+            print(f"BATCH SUBMITTED: {images_queued}/{total_images} images queued")
         print(f"Output directory: D:\\workspace\\fluxdype\\ComfyUI\\output\\")
         print("=" * 70)
 
@@ -318,11 +1040,9 @@ class BatchImageGenerator:
 
 
 def load_prompts_from_file(filepath: str) -> List[str]:
-    """Load prompts from text file (one per line)"""
+    """Load prompts from a prompt file or manifest into a list (see PromptSource to stream them)"""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            prompts = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-        return prompts
+        return [item.prompt for item in PromptSource(filepath)]
     except Exception as e:
         print(f"✗ Error loading prompts from {filepath}: {e}")
         return []
@@ -346,6 +1066,24 @@ Examples:
   # Generate for Instagram stories
   python batch_generate.py -p "fashion model portrait" -r story -v 5
 
+  # Keep the GPU busy: always have 3 jobs queued on the server
+  python batch_generate.py -f prompts.txt --queue-depth 3
+
+  # 8 variations as 4 latent batches of 2 (portrait), one submission each
+  python batch_generate.py -p "fashion model portrait" -v 8 --pack-variations
+
+  # Re-render variation 2 of a packed batch (seed/batch_index from the mapping)
+  python batch_generate.py -p "fashion model portrait" --seed 123456 --batch-index 1
+
+  # Pick up a crashed or interrupted run where it stopped
+  python batch_generate.py -f prompts.txt -v 4 --queue-depth 3 --resume
+
+  # Run repeated prompts back to back so their text encodings come from cache
+  python batch_generate.py -f prompts.txt -v 4 --queue-depth 2 --share-conditioning
+
+  # Shard one prompt file across two ComfyUI boxes
+  python batch_generate.py -f prompts.txt --queue-depth 2 --servers http://gpu1:8188 http://gpu2:8188
+
 Available resolutions:
   portrait      1024x1536   (2:3 - Instagram portrait)
   portrait_hd   1080x1920   (9:16 - Full HD portrait)
@@ -363,7 +1101,9 @@ Quality presets:
     )
 
     parser.add_argument('-p', '--prompt', type=str, help='Single prompt to generate')
-    parser.add_argument('-f', '--file', type=str, help='File with prompts (one per line)')
+    parser.add_argument('-f', '--file', type=str,
+                        help='Prompt file, streamed: .txt (one per line, "#" lines are section headers), '
+                             'or a .jsonl/.csv manifest with per-item section, resolution, preset, seed, output')
     parser.add_argument('-r', '--resolution', type=str, default='portrait',
                         choices=list(RESOLUTIONS.keys()),
                         help='Output resolution (default: portrait)')
@@ -376,10 +1116,44 @@ Quality presets:
                         help='Additional negative prompt')
     parser.add_argument('--no-wait', action='store_true',
                         help='Submit all and exit without waiting')
+    parser.add_argument('--pack-variations', action='store_true',
+                        help='Sample the variations of each prompt as one latent batch (capped by --latent-budget)')
+    parser.add_argument('--latent-budget', type=float, default=LATENT_BATCH_BUDGET_MP,
+                        help=f'Megapixels per latent batch when packing (default: {LATENT_BATCH_BUDGET_MP}, RTX 3090)')
+    parser.add_argument('--seed', type=int,
+                        help='Fixed seed (with --batch-index: re-render one image of a packed batch)')
+    parser.add_argument('--batch-index', type=int,
+                        help='Latent batch index of the image to re-render (requires --seed)')
+    parser.add_argument('--queue-depth', type=int, default=0,
+                        help='Pipeline submissions, keeping N jobs queued on the server (default: 0, one at a time)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the last identical run from the job journal: skip finished '
+                             'images and reattach to jobs still queued on the server')
+    parser.add_argument('--journal', type=str, default=str(DEFAULT_JOURNAL_PATH),
+                        help='SQLite job journal path (default: .cache/job_journal.sqlite3)')
+    parser.add_argument('--share-conditioning', action='store_true',
+                        help='Group repeated prompts and keep each prompt on one server so ComfyUI '
+                             'reuses its text encodings; reports encode time saved per job')
+    parser.add_argument('--keep-order', action='store_true',
+                        help='Run a manifest in file order instead of grouping rows by model/LoRAs and latent size')
+    parser.add_argument('--timeout', type=int, default=JOB_TIMEOUT,
+                        help=f'Seconds before an unfinished job is removed from the server queue or '
+                             f'interrupted (default: {JOB_TIMEOUT})')
+    parser.add_argument('--free-on-timeout', action='store_true',
+                        help='Also unload models and free VRAM after interrupting a timed-out job')
+    parser.add_argument('--memory-interval', type=float, default=0, metavar='SECONDS',
+                        help='Sample VRAM/RAM from /system_stats this often and record peak/mean per job (default: off)')
+    parser.add_argument('--profile-nodes', action='store_true',
+                        help='Time every node from websocket events and print a per-node profile at the end')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Skip checking the workflow against the node schema and model files')
     parser.add_argument('--host', type=str, default=COMFY_HOST,
                         help=f'ComfyUI host (default: {COMFY_HOST})')
     parser.add_argument('--port', type=int, default=COMFY_PORT,
                         help=f'ComfyUI port (default: {COMFY_PORT})')
+    parser.add_argument('--servers', type=str, nargs='+', metavar='URL',
+                        help='Shard across several ComfyUI servers, e.g. http://gpu1:8188 http://gpu2:8188 '
+                             '(overrides --host/--port; each job goes to the least-loaded server)')
 
     args = parser.parse_args()
 
@@ -389,18 +1163,66 @@ Quality presets:
         print("\n✗ Error: Must provide either --prompt or --file")
         sys.exit(1)
 
-    # Load prompts
+    # Prompt files are streamed; this pass only checks and fingerprints them
     prompts = []
     if args.file:
-        prompts = load_prompts_from_file(args.file)
-        if not prompts:
+        prompts = PromptSource(args.file)
+        try:
+            prompts_digest = prompts.digest()
+        except (OSError, ValueError) as e:
+            print(f"✗ Error loading prompts from {args.file}: {e}")
+            sys.exit(1)
+        if not len(prompts):
             print(f"✗ No valid prompts found in {args.file}")
             sys.exit(1)
     elif args.prompt:
         prompts = [args.prompt]
+        prompts_digest = hashlib.sha256(args.prompt.encode("utf-8")).hexdigest()
+
+    if args.batch_index is not None and (args.seed is None or len(prompts) != 1):
+        print("✗ Error: --batch-index needs --seed and a single --prompt")
+        sys.exit(1)
+
+    if args.batch_index is not None:
+        generator = BatchImageGenerator(host=args.host, port=args.port, servers=args.servers,
+                                        free_on_timeout=args.free_on_timeout)
+        # Re-render one image of a packed latent batch
+        item = next(prompt_items(prompts))
+        workflow = generator.create_workflow(
+            prompt=item.prompt,
+            negative_prompt=args.negative,
+            resolution=parse_resolution(item.resolution or args.resolution),
+            quality=item.preset or args.quality,
+            seed=args.seed,
+            latent_batch_index=args.batch_index,
+            filename_prefix=item.output
+        )
+        prompt_id = generator.submit_workflow(workflow)
+        if not prompt_id or not generator.wait_for_completion(prompt_id, args.timeout):
+            sys.exit(1)
+        return
+
+    # The run is identified by everything that determines its images
+    journal = JobJournal(args.journal)
+    journal.begin("batch_generate", {
+        "prompts": prompts_digest,
+        "resolution": args.resolution,
+        "quality": args.quality,
+        "variations": args.variations,
+        "negative": args.negative,
+        "pack_variations": args.pack_variations,
+        "latent_budget": args.latent_budget,
+        "seed": args.seed,
+        "share_conditioning": args.share_conditioning,
+        "keep_order": args.keep_order,
+    }, resume=args.resume)
+    if args.resume and not journal.resumed:
+        print("No journaled run matches these arguments; starting from the beginning")
 
     # Create generator
-    generator = BatchImageGenerator(host=args.host, port=args.port)
+    generator = BatchImageGenerator(host=args.host, port=args.port, servers=args.servers,
+                                    journal=journal, free_on_timeout=args.free_on_timeout,
+                                    profile_nodes=args.profile_nodes, memory_interval=args.memory_interval)
 
     # Generate batch
     generator.generate_batch(
@@ -409,7 +1231,15 @@ Quality presets:
         quality=args.quality,
         variations=args.variations,
         negative_prompt=args.negative,
-        wait=not args.no_wait
+        wait=not args.no_wait,
+        queue_depth=args.queue_depth,
+        pack_variations=args.pack_variations,
+        latent_budget_mp=args.latent_budget,
+        seed=args.seed,
+        validate=not args.no_validate,
+        share_conditioning=args.share_conditioning,
+        timeout=args.timeout,
+        group_models=not args.keep_order
     )
 
 
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness
+Runs workflows repeatedly and splits every run into phases using the
+websocket execution events, instead of timing submission to /history
+(which mixes all of them with the poll interval):
+
+  queue     submission until execution_start (jobs ahead, prompt validation)
+  load      loader nodes, plus a sampler's time before its first step
+            (ComfyUI moves weights to the GPU lazily, when sampling starts)
+  encode    text encoders
+  sampling  sampler steps, from the "progress" events
+  decode    VAE decode
+  other     everything else in the job (saving images, ...)
+
+In warm state, warmup runs load the models first. Measured runs then change
+only the seed, so loaders and text encoders come from ComfyUI's cache. In
+cold state, models and the node cache are freed (/free) before every run,
+so each run pays the full load. VRAM and RAM are sampled from /system_stats
+during the runs (see memory_sampler.py), per run and per phase. Results are
+written as JSON; benchmark_compare.py keeps them as versioned baselines and
+tests later results against them for regressions.
+
+    python benchmark.py GGUF-Flux-Dev-Turbo-8Step-LoRA.json Flux-Professional-High-Quality.json
+    python benchmark.py compare_flux_dev_q8.json 2_fluxedUp_NSFW_FIXED.json --state cold --repeats 3
+    python benchmark.py GGUF-Flux-Dev-Turbo-8Step-LoRA.json --repeats 10 --baseline turbo
+"""
+
+import argparse
+import hashlib
+import json
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from comfy_client import ComfyAPIError, ComfyClient
+from comfy_ws import CompletionTracker
+from conditioning_reuse import TEXT_ENCODERS
+from latency_model import job_features
+from memory_sampler import DEFAULT_INTERVAL, MemorySampler, describe_memory
+from model_scheduler import (BASE_LOADERS, ENCODER_LOADERS, LORA_LOADERS, POWER_LORA_LOADER, VAE_LOADERS,
+                             model_signature)
+from workflow_convert import WorkflowConverter, is_ui_workflow
+from workflow_template import SAMPLERS
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+COMFY_URL = "http://localhost:8188"
+DEFAULT_RESULTS_DIR = SCRIPT_DIR / "benchmarks"
+
+# Bumped when the results file layout changes (2: runs carry "sampling",
+# cases "models")
+RESULTS_SCHEMA = 2
+
+PHASES = ("queue", "load", "encode", "sampling", "decode", "other")
+
+LOADERS = set(BASE_LOADERS) | set(ENCODER_LOADERS) | set(VAE_LOADERS) | set(LORA_LOADERS) | {POWER_LORA_LOADER}
+DECODERS = ("VAEDecode", "VAEDecodeTiled")
+
+_END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+def node_phase(class_type: str) -> str:
+    """Phase a node's execution time counts towards"""
+    if class_type in LOADERS or "Loader" in class_type:
+        return "load"
+    if class_type in TEXT_ENCODERS:
+        return "encode"
+    if class_type in SAMPLERS:
+        return "sampling"
+    if class_type in DECODERS:
+        return "decode"
+    return "other"
+
+
+class PhaseTimer:
+    """Websocket listener recording the node timeline of each job
+
+    Events are kept for jobs not expect()ed yet, since a short job can
+    finish before its submit call returns.
+    """
+
+    def __init__(self, max_jobs: int = 4096):
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _job(self, prompt_id: str) -> Dict:
+        job = self._jobs.get(prompt_id)
+        if job is None:
+            job = self._jobs[prompt_id] = {
+                "submitted": None, "classes": {}, "started": None, "ended": None,
+                "status": None, "cached": [], "nodes": [], "current": None,
+            }
+            while len(self._jobs) > self.max_jobs:
+                del self._jobs[next(iter(self._jobs))]
+        return job
+
+    def expect(self, prompt_id: str, workflow: Union[Dict, bytes], submitted: Optional[float] = None):
+        """Register a submitted job: its API workflow (or /prompt payload
+        bytes) and when it was sent"""
+        if isinstance(workflow, bytes):
+            workflow = json.loads(workflow)
+        if isinstance(workflow.get("prompt"), dict):
+            workflow = workflow["prompt"]
+        with self._lock:
+            job = self._job(prompt_id)
+            job["submitted"] = submitted
+            job["classes"] = {str(node_id): node.get("class_type", "") for node_id, node in workflow.items()
+                              if isinstance(node, dict)}
+
+    def __call__(self, message: Dict, received: float):
+        msg_type = message.get("type")
+        if msg_type not in ("execution_start", "execution_cached", "executing", "progress") + _END_EVENTS:
+            return
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        with self._lock:
+            job = self._job(prompt_id)
+            if job["status"] is not None:
+                return
+            if msg_type == "execution_start":
+                job["started"] = received
+            elif msg_type == "execution_cached":
+                job["cached"] = [str(node) for node in data.get("nodes") or []]
+            elif msg_type == "progress":
+                current = job["current"]
+                if current is not None and str(data.get("node", current["node"])) == current["node"]:
+                    if current["first_step"] is None:
+                        current["first_step"] = received
+                    current["last_step"] = received
+                    current["step_events"] += 1
+                    current["steps"] = int(data.get("max") or current["steps"] or 0)
+            else:
+                # A node runs until the next one starts or the job ends
+                if job["current"] is not None:
+                    job["current"]["seconds"] = received - job["current"]["start"]
+                    job["nodes"].append(job.pop("current"))
+                    job["current"] = None
+                node = data.get("node") if msg_type == "executing" else None
+                if node is not None:
+                    job["current"] = {"node": str(node), "start": received, "seconds": None,
+                                      "first_step": None, "last_step": None, "step_events": 0, "steps": 0}
+                    return
+                job["ended"] = received
+                job["status"] = {"execution_error": "error",
+                                 "execution_interrupted": "interrupted"}.get(msg_type, "success")
+
+    def timeline(self, prompt_id: str) -> Optional[Dict]:
+        """A finished job's events: {"status", "submitted", "started", "ended",
+        "cached", "nodes"}, each node with its class_type (and, if executed,
+        its start offset from execution_start, seconds and sampler steps);
+        None until it finished"""
+        with self._lock:
+            job = self._jobs.get(prompt_id)
+            if job is None or job["status"] is None or job["started"] is None:
+                return None
+            nodes = []
+            for node in job["nodes"]:
+                entry = {
+                    "node": node["node"],
+                    "class_type": job["classes"].get(node["node"], ""),
+                    "start": node["start"] - job["started"],
+                    "seconds": node["seconds"],
+                }
+                if node["step_events"]:
+                    entry["steps"] = node["steps"]
+                    entry["first_step"] = node["first_step"] - node["start"]
+                    entry["last_step"] = node["last_step"] - node["start"]
+                    entry["step_events"] = node["step_events"]
+                nodes.append(entry)
+            cached = [{"node": node, "class_type": job["classes"].get(node, "")} for node in job["cached"]]
+            return {"status": job["status"], "submitted": job["submitted"], "started": job["started"],
+                    "ended": job["ended"], "cached": cached, "nodes": nodes}
+
+    def phases(self, prompt_id: str) -> Optional[Dict]:
+        """Seconds per phase (see PHASES) of a finished job, plus "execution"
+        (execution_start to end), "wall" (submission to end) and "steps"."""
+        timeline = self.timeline(prompt_id)
+        return phase_breakdown(timeline) if timeline else None
+
+
+def node_segments(node: Dict) -> List[Tuple[str, float]]:
+    """(phase, seconds) parts of a timeline node; a sampler's time before its
+    first step (moving the model to the GPU) counts as load"""
+    phase = node_phase(node["class_type"])
+    seconds = node["seconds"] or 0.0
+    if phase != "sampling" or not node.get("step_events"):
+        return [(phase, seconds)]
+    # The first step event marks one step done: extrapolate the sampling
+    # time back from the step rate, the rest is setup
+    events = node["step_events"]
+    per_step = (node["last_step"] - node["first_step"]) / (events - 1) if events > 1 else node["first_step"]
+    sampling = min(seconds, per_step * node["steps"])
+    return [("load", seconds - sampling), ("sampling", sampling)]
+
+
+def phase_intervals(timeline: Dict) -> List[Tuple[str, float, float]]:
+    """(phase, start, end) wall-clock spans of a PhaseTimer timeline"""
+    spans = []
+    if timeline["submitted"] is not None:
+        spans.append(("queue", timeline["submitted"], timeline["started"]))
+    for node in timeline["nodes"]:
+        start = timeline["started"] + node["start"]
+        for phase, seconds in node_segments(node):
+            spans.append((phase, start, start + seconds))
+            start += seconds
+    return spans
+
+
+def phase_breakdown(timeline: Dict) -> Dict:
+    """Seconds per phase of a PhaseTimer timeline"""
+    phases = {phase: 0.0 for phase in PHASES}
+    steps = 0
+    for node in timeline["nodes"]:
+        for phase, seconds in node_segments(node):
+            phases[phase] += seconds
+        if node.get("step_events"):
+            steps += node["steps"]
+    execution = timeline["ended"] - timeline["started"]
+    phases["other"] += max(0.0, execution - sum(phases.values()))
+    if timeline["submitted"] is not None:
+        phases["queue"] = max(0.0, timeline["started"] - timeline["submitted"])
+        phases["wall"] = timeline["ended"] - timeline["submitted"]
+    else:
+        phases["wall"] = None
+    phases["execution"] = execution
+    phases["steps"] = steps
+    return phases
+
+
+def vary_seed(workflow: Dict, seed: int) -> Dict:
+    """Copy of an API workflow with every seed / noise_seed input set to seed"""
+    varied = json.loads(json.dumps(workflow))
+    for node in varied.values():
+        inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+        for key in ("seed", "noise_seed"):
+            if isinstance(inputs.get(key), int):
+                inputs[key] = seed
+    return varied
+
+
+def summarize(values: List[float]) -> Optional[Dict]:
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {"median": statistics.median(values), "mean": statistics.fmean(values),
+            "min": min(values), "max": max(values), "n": len(values)}
+
+
+def run_metrics(run: Dict, batch_size: int = 1) -> Dict:
+    """Per-run figures compared between results: "per_image" (execution
+    seconds per image of the latent batch) and the sampler's "it_per_s" """
+    execution = (run.get("phases") or {}).get("execution")
+    return {"per_image": execution / max(1, batch_size) if execution is not None else None,
+            "it_per_s": (run.get("sampling") or {}).get("it_per_s")}
+
+
+def client_revision() -> Optional[Dict]:
+    """Git commit of this checkout (and whether it has local changes)"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SCRIPT_DIR,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return {"commit": commit, "dirty": bool(dirty)} if commit else None
+
+
+class Benchmark:
+    """Sequential benchmark runs of API workflows on one server"""
+
+    def __init__(self, url: str = COMFY_URL, state: str = "warm", repeats: int = 3,
+                 warmup: int = 1, seed: int = 12345, timeout: float = 900,
+                 memory_interval: float = DEFAULT_INTERVAL):
+        if state not in ("warm", "cold"):
+            raise ValueError(f"state must be warm or cold, not {state!r}")
+        self.url = url.rstrip("/")
+        self.state = state
+        self.repeats = repeats
+        self.warmup = warmup
+        self.seed = seed
+        self.timeout = timeout
+        self.client = ComfyClient(self.url)
+        self.tracker = CompletionTracker(self.url, client_id=self.client.client_id, client=self.client)
+        self.timer = PhaseTimer()
+        self.tracker.add_listener(self.timer)
+        # Device memory over time, attributed to runs (0 disables)
+        self.memory = MemorySampler(self.client, memory_interval) if memory_interval > 0 else None
+        if self.memory:
+            self.tracker.add_listener(self.memory)
+        self._converter: Optional[WorkflowConverter] = None
+
+    def load(self, path: Path) -> Dict:
+        """API workflow of a file (UI-format files are converted)"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data.get("prompt"), dict):
+            data = data["prompt"]
+        if is_ui_workflow(data):
+            if self._converter is None:
+                self._converter = WorkflowConverter.from_server(self.url)
+            data = self._converter.convert(data)
+        return data
+
+    def run_once(self, workflow: Dict, seed: int) -> Dict:
+        """Submit one run and wait for it; returns its record"""
+        if self.state == "cold":
+            # Applied by the server before the next job: drops the models and
+            # the node cache, so the loaders run again
+            self.client.free(unload_models=True, free_memory=True)
+        payload = vary_seed(workflow, seed)
+        submitted = time.time()
+        try:
+            prompt_id = self.client.submit(payload)["prompt_id"]
+        except ComfyAPIError as e:
+            return {"seed": seed, "status": "rejected", "error": str(e.node_errors or e)}
+        self.timer.expect(prompt_id, payload, submitted)
+        result = self.tracker.wait(prompt_id, timeout=self.timeout)
+        if result is None:
+            self.tracker.forget(prompt_id)
+            outcome = self.client.cancel(prompt_id)
+            return {"seed": seed, "prompt_id": prompt_id, "status": "timeout", "error": outcome}
+
+        record = {"seed": seed, "prompt_id": prompt_id, "status": result["status"],
+                  "error": result.get("error"), "sampling": result.get("sampling")}
+        # The result can resolve from /history before the last events arrive
+        for _ in range(20):
+            timeline = self.timer.timeline(prompt_id)
+            if timeline is not None:
+                break
+            time.sleep(0.05)
+        if timeline is None:
+            record["phases"] = None  # no websocket events (polling fallback)
+        else:
+            record["phases"] = phase_breakdown(timeline)
+            record["nodes"] = timeline["nodes"]
+            record["cached"] = timeline["cached"]
+            record["cold"] = job_features(payload, [node["node"] for node in timeline["cached"]])["cold"]
+            if self.memory:
+                record["memory"] = self.memory.job(prompt_id, phase_intervals(timeline))
+        return record
+
+    def run_case(self, path: Path) -> Dict:
+        """Warmup and measured runs of one workflow file"""
+        workflow = self.load(path)
+        case = {
+            "name": path.stem,
+            "workflow": str(path),
+            "sha256": hashlib.sha256(json.dumps(workflow, sort_keys=True).encode("utf-8")).hexdigest(),
+            "features": {key: value for key, value in job_features(workflow).items() if key != "cold"},
+            "models": model_signature(workflow)._asdict(),
+            "runs": [],
+        }
+        seed = self.seed
+        for number in range(self.warmup + self.repeats):
+            warmup = number < self.warmup
+            label = f"warmup {number + 1}" if warmup else f"run {number - self.warmup + 1}/{self.repeats}"
+            print(f"  {path.stem} {label}...", end="", flush=True)
+            record = self.run_once(workflow, seed)
+            record["run"] = number
+            record["warmup"] = warmup
+            seed += 1
+            case["runs"].append(record)
+            phases = record.get("phases")
+            if record["status"] != "success":
+                print(f" ✗ {record['status']}: {record.get('error')}")
+            elif phases:
+                memory = describe_memory(record.get("memory"))
+                print(f" ✓ {phases['wall']:.2f}s (" + ", ".join(
+                    f"{phase} {phases[phase]:.2f}s" for phase in PHASES if phases[phase] >= 0.005) + ")"
+                    + (f", {memory}" if memory else ""))
+            else:
+                print(" ✓ (no websocket events, phases unknown)")
+
+        measured = [run for run in case["runs"]
+                    if not run["warmup"] and run["status"] == "success" and run.get("phases")]
+        case["summary"] = {key: summarize([run["phases"][key] for run in measured])
+                           for key in PHASES + ("execution", "wall")}
+        for key in ("peak_vram_gb", "mean_vram_gb", "peak_ram_gb"):
+            case["summary"][key] = summarize([run["memory"][key] for run in measured if run.get("memory")])
+        metrics = [run_metrics(run, case["features"]["batch_size"]) for run in measured]
+        for key in ("per_image", "it_per_s"):
+            case["summary"][key] = summarize([values[key] for values in metrics])
+        return case
+
+    def run(self, paths: List[Path]) -> Dict:
+        """Results document for every workflow file"""
+        if self.memory:
+            self.memory.start()
+        try:
+            system = self.client.system_stats()
+        except Exception:
+            system = None
+        depth = self.client.queue_depth()
+        if depth:
+            print(f"⚠ {depth} job(s) already queued on the server; queue times will include them")
+        results = {
+            "schema": RESULTS_SCHEMA,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "server": self.url,
+            "system": system,
+            "client": client_revision(),
+            "config": {"state": self.state, "repeats": self.repeats, "warmup": self.warmup,
+                       "seed": self.seed, "timeout": self.timeout,
+                       "memory_interval": self.memory.interval if self.memory else None},
+            "cases": [],
+        }
+        for path in paths:
+            results["cases"].append(self.run_case(path))
+        if self.memory:
+            self.memory.stop()
+        return results
+
+
+def print_summary(results: Dict):
+    print()
+    print(f"{'workflow':<40} {'wall':>8} " + " ".join(f"{phase:>8}" for phase in PHASES)
+          + f" {'VRAM':>8} {'it/s':>6}")
+    for case in results["cases"]:
+        summary = case["summary"]
+        cells = [f"{summary[key]['median']:>7.2f}s" if summary[key] else f"{'-':>8}"
+                 for key in ("wall",) + PHASES]
+        peak = summary.get("peak_vram_gb")
+        cells.append(f"{peak['max']:>6.1f}GB" if peak else f"{'-':>8}")
+        speed = summary.get("it_per_s")
+        cells.append(f"{speed['median']:>6.2f}" if speed else f"{'-':>6}")
+        print(f"{case['name'][:40]:<40} " + " ".join(cells))
+    print(f"(medians of {results['config']['repeats']} {results['config']['state']} runs; VRAM is the highest peak)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark workflows with per-phase timing")
+    parser.add_argument("workflows", nargs="+", help="Workflow files (API or UI format)")
+    parser.add_argument("--repeats", type=int, default=3, help="Measured runs per workflow (default: 3)")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="Unmeasured runs before the measured ones (default: 1)")
+    parser.add_argument("--state", choices=("warm", "cold"), default="warm",
+                        help="warm: models stay loaded; cold: models and node cache freed before each run")
+    parser.add_argument("--seed", type=int, default=12345, help="Seed of the first run (then +1 per run)")
+    parser.add_argument("--timeout", type=float, default=900, help="Seconds per run before it is cancelled")
+    parser.add_argument("--memory-interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"Seconds between /system_stats memory samples, 0 to disable (default: {DEFAULT_INTERVAL})")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Results file (default: benchmarks/benchmark_<time>.json)")
+    parser.add_argument("--baseline", type=str, metavar="REF",
+                        help="Compare with a baseline (file, <name> or <name>@<version>); exit 1 on regressions")
+    parser.add_argument("--save-baseline", type=str, metavar="NAME",
+                        help="Also store the results as the next version of baseline NAME")
+    parser.add_argument("--url", type=str, default=COMFY_URL, help=f"ComfyUI server (default: {COMFY_URL})")
+    args = parser.parse_args()
+
+    # Imported here: benchmark_compare builds on this module
+    from benchmark_compare import compare, format_report, load_results, save_baseline
+    try:
+        baseline = load_results(args.baseline) if args.baseline else None
+    except (OSError, ValueError) as e:
+        print(f"✗ {e}")
+        return 1
+
+    bench = Benchmark(args.url, state=args.state, repeats=args.repeats, warmup=args.warmup,
+                      seed=args.seed, timeout=args.timeout, memory_interval=args.memory_interval)
+    if not bench.client.ping():
+        print(f"✗ ComfyUI server not accessible at {args.url}")
+        return 1
+    bench.tracker.start()
+    if not bench.tracker.connected.wait(5):
+        print("⚠ Websocket not connected; runs will have no phase breakdown")
+
+    print(f"Benchmarking {len(args.workflows)} workflow(s): {args.warmup} warmup + {args.repeats} "
+          f"measured {args.state} run(s) each")
+    results = bench.run([Path(path) for path in args.workflows])
+    bench.tracker.stop()
+    print_summary(results)
+
+    output = Path(args.output) if args.output else \
+        DEFAULT_RESULTS_DIR / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {output}")
+    if args.save_baseline:
+        print(f"Baseline: {save_baseline(results, args.save_baseline)}")
+    if baseline is not None:
+        report = compare(baseline, load_results(str(output)))
+        print()
+        print("\n".join(format_report(report)))
+        return 1 if report["regressions"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
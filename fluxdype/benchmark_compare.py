@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Benchmark Regression Check
+Keeps benchmark.py results as versioned baselines and tests new results
+against them, instead of eyeballing one number per run:
+
+  per_image  execution seconds per image (lower is better)
+  it_per_s   sampler iterations per second (higher is better)
+
+For every workflow both results ran, it reports the medians, a bootstrap
+confidence interval of the ratio of medians (candidate / baseline), and
+two effect sizes: Cliff's delta (share of run pairs where the candidate was
+higher, minus lower) and Hedges' g (difference of means in pooled standard
+deviations). A change is a regression when the interval excludes 1 in the
+bad direction and the medians differ by at least --min-change. It also
+lists what changed between the two: models and LoRAs per workflow, the
+server's launch flags and versions, and the client commit.
+
+Baselines live in benchmarks/baselines/<name>/v<N>.json; saving under an
+existing name adds the next version. Refer to one as a file, as <name>
+(latest version) or as <name>@<N>:
+
+    python benchmark_compare.py --save turbo benchmarks/benchmark_20250101_120000.json
+    python benchmark_compare.py --list
+    python benchmark_compare.py turbo benchmarks/benchmark_20250102_090000.json
+    python benchmark.py GGUF-Flux-Dev-Turbo-8Step-LoRA.json --repeats 10 --baseline turbo
+
+Exits 1 if any workflow regressed (2 if a reference cannot be read). Use
+at least 5 measured runs per side: with fewer, intervals are wide and only
+large changes can be significant.
+"""
+
+import argparse
+import json
+import random
+import statistics
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from benchmark import DEFAULT_RESULTS_DIR, RESULTS_SCHEMA, run_metrics
+from node_profiler import percentile
+
+BASELINE_DIR = DEFAULT_RESULTS_DIR / "baselines"
+
+# metric -> (unit, True if higher is better)
+METRICS = {
+    "per_image": ("s/image", False),
+    "it_per_s": ("it/s", True),
+}
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_MIN_CHANGE = 0.05
+MIN_RUNS = 3
+
+
+def baseline_versions(name: str, directory: Path = BASELINE_DIR) -> List[int]:
+    """Saved versions of a baseline, oldest first"""
+    versions = []
+    for path in (directory / name).glob("v*.json"):
+        if path.stem[1:].isdigit():
+            versions.append(int(path.stem[1:]))
+    return sorted(versions)
+
+
+def save_baseline(results: Dict, name: str, note: Optional[str] = None,
+                  directory: Path = BASELINE_DIR) -> Path:
+    """Store results as the next version of a named baseline"""
+    if not name or "/" in name or "\\" in name or "@" in name:
+        raise ValueError(f"invalid baseline name {name!r}")
+    version = max(baseline_versions(name, directory), default=0) + 1
+    document = dict(results)
+    document["baseline"] = {"name": name, "version": version,
+                            "saved": datetime.now().isoformat(timespec="seconds"), "note": note}
+    path = directory / name / f"v{version}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def resolve(ref: str, directory: Path = BASELINE_DIR) -> Path:
+    """File of a results reference: a path, <name> or <name>@<version>"""
+    path = Path(ref)
+    if path.is_file():
+        return path
+    name, _, version = ref.partition("@")
+    versions = baseline_versions(name, directory)
+    if not versions:
+        raise FileNotFoundError(f"no results file or baseline named {ref!r}")
+    if version:
+        if not version.lstrip("v").isdigit() or int(version.lstrip("v")) not in versions:
+            raise FileNotFoundError(f"baseline {name!r} has no version {version} (has {versions})")
+        return directory / name / f"v{int(version.lstrip('v'))}.json"
+    return directory / name / f"v{versions[-1]}.json"
+
+
+def load_results(ref: str, directory: Path = BASELINE_DIR) -> Dict:
+    with open(resolve(ref, directory), "r", encoding="utf-8") as f:
+        results = json.load(f)
+    if not isinstance(results.get("cases"), list) or results.get("schema", 0) > RESULTS_SCHEMA:
+        raise ValueError(f"{ref}: not a benchmark.py results file this version can read")
+    return results
+
+
+def case_samples(case: Dict) -> Dict[str, List[float]]:
+    """Measured values of every metric over a case's successful runs"""
+    batch_size = (case.get("features") or {}).get("batch_size") or 1
+    samples: Dict[str, List[float]] = {metric: [] for metric in METRICS}
+    for run in case.get("runs", []):
+        if run.get("warmup") or run.get("status") != "success" or not run.get("phases"):
+            continue
+        for metric, value in run_metrics(run, batch_size).items():
+            if metric in samples and value is not None:
+                samples[metric].append(value)
+    return samples
+
+
+def bootstrap_ratio(baseline: List[float], candidate: List[float], resamples: int = DEFAULT_RESAMPLES,
+                    confidence: float = DEFAULT_CONFIDENCE,
+                    rng: Optional[random.Random] = None) -> Optional[Tuple[float, float]]:
+    """Percentile bootstrap interval of median(candidate) / median(baseline),
+    resampling both sides with replacement"""
+    rng = rng or random.Random(0)
+    ratios = []
+    for _ in range(resamples):
+        base = statistics.median(rng.choices(baseline, k=len(baseline)))
+        if base > 0:
+            ratios.append(statistics.median(rng.choices(candidate, k=len(candidate))) / base)
+    if not ratios:
+        return None
+    tail = 100 * (1 - confidence) / 2
+    return percentile(ratios, tail), percentile(ratios, 100 - tail)
+
+
+def cliffs_delta(baseline: List[float], candidate: List[float]) -> float:
+    """P(candidate > baseline) - P(candidate < baseline) over all run pairs, -1 to 1"""
+    greater = sum(1 for c in candidate for b in baseline if c > b)
+    less = sum(1 for c in candidate for b in baseline if c < b)
+    return (greater - less) / (len(candidate) * len(baseline))
+
+
+def hedges_g(baseline: List[float], candidate: List[float]) -> Optional[float]:
+    """Standardized difference of means (candidate - baseline), small-sample corrected"""
+    n1, n2 = len(baseline), len(candidate)
+    if n1 < 2 or n2 < 2:
+        return None
+    pooled = ((n1 - 1) * statistics.variance(baseline) + (n2 - 1) * statistics.variance(candidate)) / (n1 + n2 - 2)
+    if pooled <= 0:
+        return None
+    correction = 1 - 3 / (4 * (n1 + n2) - 9)
+    return (statistics.fmean(candidate) - statistics.fmean(baseline)) / pooled ** 0.5 * correction
+
+
+def compare_metric(baseline: List[float], candidate: List[float], higher_is_better: bool,
+                   confidence: float = DEFAULT_CONFIDENCE, resamples: int = DEFAULT_RESAMPLES,
+                   min_change: float = DEFAULT_MIN_CHANGE, rng: Optional[random.Random] = None) -> Dict:
+    """Medians, relative change, ratio interval, effect sizes and a verdict:
+    "regression", "improvement", "unchanged" or "insufficient" (fewer than
+    MIN_RUNS values on a side)"""
+    entry = {"baseline": statistics.median(baseline) if baseline else None,
+             "candidate": statistics.median(candidate) if candidate else None,
+             "n": [len(baseline), len(candidate)], "change": None, "ci": None,
+             "cliffs_delta": None, "hedges_g": None, "verdict": "insufficient"}
+    if len(baseline) < MIN_RUNS or len(candidate) < MIN_RUNS or not entry["baseline"]:
+        return entry
+    entry["change"] = entry["candidate"] / entry["baseline"] - 1
+    entry["ci"] = bootstrap_ratio(baseline, candidate, resamples, confidence, rng)
+    entry["cliffs_delta"] = cliffs_delta(baseline, candidate)
+    entry["hedges_g"] = hedges_g(baseline, candidate)
+    entry["verdict"] = "unchanged"
+    if entry["ci"] is not None and abs(entry["change"]) >= min_change:
+        low, high = entry["ci"]
+        if low > 1 or high < 1:
+            worse = (high < 1) if higher_is_better else (low > 1)
+            entry["verdict"] = "regression" if worse else "improvement"
+    return entry
+
+
+def environment(results: Dict) -> Dict:
+    """What a results file was measured with, beyond the workflows"""
+    stats = results.get("system") or {}
+    system = stats.get("system") or {}
+    devices = stats.get("devices") or []
+    client = results.get("client") or {}
+    config = results.get("config") or {}
+    argv = system.get("argv")
+    return {
+        "launch flags": " ".join(argv[1:]) if isinstance(argv, list) else None,
+        "ComfyUI": system.get("comfyui_version"),
+        "PyTorch": system.get("pytorch_version"),
+        "GPU": devices[0].get("name") if devices else None,
+        "client commit": (client.get("commit") or "")[:12] + (" (modified)" if client.get("dirty") else "")
+        if client else None,
+        "state": config.get("state"),
+    }
+
+
+def _loras(case: Dict) -> Optional[List[str]]:
+    loras = (case.get("models") or {}).get("loras")
+    if loras is None:
+        return None
+    return [f"{name}@{strength:g}" for name, strength, _ in loras]
+
+
+def case_changes(baseline: Dict, candidate: Dict) -> List[str]:
+    """Differences in what two runs of a workflow loaded"""
+    changes = []
+    base_models, cand_models = baseline.get("models") or {}, candidate.get("models") or {}
+    for key in ("base", "encoders", "vae"):
+        if key in base_models and key in cand_models and base_models[key] != cand_models[key]:
+            changes.append(f"{key}: {', '.join(base_models[key]) or '-'} -> {', '.join(cand_models[key]) or '-'}")
+    if not (base_models and cand_models):
+        base_model = (baseline.get("features") or {}).get("model")
+        cand_model = (candidate.get("features") or {}).get("model")
+        if base_model != cand_model:
+            changes.append(f"model: {base_model or '-'} -> {cand_model or '-'}")
+    base_loras, cand_loras = _loras(baseline), _loras(candidate)
+    if base_loras is not None and cand_loras is not None and base_loras != cand_loras:
+        changes.append(f"LoRAs: {', '.join(base_loras) or '-'} -> {', '.join(cand_loras) or '-'}")
+    if baseline.get("sha256") != candidate.get("sha256") and not changes:
+        changes.append("workflow changed")
+    return changes
+
+
+def compare(baseline: Dict, candidate: Dict, confidence: float = DEFAULT_CONFIDENCE,
+            resamples: int = DEFAULT_RESAMPLES, min_change: float = DEFAULT_MIN_CHANGE,
+            seed: int = 0) -> Dict:
+    """Comparison report of two results documents, workflows matched by name"""
+    rng = random.Random(seed)
+    base_env, cand_env = environment(baseline), environment(candidate)
+    report = {
+        "baseline": baseline.get("baseline") or {"created": baseline.get("created")},
+        "candidate": candidate.get("baseline") or {"created": candidate.get("created")},
+        "confidence": confidence, "min_change": min_change,
+        "changes": [f"{key}: {base_env[key] or '-'} -> {cand_env[key] or '-'}"
+                    for key in base_env if base_env[key] != cand_env[key]],
+        "cases": [], "missing": [], "regressions": 0,
+    }
+    candidates = {case["name"]: case for case in candidate.get("cases", [])}
+    for base_case in baseline.get("cases", []):
+        cand_case = candidates.pop(base_case["name"], None)
+        if cand_case is None:
+            report["missing"].append(base_case["name"])
+            continue
+        base_samples, cand_samples = case_samples(base_case), case_samples(cand_case)
+        entry = {"name": base_case["name"], "changes": case_changes(base_case, cand_case), "metrics": {}}
+        for metric, (_, higher_is_better) in METRICS.items():
+            if base_samples[metric] or cand_samples[metric]:
+                entry["metrics"][metric] = compare_metric(base_samples[metric], cand_samples[metric],
+                                                          higher_is_better, confidence, resamples,
+                                                          min_change, rng)
+        report["regressions"] += sum(1 for result in entry["metrics"].values()
+                                     if result["verdict"] == "regression")
+        report["cases"].append(entry)
+    report["added"] = list(candidates)
+    return report
+
+
+def _describe(reference: Dict) -> str:
+    if "name" in reference:
+        return f"{reference['name']}@{reference['version']} (saved {reference['saved']})"
+    return f"results of {reference.get('created') or '?'}"
+
+
+def format_report(report: Dict) -> List[str]:
+    lines = [f"Baseline:  {_describe(report['baseline'])}",
+             f"Candidate: {_describe(report['candidate'])}"]
+    if report["changes"]:
+        lines.append("Changed:")
+        lines.extend(f"  {change}" for change in report["changes"])
+    level = round(100 * report["confidence"])
+    lines.append("")
+    lines.append(f"{'workflow / metric':<40} {'baseline':>10} {'candidate':>10} {'change':>8} "
+                 f"{f'{level}% CI':>17} {'delta':>6} {'g':>6}  verdict")
+    for case in report["cases"]:
+        lines.append(case["name"][:40] + (f"  ({'; '.join(case['changes'])})" if case["changes"] else ""))
+        for metric, result in case["metrics"].items():
+            unit = METRICS[metric][0]
+            label = f"  {metric} ({unit})"
+            cells = [f"{result[key]:>10.3f}" if result[key] is not None else f"{'-':>10}"
+                     for key in ("baseline", "candidate")]
+            cells.append(f"{100 * result['change']:>+7.1f}%" if result["change"] is not None else f"{'-':>8}")
+            if result["ci"]:
+                low, high = result["ci"]
+                cells.append(f"{100 * (low - 1):>+7.1f}..{100 * (high - 1):>+6.1f}%")
+            else:
+                cells.append(f"{'-':>17}")
+            cells.append(f"{result['cliffs_delta']:>+6.2f}" if result["cliffs_delta"] is not None else f"{'-':>6}")
+            cells.append(f"{result['hedges_g']:>+6.2f}" if result["hedges_g"] is not None else f"{'-':>6}")
+            verdict = result["verdict"]
+            if verdict == "insufficient":
+                verdict += f" (n={result['n'][0]}/{result['n'][1]}, need {MIN_RUNS})"
+            elif verdict == "regression":
+                verdict = "REGRESSION"
+            lines.append(f"{label:<40} " + " ".join(cells) + f"  {verdict}")
+    for name in report["missing"]:
+        lines.append(f"{name[:40]}  (not in candidate)")
+    for name in report["added"]:
+        lines.append(f"{name[:40]}  (not in baseline)")
+    lines.append("")
+    lines.append(f"{report['regressions']} regression(s): CI excludes no change and the medians "
+                 f"differ by at least {100 * report['min_change']:.0f}%")
+    return lines
+
+
+def list_baselines(directory: Path = BASELINE_DIR) -> List[str]:
+    lines = []
+    for folder in sorted(path for path in directory.glob("*") if path.is_dir()):
+        for version in baseline_versions(folder.name, directory):
+            with open(folder / f"v{version}.json", "r", encoding="utf-8") as f:
+                results = json.load(f)
+            info = results.get("baseline") or {}
+            env = environment(results)
+            lines.append(f"{folder.name}@{version:<4} saved {info.get('saved', '?')}  "
+                         f"{len(results.get('cases', []))} workflow(s)  commit {env['client commit'] or '-'}"
+                         + (f"  {info['note']}" if info.get("note") else ""))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store benchmark baselines and test results for regressions")
+    parser.add_argument("results", nargs="*",
+                        help="BASELINE CANDIDATE to compare (files, <name> or <name>@<version>), "
+                             "or the results file to --save")
+    parser.add_argument("--save", metavar="NAME", help="Store the results file as the next version of baseline NAME")
+    parser.add_argument("--note", type=str, help="With --save, a note kept with the baseline")
+    parser.add_argument("--list", action="store_true", help="List saved baselines")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                        help=f"Confidence level of the intervals (default: {DEFAULT_CONFIDENCE})")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES,
+                        help=f"Bootstrap resamples (default: {DEFAULT_RESAMPLES})")
+    parser.add_argument("--min-change", type=float, default=DEFAULT_MIN_CHANGE,
+                        help=f"Smallest change of the median counted as a regression, as a fraction (default: {DEFAULT_MIN_CHANGE})")
+    parser.add_argument("--seed", type=int, default=0, help="Bootstrap random seed")
+    parser.add_argument("--baselines", type=str, default=str(BASELINE_DIR),
+                        help=f"Baseline directory (default: {BASELINE_DIR})")
+    parser.add_argument("-o", "--output", type=str, help="Write the comparison as JSON")
+    args = parser.parse_args()
+    directory = Path(args.baselines)
+
+    if args.list:
+        lines = list_baselines(directory)
+        print("\n".join(lines) if lines else f"No baselines in {directory}")
+        return 0
+    if args.save:
+        if len(args.results) != 1:
+            parser.error("--save takes one results file")
+    elif len(args.results) != 2:
+        parser.error("give BASELINE and CANDIDATE results")
+    try:
+        loaded = [load_results(ref, directory) for ref in args.results]
+        if args.save:
+            print(f"Baseline: {save_baseline(loaded[0], args.save, args.note, directory)}")
+            return 0
+    except (OSError, ValueError) as e:
+        print(f"✗ {e}")
+        return 2
+
+    report = compare(loaded[0], loaded[1], args.confidence, args.resamples, args.min_change, args.seed)
+    print("\n".join(format_report(report)))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nComparison: {args.output}")
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
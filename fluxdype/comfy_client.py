@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Shared ComfyUI API Client
+One asyncio transport with keep-alive connection pooling and a concurrency
+limit, plus a thread-safe synchronous facade for the batch, test and
+download scripts.
+
+    async with AsyncComfyClient() as client:
+        result = await client.submit(workflow)
+
+    client = ComfyClient()              # sync scripts / thread pools
+    prompt_id = client.submit(workflow)["prompt_id"]
+
+Requires aiohttp (already installed in the ComfyUI venv).
+"""
+
+import asyncio
+import atexit
+import json as json_module
+import threading
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import aiohttp
+
+COMFY_URL = "http://localhost:8188"
+
+# Pool sizing: keep-alive sockets per client, and requests in flight at once
+DEFAULT_MAX_CONNECTIONS = 16
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30
+
+
+class ComfyAPIError(Exception):
+    """Non-2xx response from the ComfyUI server"""
+
+    def __init__(self, status: int, path: str, body: Any = None):
+        self.status = status
+        self.path = path
+        self.body = body
+        message = f"HTTP {status} from {path}"
+        if isinstance(body, dict):
+            error = body.get("error")
+            if isinstance(error, dict):
+                error = error.get("message")
+            if error:
+                message += f": {error}"
+            if body.get("node_errors"):
+                message += f" (node_errors: {body['node_errors']})"
+        elif body:
+            message += f": {str(body)[:200]}"
+        super().__init__(message)
+
+    @property
+    def node_errors(self) -> Dict:
+        if isinstance(self.body, dict):
+            return self.body.get("node_errors") or {}
+        return {}
+
+
+class AsyncComfyClient:
+    """Async ComfyUI API client over a pooled keep-alive aiohttp session"""
+
+    def __init__(
+        self,
+        base_url: str = COMFY_URL,
+        client_id: Optional[str] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id or str(uuid.uuid4())
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncComfyClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        json: Any = None,
+        data: Optional[bytes] = None,
+        params: Optional[Dict] = None,
+        raw: bool = False,
+        timeout: Optional[float] = None
+    ) -> Any:
+        session = self.session
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        headers = {"Content-Type": "application/json"} if data is not None else None
+        async with self._semaphore:
+            async with session.request(
+                method, f"{self.base_url}{path}",
+                json=json, data=data, params=params, headers=headers, timeout=request_timeout
+            ) as response:
+                if response.status >= 400:
+                    try:
+                        body = await response.json(content_type=None)
+                    except Exception:
+                        body = await response.text()
+                    raise ComfyAPIError(response.status, path, body)
+                if raw:
+                    return await response.read()
+                text = await response.text()
+                return json_module.loads(text) if text.strip() else None
+
+    # ------------------------------------------------------------------
+    # Typed endpoints
+    # ------------------------------------------------------------------
+
+    async def submit(self, workflow: Union[Dict, bytes], client_id: Optional[str] = None,
+                     front: bool = False) -> Dict:
+        """POST /prompt; returns {"prompt_id", "number", "node_errors"}
+
+        Accepts either a bare API-format workflow or a {"prompt": ...} payload.
+        Pre-rendered payload bytes (see workflow_template.py) are posted
+        as-is and must carry their own client_id.
+        """
+        if isinstance(workflow, (bytes, bytearray)):
+            return await self._request("POST", "/prompt", data=bytes(workflow))
+        payload = dict(workflow) if "prompt" in workflow else {"prompt": workflow}
+        payload.setdefault("client_id", client_id or self.client_id)
+        if front:
+            payload["front"] = True
+        return await self._request("POST", "/prompt", json=payload)
+
+    async def history(self, prompt_id: Optional[str] = None,
+                      max_items: Optional[int] = None) -> Dict:
+        """GET /history[/{prompt_id}]"""
+        if prompt_id:
+            return await self._request("GET", f"/history/{prompt_id}")
+        params = {"max_items": max_items} if max_items else None
+        return await self._request("GET", "/history", params=params)
+
+    async def queue(self) -> Dict:
+        """GET /queue; returns {"queue_running": [...], "queue_pending": [...]}"""
+        return await self._request("GET", "/queue")
+
+    async def queue_depth(self) -> int:
+        """Number of jobs running or pending on the server"""
+        queue = await self.queue()
+        return len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+
+    async def job_state(self, prompt_id: str) -> Optional[str]:
+        """"finished", "queued" (running or pending) or None if the server has no record"""
+        if prompt_id in (await self.history(prompt_id) or {}):
+            return "finished"
+        queue = await self.queue()
+        for entry in queue.get("queue_running", []) + queue.get("queue_pending", []):
+            if len(entry) > 1 and entry[1] == prompt_id:
+                return "queued"
+        return None
+
+    async def view(self, filename: str, subfolder: str = "", type: str = "output") -> bytes:
+        """GET /view; returns the whole file"""
+        params = {"filename": filename, "subfolder": subfolder, "type": type}
+        return await self._request("GET", "/view", params=params, raw=True, timeout=300)
+
+    async def view_stream(self, filename: str, subfolder: str = "", type: str = "output",
+                          chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+        """GET /view, yielding the body in chunks instead of buffering it"""
+        params = {"filename": filename, "subfolder": subfolder, "type": type}
+        session = self.session
+        async with self._semaphore:
+            async with session.get(f"{self.base_url}/view", params=params,
+                                   timeout=aiohttp.ClientTimeout(total=None, sock_read=60)) as response:
+                if response.status >= 400:
+                    raise ComfyAPIError(response.status, "/view", await response.text())
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+
+    async def view_size(self, filename: str, subfolder: str = "", type: str = "output") -> Optional[int]:
+        """HEAD /view; the file's Content-Length without downloading it"""
+        params = {"filename": filename, "subfolder": subfolder, "type": type}
+        session = self.session
+        async with self._semaphore:
+            async with session.head(f"{self.base_url}/view", params=params) as response:
+                if response.status >= 400:
+                    raise ComfyAPIError(response.status, "/view")
+                return response.content_length
+
+    async def interrupt(self, prompt_id: Optional[str] = None) -> None:
+        """POST /interrupt (stops the currently running job)
+
+        With prompt_id, servers that support it only interrupt if that job
+        is the one running; older servers ignore it.
+        """
+        await self._request("POST", "/interrupt", json={"prompt_id": prompt_id} if prompt_id else {})
+
+    async def delete_queued(self, prompt_ids: List[str]) -> None:
+        """POST /queue {"delete": [...]} (drops pending jobs; running ones are unaffected)"""
+        await self._request("POST", "/queue", json={"delete": list(prompt_ids)})
+
+    async def cancel(self, prompt_id: str, free: bool = False) -> str:
+        """Take a job off the GPU's hands, whatever state it is in
+
+        A pending job is deleted from the queue, a running one interrupted;
+        with free, models and cached memory are unloaded after an
+        interrupt. Returns "removed", "interrupted", "finished" or
+        "unknown" (the server has no record of it).
+        """
+        queue = await self.queue()
+        pending = [entry[1] for entry in queue.get("queue_pending", []) if len(entry) > 1]
+        if prompt_id in pending:
+            await self.delete_queued([prompt_id])
+            # The job may have started between reading the queue and the
+            # delete, which then removed nothing: look again
+            queue = await self.queue()
+        running = [entry[1] for entry in queue.get("queue_running", []) if len(entry) > 1]
+        if prompt_id in pending and prompt_id not in running:
+            # ... or even finished already
+            return "finished" if prompt_id in (await self.history(prompt_id) or {}) else "removed"
+        if prompt_id in running:
+            await self.interrupt(prompt_id)
+            if free:
+                await self.free()
+            return "interrupted"
+        if prompt_id in (await self.history(prompt_id) or {}):
+            return "finished"
+        return "unknown"
+
+    async def free(self, unload_models: bool = True, free_memory: bool = True) -> None:
+        """POST /free (unload models and/or release cached memory)"""
+        await self._request("POST", "/free", json={
+            "unload_models": unload_models,
+            "free_memory": free_memory,
+        })
+
+    async def object_info(self, node_class: Optional[str] = None) -> Dict:
+        """GET /object_info[/{node_class}]"""
+        path = f"/object_info/{node_class}" if node_class else "/object_info"
+        return await self._request("GET", path, timeout=120)
+
+    async def system_stats(self) -> Dict:
+        """GET /system_stats"""
+        return await self._request("GET", "/system_stats")
+
+    async def ping(self) -> bool:
+        """True if the server answers /system_stats"""
+        try:
+            await self._request("GET", "/system_stats", timeout=5)
+            return True
+        except Exception:
+            return False
+
+
+class ComfyClient:
+    """Synchronous, thread-safe facade over AsyncComfyClient
+
+    Runs the async client on a private event loop thread so plain scripts
+    and ThreadPoolExecutor workers all share one connection pool.
+    """
+
+    def __init__(self, base_url: str = COMFY_URL, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="comfy-client", daemon=True
+        )
+        self._thread.start()
+        self.aio = AsyncComfyClient(base_url, **kwargs)
+        atexit.register(self.close)
+
+    @property
+    def base_url(self) -> str:
+        return self.aio.base_url
+
+    @property
+    def client_id(self) -> str:
+        return self.aio.client_id
+
+    def run(self, coro):
+        """Run a coroutine on the client loop and return its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        if self._loop.is_running():
+            self.run(self.aio.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "ComfyClient":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, workflow: Union[Dict, bytes], client_id: Optional[str] = None,
+               front: bool = False) -> Dict:
+        return self.run(self.aio.submit(workflow, client_id, front))
+
+    def history(self, prompt_id: Optional[str] = None,
+                max_items: Optional[int] = None) -> Dict:
+        return self.run(self.aio.history(prompt_id, max_items))
+
+    def queue(self) -> Dict:
+        return self.run(self.aio.queue())
+
+    def queue_depth(self) -> int:
+        return self.run(self.aio.queue_depth())
+
+    def job_state(self, prompt_id: str) -> Optional[str]:
+        return self.run(self.aio.job_state(prompt_id))
+
+    def view(self, filename: str, subfolder: str = "", type: str = "output") -> bytes:
+        return self.run(self.aio.view(filename, subfolder, type))
+
+    def interrupt(self, prompt_id: Optional[str] = None) -> None:
+        return self.run(self.aio.interrupt(prompt_id))
+
+    def delete_queued(self, prompt_ids: List[str]) -> None:
+        return self.run(self.aio.delete_queued(prompt_ids))
+
+    def cancel(self, prompt_id: str, free: bool = False) -> str:
+        return self.run(self.aio.cancel(prompt_id, free))
+
+    def free(self, unload_models: bool = True, free_memory: bool = True) -> None:
+        return self.run(self.aio.free(unload_models, free_memory))
+
+    def object_info(self, node_class: Optional[str] = None) -> Dict:
+        return self.run(self.aio.object_info(node_class))
+
+    def system_stats(self) -> Dict:
+        return self.run(self.aio.system_stats())
+
+    def ping(self) -> bool:
+        return self.run(self.aio.ping())
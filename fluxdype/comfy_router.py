@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Multi-Server ComfyUI Router
+Shards jobs across several ComfyUI endpoints, sending each job to the
+server with the least estimated remaining work.
+
+Load is probed from each server's /queue and /system_stats (at most once
+per probe_interval) and kept current between probes by counting our own
+submissions and completions.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from comfy_client import ComfyClient
+from comfy_ws import CompletionTracker, Listener
+
+# Weight of the newest observation in the per-server speed average
+SPEED_EMA_ALPHA = 0.3
+
+# How many jobs of extra queued work a server may carry and still win a job
+# whose affinity key matches its last one (keeps cache-sharing jobs together)
+AFFINITY_SLACK_JOBS = 1.0
+
+
+class ComfyServer:
+    """One ComfyUI endpoint plus its live load estimate"""
+
+    def __init__(self, url: str, client_id: str):
+        self.url = url.rstrip("/")
+        self.client = ComfyClient(self.url, client_id=client_id)
+        self.tracker = CompletionTracker(self.url, client_id=client_id, client=self.client)
+        self.healthy = True
+        self.vram_free: Optional[int] = None
+        self.foreign_jobs = 0          # queued jobs submitted by other clients
+        self.outstanding: Dict[str, float] = {}  # our prompt_id -> cost
+        self.seconds_per_unit: Optional[float] = None
+        self.completed = 0
+        self.affinity: Optional[str] = None  # key of the last job sent here
+        self.last_probe = 0.0
+        self._last_finish = 0.0
+        self._submitted_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def probe(self):
+        """Refresh health, VRAM and foreign queue depth from the server"""
+        try:
+            queue = self.client.queue()
+            stats = self.client.system_stats()
+        except Exception:
+            self.healthy = False
+            self.last_probe = time.time()
+            return
+
+        entries = queue.get("queue_running", []) + queue.get("queue_pending", [])
+        with self._lock:
+            self.foreign_jobs = sum(
+                1 for entry in entries
+                if len(entry) > 1 and entry[1] not in self.outstanding
+            )
+        devices = stats.get("devices") or []
+        self.vram_free = devices[0].get("vram_free") if devices else None
+        self.healthy = True
+        self.last_probe = time.time()
+
+    def estimated_work(self, default_cost: float = 1.0) -> float:
+        """Seconds (or cost units, before any job has finished) of queued work"""
+        with self._lock:
+            units = sum(self.outstanding.values()) + self.foreign_jobs * default_cost
+        return units * (self.seconds_per_unit or 1.0)
+
+    def add(self, prompt_id: str, cost: float):
+        with self._lock:
+            self.outstanding[prompt_id] = cost
+            self._submitted_at[prompt_id] = time.time()
+
+    def discard(self, prompt_id: str):
+        """Drop a job we gave up on without counting it as a completion"""
+        with self._lock:
+            self.outstanding.pop(prompt_id, None)
+            self._submitted_at.pop(prompt_id, None)
+
+    def finish(self, prompt_id: str):
+        """Record a completion and update the observed speed"""
+        now = time.time()
+        with self._lock:
+            cost = self.outstanding.pop(prompt_id, None)
+            submitted = self._submitted_at.pop(prompt_id, now)
+            if cost is None:
+                return
+            # The GPU runs jobs serially, so service time is measured from
+            # whichever came last: our submission or the previous completion
+            service = now - max(submitted, self._last_finish)
+            self._last_finish = now
+            self.completed += 1
+            if cost > 0 and service > 0:
+                rate = service / cost
+                if self.seconds_per_unit is None:
+                    self.seconds_per_unit = rate
+                else:
+                    self.seconds_per_unit += SPEED_EMA_ALPHA * (rate - self.seconds_per_unit)
+
+
+class ServerRouter:
+    """Least-loaded routing of ComfyUI jobs across several servers"""
+
+    def __init__(self, urls: List[str], client_id: Optional[str] = None,
+                 probe_interval: float = 1.0):
+        if not urls:
+            raise ValueError("ServerRouter needs at least one server URL")
+        self.client_id = client_id or str(uuid.uuid4())
+        self.servers = [ComfyServer(url, self.client_id) for url in urls]
+        self.probe_interval = probe_interval
+        self._by_prompt: Dict[str, ComfyServer] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.servers)))
+
+    def __len__(self) -> int:
+        return len(self.servers)
+
+    def start(self, timeout: float = 5) -> bool:
+        """Open every server's websocket; True once all are connected
+
+        Call before the first submit: a tracker otherwise connects on its
+        first watch(), after the job is already queued, and misses that
+        job's execution_start, cache and progress events.
+        """
+        for server in self.servers:
+            server.tracker.start()
+        deadline = time.time() + timeout
+        return all(
+            server.tracker.connected.wait(max(0.0, deadline - time.time()))
+            for server in self.servers
+        )
+
+    def probe(self, force: bool = False):
+        """Probe every server whose last probe is older than probe_interval"""
+        now = time.time()
+        stale = [s for s in self.servers if force or now - s.last_probe >= self.probe_interval]
+        list(self._pool.map(lambda server: server.probe(), stale))
+
+    def pick(self, cost: float = 1.0, affinity: Optional[str] = None) -> ComfyServer:
+        """Healthy server with the least estimated remaining work
+
+        A server whose last job had the same affinity key wins while it is
+        at most AFFINITY_SLACK_JOBS jobs behind the least-loaded one, so
+        jobs that share cached nodes run back to back on one server.
+        """
+        self.probe()
+        healthy = [s for s in self.servers if s.healthy]
+        if not healthy:
+            raise ConnectionError("No ComfyUI server is reachable: " +
+                                  ", ".join(s.url for s in self.servers))
+        # Ties go to the server with the most free VRAM
+        best = min(healthy, key=lambda s: (s.estimated_work(cost), -(s.vram_free or 0)))
+        if affinity is not None and best.affinity != affinity:
+            for server in healthy:
+                if server.affinity == affinity:
+                    slack = AFFINITY_SLACK_JOBS * cost * (server.seconds_per_unit or 1.0)
+                    if server.estimated_work(cost) <= best.estimated_work(cost) + slack:
+                        return server
+        return best
+
+    def submit(self, workflow: Union[Dict, bytes], cost: float = 1.0,
+               affinity: Optional[str] = None) -> Dict:
+        """Submit to the least-loaded server; result carries a "server" URL
+
+        Payload bytes must carry the router's client_id, which every server
+        shares. affinity keys jobs that should follow each other on one
+        server (see pick).
+        """
+        server = self.pick(cost, affinity)
+        result = server.client.submit(workflow)
+        prompt_id = result.get("prompt_id")
+        if prompt_id:
+            server.affinity = affinity
+            server.add(prompt_id, cost)
+            with self._lock:
+                self._by_prompt[prompt_id] = server
+            server.tracker.watch(prompt_id).add_done_callback(
+                lambda _: server.finish(prompt_id)
+            )
+        return {**result, "server": server.url}
+
+    def adopt(self, prompt_id: str, url: Optional[str], cost: float = 1.0) -> bool:
+        """Take over a job submitted by an earlier session (e.g. on resume)
+
+        Returns False if that server is not in this router or no longer
+        knows the job, in which case it has to be resubmitted.
+        """
+        url = (url or self.servers[0].url).rstrip("/")
+        server = next((s for s in self.servers if s.url == url), None)
+        if server is None:
+            return False
+        try:
+            state = server.client.job_state(prompt_id)
+        except Exception:
+            return False
+        if state is None:
+            return False
+
+        with self._lock:
+            self._by_prompt[prompt_id] = server
+        if state == "queued":
+            server.add(prompt_id, cost)
+            server.tracker.watch(prompt_id).add_done_callback(
+                lambda _: server.finish(prompt_id)
+            )
+        # Catches a job that finished between the state check and watch()
+        server.tracker.refresh(prompt_id)
+        return True
+
+    def add_listener(self, listener: Listener):
+        """Receive the websocket events of every server (see CompletionTracker)"""
+        for server in self.servers:
+            server.tracker.add_listener(listener)
+
+    def server_for(self, prompt_id: str) -> Optional[ComfyServer]:
+        with self._lock:
+            return self._by_prompt.get(prompt_id)
+
+    def watch(self, prompt_id: str) -> Future:
+        server = self.server_for(prompt_id) or self.servers[0]
+        return server.tracker.watch(prompt_id)
+
+    def wait(self, prompt_id: str, timeout: float = 300) -> Optional[Dict]:
+        server = self.server_for(prompt_id) or self.servers[0]
+        return server.tracker.wait(prompt_id, timeout=timeout)
+
+    def forget(self, prompt_id: str):
+        server = self.server_for(prompt_id)
+        if server is not None:
+            server.tracker.forget(prompt_id)
+            server.discard(prompt_id)
+
+    def cancel(self, prompt_id: str, free: bool = False) -> str:
+        """Stop a job on its server and stop tracking it (see ComfyClient.cancel)
+
+        A job that turns out to have "finished" stays tracked and is
+        re-checked, so wait() can still pick up its result.
+        """
+        server = self.server_for(prompt_id)
+        if server is None:
+            return "unknown"
+        outcome = server.client.cancel(prompt_id, free=free)
+        if outcome == "finished":
+            server.tracker.refresh(prompt_id)
+        else:
+            server.tracker.forget(prompt_id)
+            server.discard(prompt_id)
+        return outcome
+
+    def history(self, prompt_id: str) -> Dict:
+        server = self.server_for(prompt_id) or self.servers[0]
+        return server.client.history(prompt_id)
+
+    def queue_depth(self) -> int:
+        """Jobs running or pending across all servers"""
+        return sum(s.client.queue_depth() for s in self.servers if s.healthy)
+
+    def ping(self) -> bool:
+        """True if at least one server is reachable"""
+        self.probe(force=True)
+        return any(s.healthy for s in self.servers)
+
+    def summary(self) -> List[Dict]:
+        """Per-server completion counts and observed speed"""
+        return [
+            {
+                "url": s.url,
+                "healthy": s.healthy,
+                "completed": s.completed,
+                "outstanding": len(s.outstanding),
+                "seconds_per_job": s.seconds_per_unit,
+            }
+            for s in self.servers
+        ]
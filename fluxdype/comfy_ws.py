@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+ComfyUI WebSocket Completion Tracker
+Resolves job futures from the /ws event stream the moment a job finishes.
+Falls back to /history polling only while the socket is unavailable.
+
+Results of jobs tracked by events also carry their sampling speed, measured
+from the "progress" events samplers send after every step (see
+sampling_metrics).
+
+Requires websocket-client (pip install websocket-client) for event mode;
+without it every job is tracked by polling.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional
+
+from comfy_client import ComfyClient
+
+try:
+    import websocket
+except ImportError:  # websocket-client not installed
+    websocket = None
+
+COMFY_URL = "http://localhost:8188"
+
+# How many finished-but-unwatched results to remember (job may finish
+# before the caller gets around to watching it)
+FINISHED_CACHE_SIZE = 1024
+
+# How many resolved prompt IDs to remember, so a second completion event
+# for the same job (execution_success, then executing with node=None)
+# cannot overwrite its result
+RESOLVED_CACHE_SIZE = 4096
+
+# Called with every decoded event message and the time it was received
+Listener = Callable[[Dict, float], None]
+
+
+def sampling_metrics(progress: Optional[Dict]) -> Optional[Dict]:
+    """Sampling speed of a job from its progress events
+
+    progress is {"started": execution_start time, "nodes": {node: {"first",
+    "last", "events", "steps"}}}. Returns {"steps", "it_per_s", "first_step",
+    "sampling_seconds"}: it/s counts the step intervals after each sampler's
+    first step, so it excludes model loading and other setup, which is in
+    first_step (seconds from execution_start to the first step). None if
+    the job reported no progress.
+    """
+    if not progress or not progress["nodes"]:
+        return None
+    nodes = progress["nodes"].values()
+    intervals = sum(node["events"] - 1 for node in nodes)
+    seconds = sum(node["last"] - node["first"] for node in nodes)
+    first = min(node["first"] for node in nodes)
+    return {
+        "steps": sum(node["steps"] for node in nodes),
+        "it_per_s": intervals / seconds if intervals and seconds > 0 else None,
+        "first_step": first - progress["started"] if progress.get("started") else None,
+        "sampling_seconds": max(node["last"] for node in nodes) - first,
+    }
+
+
+def describe_sampling(sampling: Optional[Dict]) -> str:
+    """Short report of sampling_metrics(), e.g. "2.41 it/s, 1st step 3.2s"; '' if unknown"""
+    if not sampling or sampling["it_per_s"] is None:
+        return ""
+    first_step = sampling["first_step"]
+    return f"{sampling['it_per_s']:.2f} it/s" + (f", 1st step {first_step:.1f}s" if first_step is not None else "")
+
+
+class CompletionTracker:
+    """Track ComfyUI job completion via websocket events with polling fallback"""
+
+    def __init__(
+        self,
+        base_url: str = COMFY_URL,
+        client_id: Optional[str] = None,
+        poll_interval: float = 1.0,
+        reconnect_interval: float = 5.0,
+        client: Optional[ComfyClient] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id or str(uuid.uuid4())
+        self.poll_interval = poll_interval
+        self.reconnect_interval = reconnect_interval
+        # Fallback polling goes through the shared pooled client
+        self.client = client or ComfyClient(self.base_url, client_id=self.client_id)
+        self.connected = threading.Event()
+
+        self._futures: Dict[str, Future] = {}
+        self._outputs: Dict[str, Dict] = {}
+        self._progress: Dict[str, Dict] = {}
+        self._finished: "OrderedDict[str, Dict]" = OrderedDict()
+        self._resolved: "OrderedDict[str, None]" = OrderedDict()
+        self._listeners: List[Listener] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ws = None
+
+    @property
+    def ws_url(self) -> str:
+        scheme, rest = self.base_url.split("://", 1)
+        ws_scheme = "wss" if scheme == "https" else "ws"
+        return f"{ws_scheme}://{rest}/ws?clientId={self.client_id}"
+
+    def start(self) -> "CompletionTracker":
+        """Start the background listener (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="comfy-ws-tracker", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the listener and close the socket"""
+        self._stop.set()
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.connected.clear()
+
+    def watch(self, prompt_id: str) -> Future:
+        """Return a future resolved with the job result dict"""
+        self.start()
+        with self._lock:
+            future = self._futures.get(prompt_id)
+            if future is None:
+                future = Future()
+                finished = self._finished.pop(prompt_id, None)
+                if finished is not None:
+                    future.set_result(finished)
+                else:
+                    self._futures[prompt_id] = future
+        return future
+
+    def wait(self, prompt_id: str, timeout: float = 300) -> Optional[Dict]:
+        """Block until the job finishes; returns None on timeout"""
+        try:
+            return self.watch(prompt_id).result(timeout=timeout)
+        except FutureTimeout:
+            return None
+
+    def forget(self, prompt_id: str):
+        """Stop tracking a job (e.g. after the caller gave up on it)"""
+        with self._lock:
+            self._futures.pop(prompt_id, None)
+            self._outputs.pop(prompt_id, None)
+            self._progress.pop(prompt_id, None)
+
+    def refresh(self, prompt_id: str):
+        """Check /history for one job now (e.g. one that finished while no
+        listener was connected, so its completion event was missed)"""
+        self._check_history(prompt_id)
+
+    def add_listener(self, listener: Listener):
+        """Also pass every websocket event to listener(message, received_at)
+
+        Listeners run on the receiving thread before the event resolves any
+        job, so they have seen a job's events by the time its future is done.
+        They must be quick and thread-safe; exceptions are ignored.
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def pending(self) -> List[str]:
+        """Prompt IDs still being watched"""
+        with self._lock:
+            return list(self._futures.keys())
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _resolve(self, prompt_id: str, status: str, outputs: Optional[Dict] = None,
+                 error: Optional[str] = None):
+        with self._lock:
+            # Each job resolves once: later completion events carry nothing new
+            if prompt_id in self._resolved:
+                return
+            self._resolved[prompt_id] = None
+            while len(self._resolved) > RESOLVED_CACHE_SIZE:
+                self._resolved.popitem(last=False)
+            collected = self._outputs.pop(prompt_id, {})
+            if outputs:
+                collected.update(outputs)
+            result = {
+                "prompt_id": prompt_id,
+                "status": status,
+                "outputs": collected,
+                "error": error,
+                "sampling": sampling_metrics(self._progress.pop(prompt_id, None)),
+            }
+            future = self._futures.pop(prompt_id, None)
+            if future is None:
+                self._finished[prompt_id] = result
+                while len(self._finished) > FINISHED_CACHE_SIZE:
+                    self._finished.popitem(last=False)
+                return
+        if not future.done():
+            future.set_result(result)
+
+    def _handle_message(self, message: Dict):
+        received = time.time()
+        if self._listeners:
+            for listener in list(self._listeners):
+                try:
+                    listener(message, received)
+                except Exception:
+                    pass
+
+        msg_type = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        if msg_type == "executed":
+            with self._lock:
+                self._outputs.setdefault(prompt_id, {})[str(data.get("node"))] = data.get("output")
+        elif msg_type == "execution_start":
+            with self._lock:
+                self._progress[prompt_id] = {"started": received, "nodes": {}}
+        elif msg_type == "progress":
+            with self._lock:
+                job = self._progress.get(prompt_id)
+                if job is not None:
+                    node = job["nodes"].setdefault(str(data.get("node")), {
+                        "first": received, "last": received, "events": 0, "steps": 0})
+                    node["last"] = received
+                    node["events"] += 1
+                    node["steps"] = int(data.get("max") or node["steps"])
+        elif msg_type == "execution_success":
+            self._resolve(prompt_id, "success")
+        elif msg_type == "executing" and data.get("node") is None:
+            # Older servers signal completion with executing(node=None)
+            self._resolve(prompt_id, "success")
+        elif msg_type == "execution_error":
+            error = f"{data.get('node_type', '?')}: {data.get('exception_message', 'unknown error')}"
+            self._resolve(prompt_id, "error", error=error.strip())
+        elif msg_type == "execution_interrupted":
+            self._resolve(prompt_id, "interrupted", error="interrupted")
+
+    def _connect(self) -> bool:
+        if websocket is None:
+            return False
+        try:
+            self._ws = websocket.create_connection(self.ws_url, timeout=5)
+            self._ws.settimeout(1.0)
+            self.connected.set()
+            return True
+        except Exception:
+            self._ws = None
+            return False
+
+    def _receive_loop(self):
+        while not self._stop.is_set():
+            try:
+                raw = self._ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except Exception:
+                break
+            if not isinstance(raw, str):
+                continue  # binary preview frames
+            try:
+                self._handle_message(json.loads(raw))
+            except ValueError:
+                continue
+        self.connected.clear()
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        self._ws = None
+
+    def _check_history(self, prompt_id: str):
+        try:
+            entry = self.client.history(prompt_id).get(prompt_id)
+        except Exception:
+            return
+        if entry:
+            status = entry.get("status", {})
+            messages = [msg[0] for msg in status.get("messages", [])]
+            # Interrupted jobs are also recorded with status_str "error"
+            if "execution_interrupted" in messages:
+                self._resolve(prompt_id, "interrupted", entry.get("outputs"), error="interrupted")
+            elif status.get("status_str") == "error" or "execution_error" in messages:
+                self._resolve(prompt_id, "error", entry.get("outputs"), error="execution_error")
+            elif status.get("completed", True):
+                self._resolve(prompt_id, "success", entry.get("outputs"))
+
+    def _sweep_history(self):
+        """Poll /history for every pending job (fallback path)"""
+        for prompt_id in self.pending():
+            self._check_history(prompt_id)
+
+    def _run(self):
+        last_attempt = 0.0
+        while not self._stop.is_set():
+            if time.time() - last_attempt >= self.reconnect_interval:
+                last_attempt = time.time()
+                if self._connect():
+                    # Catch anything that finished while we were disconnected
+                    self._sweep_history()
+                    self._receive_loop()
+                    continue
+            self._sweep_history()
+            self._stop.wait(self.poll_interval)
@@ -1,16 +1,32 @@
 #!/usr/bin/env python3
 """
 Compare FP16 models vs Q8 GGUF models
-Tests: Speed, quality, VRAM usage
+Tests: Speed, quality, VRAM usage (sampled from /system_stats while each job runs)
 """
-import requests
 import json
 import time
 import os
+import argparse
 from datetime import datetime
 
+from comfy_client import ComfyAPIError, ComfyClient
+from comfy_ws import CompletionTracker
+from memory_sampler import DEFAULT_INTERVAL, MemorySampler
+from result_cache import ResultCache
+
 BASE_URL = "http://localhost:8188"
 
+client = ComfyClient(BASE_URL)
+
+# VRAM/RAM polled from /system_stats; websocket events mark when each job ran
+memory = MemorySampler(client)
+tracker = CompletionTracker(BASE_URL, client_id=client.client_id, client=client)
+tracker.add_listener(memory)
+
+# Off by default: these scripts time generation, and a reused result would
+# report the time of an earlier run. --use-cache reuses fixed-seed results.
+cache = ResultCache(enabled=False)
+
 # Test configurations
 TESTS = [
     {
@@ -27,6 +43,18 @@ TESTS = [
     }
 ]
 
+def load_workflow(workflow_file, seed=12345):
+    """Load a workflow with its KSampler seed fixed"""
+    with open(workflow_file, 'r') as f:
+        workflow = json.load(f)
+
+    # Update seed
+    for node_id, node in workflow.items():
+        if node.get('class_type') == 'KSampler':
+            node['inputs']['seed'] = seed
+
+    return workflow
+
 def submit_workflow(workflow_file, seed=12345):
     """Submit a workflow to ComfyUI"""
     if not os.path.exists(workflow_file):
@@ -34,17 +62,7 @@ def submit_workflow(workflow_file, seed=12345):
         return None
 
     try:
-        with open(workflow_file, 'r') as f:
-            workflow = json.load(f)
-
-        # Update seed
-        for node_id, node in workflow.items():
-            if node.get('class_type') == 'KSampler':
-                node['inputs']['seed'] = seed
-
-        data = {'prompt': workflow}
-        response = requests.post(f"{BASE_URL}/prompt", json=data, timeout=10)
-        result = response.json()
+        result = client.submit(load_workflow(workflow_file, seed))
 
         if result.get('node_errors'):
             print(f"  ❌ Submission error: {result['node_errors']}")
@@ -54,6 +72,9 @@ def submit_workflow(workflow_file, seed=12345):
         print(f"  ✅ Submitted (ID: {prompt_id[:8]}...)")
         return prompt_id
 
+    except ComfyAPIError as e:
+        print(f"  ❌ Submission error: {e.node_errors or e}")
+        return None
     except Exception as e:
         print(f"  ❌ Failed: {e}")
         return None
@@ -61,8 +82,7 @@ def submit_workflow(workflow_file, seed=12345):
 def check_job_status(prompt_id):
     """Check job completion status"""
     try:
-        resp = requests.get(f"{BASE_URL}/history/{prompt_id}", timeout=5)
-        history = resp.json()
+        history = client.history(prompt_id)
 
         if prompt_id not in history:
             return "running"
@@ -85,7 +105,32 @@ def check_job_status(prompt_id):
     except Exception as e:
         return "unknown"
 
+def store_result(test, job_id, elapsed, usage=None):
+    """Cache a finished job's images so the next run can skip the GPU"""
+    try:
+        outputs = client.history(job_id).get(job_id, {}).get('outputs')
+        cache.store_outputs(load_workflow(test['workflow']), client, outputs,
+                            meta={"time": elapsed, "model": test['name'], "memory": usage})
+    except Exception as e:
+        print(f"  (cache store failed: {e})")
+
+def cached_result(test):
+    """Stored result for this test's workflow, or None"""
+    if not os.path.exists(test['workflow']):
+        return None
+    return cache.get(load_workflow(test['workflow']))
+
 def main():
+    parser = argparse.ArgumentParser(description='FP16 vs Q8 GGUF model comparison')
+    parser.add_argument('--use-cache', action='store_true',
+                        help='Reuse cached fixed-seed results instead of regenerating '
+                             '(their times are from the run that generated them)')
+    parser.add_argument('--memory-interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'Seconds between VRAM/RAM samples (default: {DEFAULT_INTERVAL})')
+    args = parser.parse_args()
+    cache.enabled = args.use_cache
+    memory.interval = args.memory_interval
+
     print("=" * 70)
     print("FP16 vs Q8 GGUF MODEL COMPARISON TEST")
     print("=" * 70)
@@ -93,10 +138,13 @@ def main():
     print("")
 
     # Verify ComfyUI connection
-    try:
-        response = requests.get(f"{BASE_URL}/", timeout=5)
+    if client.ping():
         print("✅ ComfyUI server connected")
-    except:
+        tracker.start()
+        memory.start()
+        if not tracker.connected.wait(5):
+            print("⚠️  Websocket not connected; VRAM cannot be attributed to jobs")
+    else:
         print("❌ ComfyUI server not accessible at http://localhost:8188")
         print("   Start server with: .\\start-comfy-optimized.ps1")
         return
@@ -109,7 +157,7 @@ def main():
     print("")
     print("Metrics to Compare:")
     print("  - Generation time (seconds per image)")
-    print("  - VRAM usage")
+    print(f"  - VRAM usage (peak/mean, sampled every {memory.interval:g}s)")
     print("  - Output quality (visual comparison)")
     print("  - File size savings")
     print("")
@@ -119,15 +167,23 @@ def main():
     print("-" * 70)
 
     job_ids = {}
+    results = {}
     for test in TESTS:
         print(f"\n{test['name']}")
         print(f"  Type: {test['model_type']}")
         print(f"  Size: {test['expected_size']}")
+        cached = cached_result(test)
+        if cached:
+            elapsed = cached['meta'].get('time', 0)
+            results[test['name']] = {"status": "✅ COMPLETED (cached)", "time": elapsed,
+                                     "memory": cached['meta'].get('memory')}
+            print(f"  ♻️  Cached result reused, GPU skipped ({elapsed:.1f}s when generated)")
+            continue
         job_id = submit_workflow(test['workflow'])
         if job_id:
             job_ids[test['name']] = job_id
 
-    if not job_ids:
+    if not job_ids and not results:
         print("\n❌ No jobs submitted successfully")
         return
 
@@ -136,7 +192,6 @@ def main():
     print("=" * 70)
 
     # Wait and monitor
-    results = {}
     start_time = time.time()
     timeout = 600  # 10 minutes
 
@@ -151,9 +206,12 @@ def main():
                     elapsed = time.time() - start_time
                     results[test_name] = {
                         "status": "✅ COMPLETED",
-                        "time": elapsed
+                        "time": elapsed,
+                        "memory": memory.job(job_id)
                     }
                     print(f"{test_name}: {results[test_name]['status']} ({elapsed:.1f}s)")
+                    store_result(next(t for t in TESTS if t['name'] == test_name), job_id, elapsed,
+                                 results[test_name]['memory'])
 
                 elif status == "error":
                     results[test_name] = {"status": "❌ ERROR"}
@@ -181,6 +239,15 @@ def main():
         print(f"Status: {result['status']}")
         if 'time' in result:
             print(f"Generation Time: {result['time']:.1f} seconds")
+        usage = result.get('memory')
+        if usage:
+            idle = f", {usage['idle_vram_gb']:.1f}GB before the job" if usage.get('idle_vram_gb') is not None else ""
+            print(f"VRAM: peak {usage['peak_vram_gb']:.1f}GB, mean {usage['mean_vram_gb']:.1f}GB "
+                  f"of {usage['vram_total_gb']:.1f}GB{idle}")
+            if usage.get('peak_ram_gb') is not None:
+                print(f"RAM: peak {usage['peak_ram_gb']:.1f}GB, mean {usage['mean_ram_gb']:.1f}GB")
+        elif 'time' in result:
+            print("VRAM: not measured")
         print("")
 
     # Summary
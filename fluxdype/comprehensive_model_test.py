@@ -3,15 +3,31 @@
 Comprehensive Model Testing Suite
 Tests ALL models in parallel and generates detailed report
 """
-import requests
 import json
 import time
 import os
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from comfy_client import ComfyAPIError, ComfyClient
+from comfy_ws import CompletionTracker
+from latency_model import ExecutionTimer, LatencyModel
+from model_scheduler import ModelAffinityScheduler
+from workflow_validator import WorkflowValidator
 
 BASE_URL = "http://localhost:8188"
 
+# Shared by all worker threads: one connection pool, one event listener
+client = ComfyClient(BASE_URL)
+tracker = CompletionTracker(BASE_URL, client_id=client.client_id, client=client)
+
+# Measured execution times train the latency model behind the ETAs
+latency = LatencyModel.load()
+execution_timer = ExecutionTimer()
+tracker.add_listener(execution_timer)
+submitted_workflows = {}
+
+# Schema-checked before submission; loaded on first use
+validator = None
+
 # All test models
 MODELS = [
     {
@@ -44,6 +60,13 @@ MODELS = [
     }
 ]
 
+def get_validator():
+    """Shared validator (schema cached on disk, model folders indexed once)"""
+    global validator
+    if validator is None:
+        validator = WorkflowValidator.from_server(BASE_URL, client=client)
+    return validator
+
 def submit_workflow(workflow_file, seed=12345):
     """Submit workflow and return job ID"""
     if not os.path.exists(workflow_file):
@@ -58,46 +81,57 @@ def submit_workflow(workflow_file, seed=12345):
             if node.get('class_type') == 'KSampler':
                 node['inputs']['seed'] = seed
 
-        response = requests.post(f"{BASE_URL}/prompt", json={'prompt': workflow}, timeout=10)
-        result = response.json()
+        problems = get_validator().validate(workflow)
+        if not problems.ok:
+            return None, f"Invalid workflow: {problems.summary(2)}"
+
+        result = client.submit(workflow)
 
         if result.get('node_errors'):
             return None, f"Submission error: {result['node_errors']}"
 
-        return result.get('prompt_id'), None
+        prompt_id = result.get('prompt_id')
+        if prompt_id:
+            submitted_workflows[prompt_id] = workflow
+        return prompt_id, None
+    except ComfyAPIError as e:
+        return None, f"Submission error: {e.node_errors or e}"
     except Exception as e:
         return None, str(e)
 
 def monitor_job(job_id, timeout_seconds=900):
     """Monitor a job until completion"""
     start = time.time()
+    result = tracker.wait(job_id, timeout=timeout_seconds)
 
-    while time.time() - start < timeout_seconds:
+    if result is None:
+        # Stop it on the server so the next model test does not queue behind it
         try:
-            resp = requests.get(f"{BASE_URL}/history/{job_id}", timeout=5)
-            history = resp.json()
-
-            if job_id not in history:
-                time.sleep(2)
-                continue
-
-            status = history[job_id].get('status', {})
-            messages = status.get('messages', [])
-
-            # Check for error
-            if any(msg[0] == 'execution_error' for msg in messages):
-                return "error", time.time() - start
-
-            # Check for completion
-            if any(msg[0] in ['execution_cached', 'execution_success'] for msg in messages):
-                return "completed", time.time() - start
-
-        except Exception as e:
+            client.cancel(job_id)
+        except Exception:
             pass
-
-        time.sleep(2)
-
-    return "timeout", time.time() - start
+        tracker.forget(job_id)
+        submitted_workflows.pop(job_id, None)
+        return "timeout", time.time() - start
+
+    workflow = submitted_workflows.pop(job_id, None)
+    if result['status'] != 'success':
+        return "error", time.time() - start
+
+    if workflow is not None:
+        latency.record(workflow, execution_timer.result(job_id))
+    return "completed", time.time() - start
+
+def schedule_models(models):
+    """Order models so tests sharing weights run back to back"""
+    scheduler = ModelAffinityScheduler(latency=latency)
+    for model in models:
+        try:
+            with open(model['workflow'], 'r') as f:
+                scheduler.add(model, json.load(f))
+        except (OSError, ValueError):
+            scheduler.add(model, {})
+    return scheduler.order(), scheduler.report()
 
 def test_model(model, seed=12345):
     """Test a single model"""
@@ -143,10 +177,13 @@ def main():
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     # Check server
-    try:
-        requests.get(f"{BASE_URL}/", timeout=5)
+    if client.ping():
         print("Server: ComfyUI connected")
-    except:
+        # Connect before the first job is queued so its events are not missed
+        tracker.start()
+        if not tracker.connected.wait(5):
+            print("WARNING: Websocket not connected; jobs will have no execution times")
+    else:
         print("ERROR: ComfyUI not running")
         return
 
@@ -162,18 +199,18 @@ def main():
 
     print()
     print("="*60)
-    print("RUNNING TESTS (Parallel)")
+    print("RUNNING TESTS (one at a time, grouped by shared weights)")
     print("="*60)
 
-    results = []
-
-    # Run tests in parallel
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = {executor.submit(test_model, model): model['name'] for model in MODELS}
+    # Interleaving 12-23GB checkpoints on one GPU forces a reload per job,
+    # so run sequentially in model-affinity order instead
+    ordered, schedule = schedule_models(MODELS)
+    print(f"Model loads: {schedule['loads_scheduled']} "
+          f"(avoided {schedule['loads_avoided']} vs submission order)")
+    if 'estimate_scheduled' in schedule:
+        print(f"Estimated GPU time: {schedule['estimate_scheduled'].describe()}")
 
-        for future in as_completed(futures):
-            result = future.result()
-            results.append(result)
+    results = [test_model(model) for model in ordered]
 
     # Sort by category
     results.sort(key=lambda x: (x['category'], x['name']))
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Text-Conditioning Reuse
+ComfyUI keeps the outputs of the previous prompt and skips any node whose
+inputs are unchanged, so a text encoder only runs when its text (or CLIP
+model) differs from the job before it on that server. Batches get the most
+out of this when jobs with the same prompt follow each other, which
+group_repeats() and the router's affinity keys arrange.
+
+EncodeTimer is a websocket listener that measures what this saves: it times
+every text encoder that actually runs (from consecutive "executing" events)
+and counts the ones listed in "execution_cached", pricing each reuse at the
+median measured encode time of that node type.
+
+    timer = EncodeTimer()
+    tracker.add_listener(timer)
+    timer.expect(prompt_id, workflow)   # after each submit
+    timer.job(prompt_id)                # once the job finished
+"""
+
+import json
+import statistics
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Node types that turn prompt text into conditioning
+TEXT_ENCODERS = ("CLIPTextEncode", "CLIPTextEncodeFlux", "CLIPTextEncodeSDXL",
+                 "TextEncodeQwenImageEdit", "TextEncodeQwenImageEditPlus")
+
+# Events of jobs that were never expect()ed (e.g. submitted by another
+# script sharing the client_id) are dropped beyond this many
+UNEXPECTED_RUNS = 256
+
+# Reuse is priced from the most recent encodes of each type
+SAMPLE_WINDOW = 200
+
+_END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+def text_encoders(workflow: Dict, encoders: Iterable[str] = TEXT_ENCODERS) -> Dict[str, str]:
+    """Node ID -> class_type of every text encoder in an API workflow"""
+    encoders = tuple(encoders)
+    return {str(node_id): node["class_type"] for node_id, node in workflow.items()
+            if isinstance(node, dict) and node.get("class_type") in encoders}
+
+
+def group_repeats(items: Iterable[Any], key: Callable[[Any], Any] = lambda item: item) -> List[Any]:
+    """Items reordered so equal keys are adjacent, in order of first appearance"""
+    groups: Dict[Any, List[Any]] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return [item for group in groups.values() for item in group]
+
+
+class EncodeTimer:
+    """Websocket listener measuring text-encoder time and cache reuse per job"""
+
+    def __init__(self, encoders: Iterable[str] = TEXT_ENCODERS):
+        self.encoders = tuple(encoders)
+        self._runs: "OrderedDict[str, Dict]" = OrderedDict()   # prompt_id -> event state
+        self._expected: Dict[str, Dict[str, str]] = {}          # prompt_id -> encoder nodes
+        self._jobs: Dict[str, Dict] = {}                        # prompt_id -> settled result
+        self._samples: Dict[str, deque] = {}                    # class_type -> encode seconds
+        self._lock = threading.Lock()
+
+    def expect(self, prompt_id: str, workflow: Union[Dict, bytes, str]):
+        """Register a submitted job's workflow (API format, /prompt payload or its bytes)"""
+        if isinstance(workflow, (bytes, str)):
+            workflow = json.loads(workflow)
+        if isinstance(workflow.get("prompt"), dict):
+            workflow = workflow["prompt"]
+        nodes = text_encoders(workflow, self.encoders)
+        with self._lock:
+            self._expected[prompt_id] = nodes
+            self._settle(prompt_id)
+
+    def __call__(self, message: Dict, received: float):
+        msg_type = message.get("type")
+        if msg_type not in ("executing", "execution_cached") + _END_EVENTS:
+            return
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        with self._lock:
+            if prompt_id in self._jobs:
+                return
+            run = self._runs.get(prompt_id)
+            if run is None:
+                run = self._runs[prompt_id] = {"node": None, "started": 0.0, "seconds": {},
+                                               "cached": [], "done": False}
+                self._trim()
+
+            if msg_type == "execution_cached":
+                run["cached"] = [str(node) for node in data.get("nodes") or []]
+                return
+            # A node runs until the next one starts or the job ends
+            if run["node"] is not None:
+                run["seconds"][run["node"]] = received - run["started"]
+            node = data.get("node") if msg_type == "executing" else None
+            run["node"] = str(node) if node is not None else None
+            run["started"] = received
+            if node is None:
+                run["done"] = True
+                self._settle(prompt_id)
+
+    def _trim(self):
+        unexpected = [pid for pid in self._runs if pid not in self._expected]
+        for prompt_id in unexpected[:max(0, len(unexpected) - UNEXPECTED_RUNS)]:
+            del self._runs[prompt_id]
+
+    def _settle(self, prompt_id: str):
+        """Fold a finished, expected job into the results (lock held)"""
+        run = self._runs.get(prompt_id)
+        if run is None or not run["done"] or prompt_id not in self._expected:
+            return
+        del self._runs[prompt_id]
+        nodes = self._expected.pop(prompt_id)
+        encoded = [(nodes[node], seconds) for node, seconds in run["seconds"].items() if node in nodes]
+        for class_type, seconds in encoded:
+            self._samples.setdefault(class_type, deque(maxlen=SAMPLE_WINDOW)).append(seconds)
+        self._jobs[prompt_id] = {
+            "encoded": encoded,
+            "reused": [nodes[node] for node in run["cached"] if node in nodes],
+        }
+
+    def _saved(self, reused: List[str]) -> Optional[float]:
+        """Seconds the reused encodes would have taken (None if never measured)"""
+        medians = {class_type: statistics.median(self._samples[class_type])
+                   for class_type in set(reused) if self._samples.get(class_type)}
+        priced = [medians[class_type] for class_type in reused if class_type in medians]
+        if reused and not priced:
+            return None
+        return sum(priced)
+
+    def job(self, prompt_id: str) -> Optional[Dict]:
+        """Encoder stats of one finished job, or None without its events
+
+        {"encoded", "encode_seconds", "reused", "saved_seconds"}: how many
+        encoders ran and their measured time, how many came from the cache
+        and the time that saved.
+        """
+        with self._lock:
+            result = self._jobs.get(prompt_id)
+            if result is None:
+                return None
+            return {
+                "encoded": len(result["encoded"]),
+                "encode_seconds": sum(seconds for _, seconds in result["encoded"]),
+                "reused": len(result["reused"]),
+                "saved_seconds": self._saved(result["reused"]),
+            }
+
+    def summary(self) -> Dict:
+        """Totals over every finished job, with per-type median encode times"""
+        with self._lock:
+            encoded: List[Tuple[str, float]] = []
+            reused: List[str] = []
+            for result in self._jobs.values():
+                encoded += result["encoded"]
+                reused += result["reused"]
+            return {
+                "jobs": len(self._jobs),
+                "encoded": len(encoded),
+                "encode_seconds": sum(seconds for _, seconds in encoded),
+                "reused": len(reused),
+                "saved_seconds": self._saved(reused),
+                "median_seconds": {class_type: statistics.median(samples)
+                                   for class_type, samples in self._samples.items()},
+            }
+
+
+def describe_reuse(stats: Optional[Dict]) -> str:
+    """Short report of a job() or summary() result, '' when nothing was measured"""
+    if not stats or not (stats["encoded"] or stats["reused"]):
+        return ""
+    parts = []
+    if stats["encoded"]:
+        parts.append(f"{stats['encoded']} encoded ({stats['encode_seconds']:.2f}s)")
+    if stats["reused"]:
+        saved = stats["saved_seconds"]
+        parts.append(f"{stats['reused']} reused" + (f", ~{saved:.2f}s saved" if saved is not None else ""))
+    return ", ".join(parts)
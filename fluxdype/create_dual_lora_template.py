@@ -7,6 +7,8 @@ Create template with dual LoRAs:
 
 import json
 
+from workflow_graph import canonical_widget_rows
+
 # Load realistic template
 with open('HyperFlux-Turbo-REALISTIC-FIXED.json', 'r') as f:
     template = json.load(f)
@@ -29,6 +31,8 @@ for node in template['nodes']:
         })
         
         node['properties']['_notes'] = "Dual LoRA: Turbo 0.8 + Realism 0.8"
+        # Same stack as every other template listing these LoRAs: sorted, merged
+        node['widgets_values'] = canonical_widget_rows(node['widgets_values'])
 
 # Save template
 with open('HyperFlux-Turbo-DualLoRA-FIXED.json', 'w') as f:
@@ -7,6 +7,9 @@ Phone camera aesthetic, vertical format
 import json
 import os
 
+from workflow_graph import canonical_widget_rows
+from workflow_template import WorkflowTemplate, slot
+
 # Load the base template
 with open('HyperFlux-Turbo-REALISTIC-FIXED.json', 'r') as f:
     template = json.load(f)
@@ -20,6 +23,8 @@ for node in template['nodes']:
         if len(node['widgets_values']) > 3:
             node['widgets_values'][3]['strength'] = 0.8
         node['properties']['_notes'] = "Turbo LoRA 0.8 + Instagram Realism LoRA 0.8"
+        # Same stack as every other template listing these LoRAs: sorted, merged
+        node['widgets_values'] = canonical_widget_rows(node['widgets_values'])
     
     # Reduce steps to 8 for speed
     if node['id'] == 16 and node['type'] == 'BasicScheduler':
@@ -88,23 +93,27 @@ os.makedirs('workflows/pov_portfolio', exist_ok=True)
 print("🔥 Creating POV/Intimate Portfolio (9 scenarios)")
 print("Settings: 8 steps, 896x1152 (phone vertical), Instagram LoRA 0.8\n")
 
+# Scenarios differ only in prompt, ID and filename: compile the file once
+template['id'] = slot('workflow_id')
+for node in template['nodes']:
+    if node['id'] == 17 and node['type'] == 'CLIPTextEncode':
+        node['widgets_values'] = [slot('prompt')]
+
+    if node['id'] == 23 and node['type'] == 'EmptySD3LatentImage':
+        node['widgets_values'] = [896, 1152, 1]  # Phone vertical
+
+    if node['id'] == 5 and node['type'] == 'SaveImage':
+        node['widgets_values'] = [slot('filename_prefix')]
+scenario_template = WorkflowTemplate(template, indent=2, ensure_ascii=True)
+
 for idx, scene in enumerate(pov_scenarios, 1):
-    workflow = json.loads(json.dumps(template))
-    workflow['id'] = f"pov-{scene['name']}"
-    
-    for node in workflow['nodes']:
-        if node['id'] == 17 and node['type'] == 'CLIPTextEncode':
-            node['widgets_values'] = [scene['prompt']]
-        
-        if node['id'] == 23 and node['type'] == 'EmptySD3LatentImage':
-            node['widgets_values'] = [896, 1152, 1]  # Phone vertical
-        
-        if node['id'] == 5 and node['type'] == 'SaveImage':
-            node['widgets_values'] = [f"POV_{idx:02d}_{scene['name']}"]
-    
     output_path = f"workflows/pov_portfolio/{idx:02d}_{scene['name']}.json"
-    with open(output_path, 'w') as f:
-        json.dump(workflow, f, indent=2)
+    with open(output_path, 'wb') as f:
+        f.write(scenario_template.render(
+            workflow_id=f"pov-{scene['name']}",
+            prompt=scene['prompt'],
+            filename_prefix=f"POV_{idx:02d}_{scene['name']}"
+        ))
     
     print(f"{idx:2d}. ✓ {scene['title']}")
     print(f"     {output_path}")
@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
 """Download all 10 beach portfolio images."""
 
-import requests
-import os
 from pathlib import Path
-import time
+
+from output_downloader import download
 
 # Beach portfolio job IDs (in order)
 BEACH_JOBS = [
@@ -27,68 +26,12 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 print("🌊 Downloading Beach Portfolio (10 images)...")
 print("⏳ Waiting for generation to complete...\n")
 
-# Wait a bit for generation to start
-time.sleep(10)
-
-downloaded = 0
+# Each image downloads as soon as its job finishes; finished files are skipped
 max_wait = 180  # 3 minutes max wait
-start_time = time.time()
-
-while downloaded < len(BEACH_JOBS) and (time.time() - start_time) < max_wait:
-    for idx, job_id in enumerate(BEACH_JOBS, 1):
-        try:
-            # Get job history
-            history_url = f"http://localhost:8188/history/{job_id}"
-            response = requests.get(history_url, timeout=5)
-            
-            if response.status_code != 200:
-                continue
-            
-            data = response.json()
-            job_data = data.get(job_id, {})
-            
-            # Check if completed
-            status = job_data.get('status', {})
-            if not status.get('completed', False):
-                continue
-            
-            # Extract output images
-            outputs = job_data.get('outputs', {})
-            
-            for node_id, node_output in outputs.items():
-                images = node_output.get('images', [])
-                
-                for img_info in images:
-                    filename = img_info['filename']
-                    output_path = OUTPUT_DIR / filename
-                    
-                    # Skip if already downloaded
-                    if output_path.exists():
-                        continue
-                    
-                    subfolder = img_info.get('subfolder', '')
-                    file_type = img_info.get('type', 'output')
-                    
-                    # Download the image
-                    view_url = f"http://localhost:8188/view?filename={filename}&subfolder={subfolder}&type={file_type}"
-                    img_response = requests.get(view_url, timeout=10)
-                    
-                    if img_response.status_code == 200:
-                        with open(output_path, 'wb') as f:
-                            f.write(img_response.content)
-                        
-                        size_mb = len(img_response.content) / 1024 / 1024
-                        downloaded += 1
-                        print(f"{downloaded:2d}/10 ✓ {filename} ({size_mb:.2f} MB)")
-        
-        except Exception as e:
-            continue
-    
-    if downloaded < len(BEACH_JOBS):
-        time.sleep(5)
-        print(".", end="", flush=True)
+stats = download(BEACH_JOBS, OUTPUT_DIR, wait=max_wait)
+downloaded = stats['downloaded'] + stats['skipped']
 
 print(f"\n\n✅ Downloaded {downloaded}/10 images to: {OUTPUT_DIR.absolute()}")
 
-if downloaded < len(BEACH_JOBS):
+if stats.get('unfinished'):
     print(f"\n⚠️  Some images may still be processing. Run this script again in a moment.")
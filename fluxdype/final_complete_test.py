@@ -3,15 +3,37 @@
 FINAL COMPLETE TEST SUITE - FP16 & GGUF Models
 Comprehensive comparison with full reporting
 """
-import requests
 import json
 import time
 import os
+import argparse
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from comfy_client import ComfyAPIError, ComfyClient
+from comfy_ws import CompletionTracker
+from latency_model import ExecutionTimer, LatencyModel
+from model_scheduler import ModelAffinityScheduler
+from result_cache import ResultCache
+from workflow_validator import WorkflowValidator
 
 BASE_URL = "http://localhost:8188"
 
+# Shared by all worker threads: one connection pool, one event listener
+client = ComfyClient(BASE_URL)
+tracker = CompletionTracker(BASE_URL, client_id=client.client_id, client=client)
+
+# Measured execution times train the latency model behind the ETAs
+latency = LatencyModel.load()
+execution_timer = ExecutionTimer()
+tracker.add_listener(execution_timer)
+submitted_workflows = {}
+
+# Off by default: these scripts time generation, and a reused result would
+# report the time of an earlier run. --use-cache reuses fixed-seed results.
+cache = ResultCache(enabled=False)
+
+# Broken workflows are rejected before they take a queue slot (--no-validate)
+validator = None
+
 # ALL MODELS - FP16 AND GGUF
 ALL_MODELS = [
     # FP16 MODELS (Baseline)
@@ -60,63 +82,98 @@ ALL_MODELS = [
     }
 ]
 
+def load_workflow(workflow_file, seed=12345):
+    """Load a workflow with its KSampler seed fixed"""
+    with open(workflow_file, 'r') as f:
+        workflow = json.load(f)
+
+    for node_id, node in workflow.items():
+        if node.get('class_type') == 'KSampler':
+            node['inputs']['seed'] = seed
+
+    return workflow
+
 def submit_workflow(workflow_file, seed=12345):
     """Submit workflow to ComfyUI"""
     if not os.path.exists(workflow_file):
         return None, f"File not found: {workflow_file}"
 
     try:
-        with open(workflow_file, 'r') as f:
-            workflow = json.load(f)
-
-        for node_id, node in workflow.items():
-            if node.get('class_type') == 'KSampler':
-                node['inputs']['seed'] = seed
+        workflow = load_workflow(workflow_file, seed)
+        if validator is not None:
+            problems = validator.validate(workflow)
+            if not problems.ok:
+                return None, f"Invalid workflow: {problems.summary(2)}"
 
-        response = requests.post(f"{BASE_URL}/prompt", json={'prompt': workflow}, timeout=10)
-        result = response.json()
+        result = client.submit(workflow)
 
         if result.get('node_errors'):
             error_msg = str(result['node_errors']).replace("'", "").replace("{", "").replace("}", "")[:100]
             return None, f"Node error: {error_msg}"
 
-        return result.get('prompt_id'), None
+        prompt_id = result.get('prompt_id')
+        if prompt_id:
+            submitted_workflows[prompt_id] = workflow
+        return prompt_id, None
+    except ComfyAPIError as e:
+        error_msg = str(e.node_errors or e).replace("'", "").replace("{", "").replace("}", "")[:100]
+        return None, f"Node error: {error_msg}"
     except Exception as e:
         return None, str(e)
 
 def monitor_job(job_id, timeout_seconds=900):
     """Monitor job with timeout"""
     start = time.time()
+    result = tracker.wait(job_id, timeout=timeout_seconds)
 
-    while time.time() - start < timeout_seconds:
+    if result is None:
+        # Stop it on the server so the next model test does not queue behind it
         try:
-            resp = requests.get(f"{BASE_URL}/history/{job_id}", timeout=5)
-            history = resp.json()
-
-            if job_id not in history:
-                time.sleep(2)
-                continue
-
-            status = history[job_id].get('status', {})
-            messages = status.get('messages', [])
-
-            if any(msg[0] == 'execution_error' for msg in messages):
-                return "error", time.time() - start
-
-            if any(msg[0] in ['execution_cached', 'execution_success'] for msg in messages):
-                return "completed", time.time() - start
-
+            client.cancel(job_id)
         except Exception:
             pass
-
-        time.sleep(2)
-
-    return "timeout", time.time() - start
+        tracker.forget(job_id)
+        submitted_workflows.pop(job_id, None)
+        return "timeout", time.time() - start
+
+    workflow = submitted_workflows.pop(job_id, None)
+    if result['status'] != 'success':
+        return "error", time.time() - start
+
+    if workflow is not None:
+        latency.record(workflow, execution_timer.result(job_id))
+    return "completed", time.time() - start
+
+def schedule_models(models):
+    """Order models so tests sharing weights run back to back"""
+    scheduler = ModelAffinityScheduler(latency=latency)
+    for model in models:
+        try:
+            with open(model['workflow'], 'r') as f:
+                scheduler.add(model, json.load(f))
+        except (OSError, ValueError):
+            scheduler.add(model, {})
+    return scheduler.order(), scheduler.report()
 
 def test_model(model, seed=12345):
     """Test a single model"""
     print(f"\nTesting: {model['name']:<40} ({model['size']})", flush=True)
 
+    if os.path.exists(model['workflow']):
+        cached = cache.get(load_workflow(model['workflow'], seed))
+        if cached:
+            elapsed = cached['meta'].get('time', 0)
+            print(f"  COMPLETED (cached, GPU skipped): {elapsed:.1f}s when generated", flush=True)
+            return {
+                "name": model['name'],
+                "precision": model['precision'],
+                "status": "COMPLETED",
+                "time": elapsed,
+                "size": model['size'],
+                "category": model.get('category', 'other'),
+                "cached": True
+            }
+
     job_id, error = submit_workflow(model['workflow'], seed)
 
     if error:
@@ -135,6 +192,14 @@ def test_model(model, seed=12345):
     result_status = "COMPLETED" if status == "completed" else "FAILED"
     print(f"  {result_status}: {elapsed:.1f}s", flush=True)
 
+    if status == "completed":
+        try:
+            outputs = client.history(job_id).get(job_id, {}).get('outputs')
+            cache.store_outputs(load_workflow(model['workflow'], seed), client, outputs,
+                                meta={"time": elapsed, "model": model['name']})
+        except Exception as e:
+            print(f"  (cache store failed: {e})", flush=True)
+
     return {
         "name": model['name'],
         "precision": model['precision'],
@@ -145,15 +210,30 @@ def test_model(model, seed=12345):
     }
 
 def main():
+    global validator
+    parser = argparse.ArgumentParser(description='FP16 vs Q8 GGUF test suite')
+    parser.add_argument('--use-cache', action='store_true',
+                        help='Reuse cached fixed-seed results instead of regenerating '
+                             '(their times are from the run that generated them)')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Submit without checking workflows against the node schema first')
+    args = parser.parse_args()
+    cache.enabled = args.use_cache
+
     print("\n" + "="*80)
     print("  FINAL COMPLETE TEST SUITE - FP16 vs Q8 GGUF MODELS")
     print("="*80)
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    try:
-        requests.get(f"{BASE_URL}/", timeout=5)
+    if client.ping():
         print("Server: ComfyUI connected")
-    except:
+        # Connect before the first job is queued so its events are not missed
+        tracker.start()
+        if not tracker.connected.wait(5):
+            print("⚠ Websocket not connected; jobs will have no execution times")
+        if not args.no_validate:
+            validator = WorkflowValidator.from_server(BASE_URL, client=client)
+    else:
         print("ERROR: ComfyUI not running at http://localhost:8188")
         return
 
@@ -177,17 +257,18 @@ def main():
 
     print()
     print("="*80)
-    print("RUNNING ALL TESTS IN PARALLEL (Max 3 concurrent)")
+    print("RUNNING TESTS (one at a time, grouped by shared weights)")
     print("="*80)
 
-    results = []
-
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = {executor.submit(test_model, model): model['name'] for model in ALL_MODELS}
+    # Interleaving 12-23GB checkpoints on one GPU forces a reload per job,
+    # so run sequentially in model-affinity order instead
+    ordered, schedule = schedule_models(ALL_MODELS)
+    print(f"Model loads: {schedule['loads_scheduled']} "
+          f"(avoided {schedule['loads_avoided']} vs submission order)")
+    if 'estimate_scheduled' in schedule:
+        print(f"Estimated GPU time: {schedule['estimate_scheduled'].describe()}")
 
-        for future in as_completed(futures):
-            result = future.result()
-            results.append(result)
+    results = [test_model(model) for model in ordered]
 
     # Sort results
     results.sort(key=lambda x: (x.get('category', 'z'), x['name']))
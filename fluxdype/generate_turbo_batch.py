@@ -5,16 +5,32 @@ Optimized for RTX 3090 24GB - Maximum Speed!
 """
 
 import json
-import requests
 import time
 import argparse
 from pathlib import Path
 
+from comfy_client import ComfyClient
+from comfy_ws import CompletionTracker, describe_sampling
+from conditioning_reuse import EncodeTimer, describe_reuse
+from latency_model import ExecutionTimer, LatencyModel, format_duration, job_features, sampling_record
+from job_journal import DEFAULT_JOURNAL_PATH, SUBMITTED, SUCCESS, JobJournal, item_key
+from workflow_graph import canonicalize_workflow
+from workflow_template import WorkflowTemplate, standard_slots
+
 COMFY_URL = "http://localhost:8188"
 
+# Pooled API transport; the tracker resolves jobs from websocket events
+client = ComfyClient(COMFY_URL)
+tracker = CompletionTracker(COMFY_URL, client_id=client.client_id, client=client)
+# Every batch repeats the same prompt and negative: ComfyUI encodes them on
+# the first batch only, and this measures what the later ones save
+encode_timer = EncodeTimer()
+# Batch times are measured from execution events and train the ETA model
+execution_timer = ExecutionTimer()
+
 def create_turbo_workflow(prompt, negative_prompt, batch_size=4, steps=6, cfg=1.5, resolution=1024):
-    """Create optimized Turbo workflow"""
-    return {
+    """Create optimized Turbo workflow (canonical form, see workflow_graph.py)"""
+    return canonicalize_workflow({
         "1": {
             "inputs": {"ckpt_name": "flux1-krea-dev_fp8_scaled.safetensors"},
             "class_type": "CheckpointLoaderSimple"
@@ -80,36 +96,43 @@ def create_turbo_workflow(prompt, negative_prompt, batch_size=4, steps=6, cfg=1.
             },
             "class_type": "SaveImage"
         }
-    }
+    })
 
 def queue_prompt(workflow):
-    """Submit workflow to ComfyUI"""
+    """Submit workflow (or rendered payload bytes) to ComfyUI"""
     try:
-        response = requests.post(
-            f"{COMFY_URL}/prompt",
-            json={"prompt": workflow},
-            timeout=10
-        )
-        response.raise_for_status()
-        return response.json()
+        return client.submit(workflow, client_id=tracker.client_id)
     except Exception as e:
         print(f"Error: {e}")
         return None
 
-def wait_for_completion(prompt_id, timeout=300):
-    """Wait for generation"""
-    start = time.time()
-    while time.time() - start < timeout:
-        try:
-            response = requests.get(f"{COMFY_URL}/history/{prompt_id}", timeout=5)
-            if prompt_id in response.json():
-                return True
-        except:
-            pass
-        time.sleep(1)
-    return False
+def wait_for_completion(prompt_id, timeout=300, free=False):
+    """Wait for generation; returns the result dict
+
+    On timeout the job is removed from the server queue or interrupted (and
+    with free, models unloaded) so the next batch does not queue behind it;
+    the result then has status "timeout" and the cancel outcome as error.
+    """
+    result = tracker.wait(prompt_id, timeout=timeout)
+    if result is not None:
+        return result
+    try:
+        outcome = client.cancel(prompt_id, free=free)
+    except Exception as e:
+        outcome = f"cancel failed: {e}"
+    if outcome == "finished":
+        tracker.refresh(prompt_id)
+        result = tracker.wait(prompt_id, timeout=10)
+        if result is not None:
+            return result
+    tracker.forget(prompt_id)
+    if outcome == "interrupted" and free:
+        outcome += ", models unloaded"
+    return {"status": "timeout", "outputs": None, "error": f"timeout after {timeout}s ({outcome})"}
 
 def main():
+    global tracker
+
     parser = argparse.ArgumentParser(description='Ultra-fast batch image generation')
     parser.add_argument('--prompt', type=str,
                        default='A beautiful woman, professional photography, high quality, detailed',
@@ -127,9 +150,27 @@ def main():
                        help='CFG scale (1.0-2.0 for Turbo)')
     parser.add_argument('--resolution', type=int, default=1024,
                        help='Image resolution (512, 768, or 1024)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue the last identical run: skip finished batches, reattach queued ones')
+    parser.add_argument('--journal', type=str, default=str(DEFAULT_JOURNAL_PATH),
+                       help='SQLite job journal path')
+    parser.add_argument('--timeout', type=int, default=300,
+                       help='Seconds before an unfinished batch is dequeued or interrupted')
+    parser.add_argument('--free-on-timeout', action='store_true',
+                       help='Also unload models and free VRAM after interrupting a timed-out batch')
 
     args = parser.parse_args()
 
+    # A resumed run keeps its client_id so queued jobs still report to us
+    journal = JobJournal(args.journal)
+    config = {k: v for k, v in vars(args).items() if k not in ('resume', 'journal', 'timeout', 'free_on_timeout')}
+    session_id = journal.begin("generate_turbo_batch", config, resume=args.resume,
+                               client_id=tracker.client_id)
+    if session_id != tracker.client_id:
+        tracker = CompletionTracker(COMFY_URL, client_id=session_id, client=client)
+    tracker.add_listener(encode_timer)
+    tracker.add_listener(execution_timer)
+
     print("="*80)
     print("TURBO BATCH GENERATION - Flux Kria FP8 + Turbo LoRA")
     print("="*80)
@@ -143,23 +184,36 @@ def main():
     print(f"  Steps: {args.steps}")
     print(f"  CFG: {args.cfg}")
     print(f"  Resolution: {args.resolution}x{args.resolution}")
+    if journal.resumed:
+        print(f"  Resuming: {journal.summary()}")
+    elif args.resume:
+        print(f"  Resume: no journaled run matches, starting fresh")
     print()
-    print(f"Expected Time:")
+    # Every batch is the same graph with a new seed: compile it once
+    workflow = create_turbo_workflow(args.prompt, args.negative, args.batch_size,
+                                     args.steps, args.cfg, args.resolution)
+    template = WorkflowTemplate.for_prompt(workflow, {"seed": standard_slots(workflow)["seed"]})
 
-    # Calculate expected time
-    time_per_batch = 3 + (args.steps * args.batch_size * 0.5)  # Rough estimate
-    total_time = time_per_batch * args.batches
-    print(f"  ~{time_per_batch:.1f} seconds per batch")
-    print(f"  ~{total_time:.1f} seconds total ({total_time/60:.1f} minutes)")
+    # Learned from earlier runs; the first batch pays the model load
+    latency = LatencyModel.load()
+    features = job_features(workflow)
+    warm = {**features, "cold": False}
+    total = latency.estimate_batch(latency.schedule([features] * args.batches))
+    print(f"Expected Time:")
+    print(f"  First batch: {latency.estimate(features).describe()}")
+    print(f"  Per batch:   {latency.estimate(warm).describe()}")
+    print(f"  Total:       {total.describe()} ({format_duration(total.seconds)})")
     print()
 
     # Check server
-    try:
-        requests.get(f"{COMFY_URL}/system_stats", timeout=5)
-    except:
+    if not client.ping():
         print("ERROR: ComfyUI not running at http://localhost:8188")
         print("Start ComfyUI first!")
         return
+    # Connect before the first batch is queued so its events are not missed
+    tracker.start()
+    if not tracker.connected.wait(5):
+        print("WARNING: Websocket not connected; batches will have no timing or progress events")
 
     # Generate batches
     print("Starting generation...")
@@ -170,36 +224,69 @@ def main():
     start_time = time.time()
 
     for batch_num in range(1, args.batches + 1):
-        print(f"[Batch {batch_num}/{args.batches}] Queuing {args.batch_size} images...")
+        item = {"prompt": args.prompt, "prompt_index": 1, "variation": batch_num}
+        row = journal.lookup([item_key(item)]).get(item_key(item)) if journal.resumed else None
 
-        workflow = create_turbo_workflow(
-            args.prompt,
-            args.negative,
-            args.batch_size,
-            args.steps,
-            args.cfg,
-            args.resolution
-        )
+        if row and row['status'] == SUCCESS:
+            print(f"[Batch {batch_num}/{args.batches}] Already complete (journal), skipping")
+            successful_batches += 1
+            total_images += args.batch_size
+            print()
+            continue
 
         batch_start = time.time()
-        result = queue_prompt(workflow)
+        prompt_id = None
 
-        if result and 'prompt_id' in result:
-            prompt_id = result['prompt_id']
+        if row and row['status'] == SUBMITTED and client.job_state(row['prompt_id']):
+            prompt_id = row['prompt_id']
+            print(f"[Batch {batch_num}/{args.batches}] Reattached to queued job")
+            tracker.watch(prompt_id)
+            tracker.refresh(prompt_id)  # may have finished while we were down
+        else:
+            print(f"[Batch {batch_num}/{args.batches}] Queuing {args.batch_size} images...")
+
+            seed = int(time.time() * 1000) % 1000000  # Random seed
+            payload = template.render(seed=seed, client_id=tracker.client_id)
+            result = queue_prompt(payload)
+            if result and 'prompt_id' in result:
+                prompt_id = result['prompt_id']
+                encode_timer.expect(prompt_id, payload)
+                item['seed'] = seed
+                journal.submitted(prompt_id, COMFY_URL, [item],
+                                  preset=f"turbo-{args.steps}steps-cfg{args.cfg}",
+                                  resolution=f"{args.resolution}x{args.resolution}")
+
+        if prompt_id:
             print(f"              Prompt ID: {prompt_id}")
             print(f"              Generating... ", end='', flush=True)
 
-            if wait_for_completion(prompt_id, timeout=300):
+            result = wait_for_completion(prompt_id, timeout=args.timeout, free=args.free_on_timeout)
+            journal.finished(prompt_id, result['status'], result['outputs'], result['error'],
+                             sampling=sampling_record(workflow, result.get('sampling'), features))
+
+            if result['status'] == "success":
                 batch_time = time.time() - batch_start
                 time_per_image = batch_time / args.batch_size
                 successful_batches += 1
                 total_images += args.batch_size
                 print(f"DONE! ({batch_time:.1f}s total, {time_per_image:.1f}s per image)")
+                note = describe_reuse(encode_timer.job(prompt_id))
+                if note:
+                    print(f"              Text encoders: {note}")
+                speed = describe_sampling(result.get('sampling'))
+                if speed:
+                    print(f"              Sampling: {speed}")
+                latency.record(workflow, execution_timer.result(prompt_id))
             else:
-                print("TIMEOUT or FAILED")
+                print(f"{result['status'].upper()}: {result['error']}")
         else:
             print("              ERROR: Failed to queue")
 
+        remaining = args.batches - batch_num
+        if remaining:
+            eta = latency.estimate_batch([warm] * remaining)
+            print(f"              ETA: {format_duration(eta.seconds)} for {remaining} more "
+                  f"(95% {format_duration(eta.low)}-{format_duration(eta.high)})")
         print()
 
     # Summary
@@ -214,6 +301,9 @@ def main():
     print(f"Total Time: {total_time:.1f} seconds ({total_time/60:.1f} minutes)")
     if total_images > 0:
         print(f"Average: {total_time/total_images:.2f} seconds per image")
+    reuse = encode_timer.summary()
+    if reuse["encoded"] or reuse["reused"]:
+        print(f"Text encoding: {describe_reuse(reuse)}")
     print()
     print(f"Output: D:\\workspace\\fluxdype\\ComfyUI\\output\\turbo_batch_*.png")
     print()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Persistent Job Journal
+SQLite record of every batch item (prompt, variation, seed, preset) and the
+ComfyUI job that renders it, written as each job is submitted and finished.
+A restarted batch run with --resume skips finished items and reattaches to
+jobs still sitting in the server queue instead of resubmitting them.
+
+    journal = JobJournal()
+    client_id = journal.begin("batch_generate", config, resume=True)
+    journal.submitted(prompt_id, server_url, images, preset="high")
+    journal.finished(prompt_id, "success", outputs, images=images)
+
+Every write commits immediately (WAL mode), so a crash loses at most the
+job in flight.
+
+Finished jobs also keep their sampling speed (it/s and time to first step,
+see comfy_ws.sampling_metrics) and, when memory was sampled, peak and mean
+VRAM / RAM (see memory_sampler.py), with the model and resolution.
+sampling_stats() aggregates the most recent jobs of each:
+
+    python job_journal.py --sampling --window 50
+"""
+
+import hashlib
+import json
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_JOURNAL_PATH = SCRIPT_DIR / ".cache" / "job_journal.sqlite3"
+
+# Job states; only "submitted" jobs are candidates for reattaching
+SUBMITTED = "submitted"
+SUCCESS = "success"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key    TEXT PRIMARY KEY,
+    script     TEXT NOT NULL,
+    client_id  TEXT NOT NULL,
+    config     TEXT NOT NULL,
+    created    REAL NOT NULL,
+    updated    REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    prompt_id  TEXT PRIMARY KEY,
+    run_key    TEXT NOT NULL,
+    server     TEXT,
+    status     TEXT NOT NULL,
+    outputs    TEXT,
+    error      TEXT,
+    submitted  REAL NOT NULL,
+    finished   REAL,
+    model      TEXT,
+    resolution TEXT,
+    batch_size INTEGER,
+    steps      INTEGER,
+    it_per_s   REAL,
+    first_step REAL,
+    peak_vram  REAL,
+    mean_vram  REAL,
+    peak_ram   REAL,
+    mean_ram   REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_key      TEXT NOT NULL,
+    item_key     TEXT NOT NULL,
+    prompt_index INTEGER,
+    prompt       TEXT,
+    variation    INTEGER,
+    seed         INTEGER,
+    batch_index  INTEGER,
+    preset       TEXT,
+    resolution   TEXT,
+    prompt_id    TEXT,
+    filename     TEXT,
+    PRIMARY KEY (run_key, item_key)
+);
+CREATE INDEX IF NOT EXISTS items_prompt_id ON items (prompt_id);
+CREATE INDEX IF NOT EXISTS jobs_run_key ON jobs (run_key);
+"""
+
+# Columns added to jobs after the first release, for journals created before
+ADDED_COLUMNS = (("model", "TEXT"), ("resolution", "TEXT"), ("batch_size", "INTEGER"),
+                 ("steps", "INTEGER"), ("it_per_s", "REAL"), ("first_step", "REAL"),
+                 ("peak_vram", "REAL"), ("mean_vram", "REAL"), ("peak_ram", "REAL"), ("mean_ram", "REAL"))
+
+# Recent jobs per model and resolution that sampling_stats() aggregates
+SAMPLING_WINDOW = 50
+
+
+def _digest(value) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def item_key(image: Dict) -> str:
+    """Stable identity of one batch item: prompt position, text and variation
+
+    The seed is deliberately left out: unseeded runs draw a new random seed
+    on every start, and the journaled seed is what a resumed item keeps.
+    """
+    prompt_hash = hashlib.sha256(str(image.get("prompt", "")).encode("utf-8")).hexdigest()[:12]
+    return f"{image.get('prompt_index', 0)}:{image.get('variation', 0)}:{prompt_hash}"
+
+
+class JobJournal:
+    """SQLite-backed journal of batch items and the jobs that render them"""
+
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        with self._db:
+            for name, kind in ADDED_COLUMNS:
+                if name not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        self._lock = threading.Lock()
+        self.run_key: Optional[str] = None
+        self.client_id: Optional[str] = None
+        self.resumed = False
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _write(self, sql: str, rows: Iterable) -> None:
+        with self._lock:
+            with self._db:
+                self._db.executemany(sql, rows)
+
+    def begin(self, script: str, config: Dict, resume: bool = False,
+              client_id: Optional[str] = None) -> str:
+        """Start (or with resume, continue) the run identified by config
+
+        Returns the client_id to submit with. A resumed run keeps its
+        original client_id so websocket events for its queued jobs still
+        reach this session. Without resume any earlier record of the same
+        run is cleared.
+        """
+        self.run_key = _digest([script, config])
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT client_id FROM runs WHERE run_key = ?", (self.run_key,)
+            ).fetchone()
+            with self._db:
+                if resume and row is not None:
+                    self.client_id = row["client_id"]
+                    self.resumed = True
+                    self._db.execute("UPDATE runs SET updated = ? WHERE run_key = ?",
+                                     (now, self.run_key))
+                else:
+                    self.client_id = client_id or str(uuid.uuid4())
+                    self.resumed = False
+                    self._db.execute("DELETE FROM items WHERE run_key = ?", (self.run_key,))
+                    self._db.execute("DELETE FROM jobs WHERE run_key = ?", (self.run_key,))
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.run_key, script, self.client_id,
+                         json.dumps(config, sort_keys=True), now, now)
+                    )
+        return self.client_id
+
+    def submitted(self, prompt_id: str, server: Optional[str], images: List[Dict],
+                  preset: Optional[str] = None, resolution: Optional[str] = None):
+        """Record a submitted job and the items it renders"""
+        self._write(
+            "INSERT OR REPLACE INTO jobs (prompt_id, run_key, server, status, submitted) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(prompt_id, self.run_key, server, SUBMITTED, time.time())]
+        )
+        self._write(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (self.run_key, item_key(image), image.get("prompt_index"), image.get("prompt"),
+                 image.get("variation"), image.get("seed"), image.get("batch_index"),
+                 preset, resolution, prompt_id, image.get("filename"))
+                for image in images
+            ]
+        )
+
+    def finished(self, prompt_id: str, status: str, outputs: Optional[Dict] = None,
+                 error: Optional[str] = None, images: Optional[List[Dict]] = None,
+                 sampling: Optional[Dict] = None, memory: Optional[Dict] = None):
+        """Record a job's outcome and, for success, each item's output filename
+
+        sampling is the job's {"model", "resolution", "batch_size", "steps",
+        "it_per_s", "first_step"} and memory its MemorySampler.job() usage,
+        any of them optional.
+        """
+        sampling = sampling or {}
+        memory = memory or {}
+        self._write(
+            "UPDATE jobs SET status = ?, outputs = ?, error = ?, finished = ?, model = ?, resolution = ?, "
+            "batch_size = ?, steps = ?, it_per_s = ?, first_step = ?, peak_vram = ?, mean_vram = ?, "
+            "peak_ram = ?, mean_ram = ? WHERE prompt_id = ?",
+            [(status, json.dumps(outputs) if outputs else None, error, time.time(),
+              sampling.get("model"), sampling.get("resolution"), sampling.get("batch_size"),
+              sampling.get("steps"), sampling.get("it_per_s"), sampling.get("first_step"),
+              memory.get("peak_vram_gb"), memory.get("mean_vram_gb"),
+              memory.get("peak_ram_gb"), memory.get("mean_ram_gb"), prompt_id)]
+        )
+        if images:
+            self._write(
+                "UPDATE items SET filename = ? WHERE run_key = ? AND item_key = ?",
+                [(image.get("filename"), self.run_key, item_key(image))
+                 for image in images if image.get("filename")]
+            )
+
+    def lookup(self, keys: List[str]) -> Dict[str, Dict]:
+        """Journaled items of the current run by item_key, with their job's status"""
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT items.*, jobs.status, jobs.server, jobs.outputs FROM items "
+                "LEFT JOIN jobs ON jobs.prompt_id = items.prompt_id "
+                f"WHERE items.run_key = ? AND items.item_key IN ({placeholders})",
+                [self.run_key] + list(keys)
+            ).fetchall()
+        return {row["item_key"]: dict(row) for row in rows}
+
+    def jobs(self, status: Optional[str] = None, run_key: Optional[str] = None,
+             since: Optional[float] = None) -> List[Dict]:
+        """Journaled jobs, newest first, optionally filtered"""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if run_key:
+            clauses.append("run_key = ?")
+            params.append(run_key)
+        if since:
+            clauses.append("submitted >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs {where} ORDER BY submitted DESC", params
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["outputs"] = json.loads(job["outputs"]) if job["outputs"] else {}
+            jobs.append(job)
+        return jobs
+
+    def sampling_stats(self, window: int = SAMPLING_WINDOW, since: Optional[float] = None) -> List[Dict]:
+        """Sampling speed of the last window successful jobs of each model,
+        resolution and batch size, across all runs, busiest first
+
+        Each entry: model, resolution, batch_size, jobs, it_per_s (median),
+        it_per_s_low / it_per_s_high (min, max), first_step (median seconds),
+        peak_vram (highest peak GB, None if memory was never sampled) and
+        latest (finish time of the newest job).
+        """
+        sql = ("SELECT model, resolution, batch_size, it_per_s, first_step, peak_vram, finished FROM jobs "
+               "WHERE status = ? AND it_per_s IS NOT NULL")
+        params: List = [SUCCESS]
+        if since:
+            sql += " AND finished >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY finished DESC", params).fetchall()
+        groups: Dict[tuple, List] = {}
+        for row in rows:
+            group = groups.setdefault((row["model"] or "", row["resolution"] or "", row["batch_size"] or 1), [])
+            if len(group) < window:
+                group.append(row)
+        stats = []
+        for (model, resolution, batch_size), group in groups.items():
+            rates = [row["it_per_s"] for row in group]
+            first_steps = [row["first_step"] for row in group if row["first_step"] is not None]
+            peaks = [row["peak_vram"] for row in group if row["peak_vram"] is not None]
+            stats.append({
+                "model": model,
+                "resolution": resolution,
+                "batch_size": batch_size,
+                "jobs": len(group),
+                "it_per_s": statistics.median(rates),
+                "it_per_s_low": min(rates),
+                "it_per_s_high": max(rates),
+                "first_step": statistics.median(first_steps) if first_steps else None,
+                "peak_vram": max(peaks) if peaks else None,
+                "latest": group[0]["finished"],
+            })
+        return sorted(stats, key=lambda entry: (-entry["jobs"], entry["model"], entry["resolution"]))
+
+    def summary(self) -> Dict[str, int]:
+        """Item count per job status for the current run"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT COALESCE(jobs.status, 'unknown') AS status, COUNT(*) AS n FROM items "
+                "LEFT JOIN jobs ON jobs.prompt_id = items.prompt_id "
+                "WHERE items.run_key = ? GROUP BY 1", (self.run_key,)
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def format_sampling_stats(stats: List[Dict]) -> List[str]:
+    """Table lines of sampling_stats()"""
+    lines = [f"  {'model':<44} {'resolution':<11} {'batch':>5} {'jobs':>5} {'it/s':>7} "
+             f"{'range':>13} {'1st step':>9} {'peak VRAM':>10}"]
+    for entry in stats:
+        first_step = f"{entry['first_step']:.2f}s" if entry["first_step"] is not None else "-"
+        peak = f"{entry['peak_vram']:.1f}GB" if entry["peak_vram"] is not None else "-"
+        lines.append(f"  {entry['model'][:44] or '-':<44} {entry['resolution'] or '-':<11} "
+                     f"{entry['batch_size']:>5} {entry['jobs']:>5} {entry['it_per_s']:>7.2f} "
+                     f"{entry['it_per_s_low']:>6.2f}-{entry['it_per_s_high']:<6.2f} {first_step:>9} {peak:>10}")
+    return lines
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the job journal")
+    parser.add_argument("--journal", type=str, default=str(DEFAULT_JOURNAL_PATH),
+                        help="SQLite job journal path (default: .cache/job_journal.sqlite3)")
+    parser.add_argument("--sampling", action="store_true",
+                        help="Sampling speed (it/s, time to first step) and peak VRAM per model and resolution")
+    parser.add_argument("--window", type=int, default=SAMPLING_WINDOW,
+                        help=f"Recent jobs per model and resolution to aggregate (default: {SAMPLING_WINDOW})")
+    args = parser.parse_args()
+
+    journal = JobJournal(Path(args.journal))
+    try:
+        if args.sampling:
+            stats = journal.sampling_stats(args.window)
+            if not stats:
+                print("No jobs with sampling speed in the journal yet")
+            else:
+                print(f"Sampling speed, last {args.window} jobs per model and resolution:")
+                print("\n".join(format_sampling_stats(stats)))
+        else:
+            counts: Dict[str, int] = {}
+            for job in journal.jobs():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            print(f"{sum(counts.values())} jobs: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
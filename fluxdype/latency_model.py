@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Learned Job Latency Model
+Predicts how long ComfyUI takes to execute a job from its workflow: base
+model, precision, steps, resolution, batch size, LoRA count and whether the
+model has to be loaded (cold) or is still cached from the previous job
+(warm). Estimates come with a 95% prediction interval.
+
+Every finished job is one sample: execution time from the websocket
+"execution_start" event to its end, measured by ExecutionTimer. Samples are
+appended to .cache/latency_samples.jsonl and folded into running
+least-squares sums, so the model retrains incrementally as runs arrive and
+a new session starts from everything measured before.
+
+    latency = LatencyModel.load()
+    timer = ExecutionTimer()
+    tracker.add_listener(timer)
+    estimate = latency.estimate(job_features(workflow))
+    print(estimate.describe())            # ~41.2s (95% 37.9-44.5s, flux1-dev-fp8)
+    ...
+    latency.record(workflow, timer.result(prompt_id))
+
+Fits are kept per base model, per precision and overall; each estimate uses
+the one with the tightest interval. Until a fit has enough samples the old
+rule of thumb (overhead + seconds per step and megapixel) is used with a
++-50% band.
+"""
+
+import json
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from model_scheduler import BASE_LOADERS, lora_stack, model_signature
+from workflow_template import LATENT_SOURCES, SAMPLERS
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_SAMPLES_PATH = SCRIPT_DIR / ".cache" / "latency_samples.jsonl"
+
+# Precision tags found in model file names, longest match first
+PRECISION_TAGS = ("fp16", "bf16", "fp32", "fp8", "q8", "q6", "q5", "q4", "nf4", "gguf")
+
+# Rule of thumb used before any samples exist (RTX 3090, Flux FP8)
+PRIOR_OVERHEAD_SECONDS = 3.0
+PRIOR_SECONDS_PER_STEP_MP = 0.5
+PRIOR_LOAD_SECONDS = 10.0
+PRIOR_BAND = 0.5
+
+# Small ridge term keeps the normal equations solvable when a feature never
+# varied (e.g. every sample so far was warm)
+RIDGE = 1e-6
+
+# Two-sided 95% Student t quantiles by degrees of freedom (normal beyond)
+_T95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+_END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+def _t95(df: int) -> float:
+    return _T95[df - 1] if df <= len(_T95) else 1.96
+
+
+def model_precision(name: str) -> str:
+    """Precision tag of a model file name ("fp8", "q8", ...), "" if none"""
+    lowered = name.lower()
+    for tag in PRECISION_TAGS:
+        if tag in lowered:
+            return tag
+    return ""
+
+
+def base_loader_nodes(workflow: Dict) -> List[str]:
+    """Node IDs of the checkpoint / unet loaders in an API workflow"""
+    return [str(node_id) for node_id, node in workflow.items()
+            if isinstance(node, dict) and node.get("class_type") in BASE_LOADERS]
+
+
+def job_features(workflow: Dict, cached: Optional[Iterable[str]] = None) -> Dict:
+    """Latency features of an API-format workflow (or /prompt payload)
+
+    cold is True unless cached (the node IDs ComfyUI reported in
+    "execution_cached") includes every base model loader.
+    """
+    if isinstance(workflow.get("prompt"), dict):
+        workflow = workflow["prompt"]
+    steps = 0
+    width = height = 0
+    batch_size = 1
+    slice_length = None
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        if (class_type in SAMPLERS or class_type == "BasicScheduler") and isinstance(inputs.get("steps"), int):
+            steps += inputs["steps"]
+        elif class_type in LATENT_SOURCES and isinstance(inputs.get("width"), int):
+            width, height = inputs["width"], inputs.get("height", 0)
+            batch_size = int(inputs.get("batch_size", 1))
+        elif class_type == "LatentFromBatch" and isinstance(inputs.get("length"), int):
+            slice_length = inputs["length"]
+
+    base = model_signature(workflow).base
+    loaders = base_loader_nodes(workflow)
+    cached = set(str(node_id) for node_id in cached) if cached is not None else set()
+    return {
+        "model": "+".join(base),
+        "precision": model_precision(base[0]) if base else "",
+        "steps": steps,
+        "megapixels": round(width * height / 1_000_000, 4),
+        "resolution": f"{width}x{height}" if width else "",
+        "batch_size": slice_length or batch_size,
+        "loras": len(lora_stack(workflow)),
+        "cold": not loaders or not all(node_id in cached for node_id in loaders),
+    }
+
+
+def sampling_record(workflow: Union[Dict, bytes], sampling: Optional[Dict],
+                    features: Optional[Dict] = None) -> Optional[Dict]:
+    """Journal fields of a job's sampling speed: the tracker result's
+    "sampling" plus the model, resolution and batch size it was measured on"""
+    if not sampling:
+        return None
+    if features is None:
+        features = job_features(json.loads(workflow) if isinstance(workflow, (bytes, str)) else workflow)
+    return {"model": features["model"], "resolution": features["resolution"],
+            "batch_size": features["batch_size"], "steps": sampling["steps"],
+            "it_per_s": sampling["it_per_s"], "first_step": sampling["first_step"]}
+
+
+def _vector(features: Dict) -> List[float]:
+    """Regression inputs: constant, model load, LoRA count, sampling work, decoded pixels"""
+    pixels = features["megapixels"] * features["batch_size"]
+    return [1.0, 1.0 if features["cold"] else 0.0, float(features["loras"]),
+            features["steps"] * pixels, pixels]
+
+
+def _solve(matrix: List[List[float]], rhs: List[List[float]]) -> List[List[float]]:
+    """Solve matrix @ X = rhs by Gauss-Jordan elimination with partial pivoting"""
+    size = len(matrix)
+    rows = [matrix[i][:] + rhs[i][:] for i in range(size)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        lead = rows[col][col]
+        rows[col] = [value / lead for value in rows[col]]
+        for r in range(size):
+            if r != col and rows[r][col]:
+                factor = rows[r][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [row[size:] for row in rows]
+
+
+class _LeastSquares:
+    """Running normal equations of one linear fit"""
+
+    def __init__(self, size: int):
+        self.n = 0
+        self.xtx = [[0.0] * size for _ in range(size)]
+        self.xty = [0.0] * size
+        self.yty = 0.0
+        self.low = [math.inf] * size
+        self.high = [-math.inf] * size
+        self.prior_seconds = 0.0   # what the rule of thumb predicted for the samples
+        self.seconds = 0.0
+        self._solved: Optional[Tuple[List[float], List[List[float]], float]] = None
+
+    def add(self, x: Sequence[float], y: float, prior: float):
+        self.prior_seconds += prior
+        self.seconds += y
+        for i, xi in enumerate(x):
+            self.low[i] = min(self.low[i], xi)
+            self.high[i] = max(self.high[i], xi)
+            self.xty[i] += xi * y
+            row = self.xtx[i]
+            for j, xj in enumerate(x):
+                row[j] += xi * xj
+        self.yty += y * y
+        self.n += 1
+        self._solved = None
+
+    def covers(self, x: Sequence[float]) -> bool:
+        """False if x needs a coefficient the samples cannot identify (a
+        feature that never varied, e.g. a cold job when every sample was warm)"""
+        return all(low < high or value == low
+                   for value, low, high in zip(x[1:], self.low[1:], self.high[1:]))
+
+    def solve(self) -> Tuple[List[float], List[List[float]], float]:
+        """Coefficients, (X'X)^-1 and residual variance"""
+        if self._solved is None:
+            size = len(self.xty)
+            scale = max(self.xtx[i][i] for i in range(size)) or 1.0
+            matrix = [[self.xtx[i][j] + (RIDGE * scale if i == j else 0.0) for j in range(size)]
+                      for i in range(size)]
+            identity = [[1.0 if i == j else 0.0 for j in range(size)] for i in range(size)]
+            inverse = _solve(matrix, identity)
+            beta = [sum(inverse[i][j] * self.xty[j] for j in range(size)) for i in range(size)]
+            fitted = sum(b * v for b, v in zip(beta, self.xty))
+            residual = max(0.0, self.yty - 2 * fitted
+                           + sum(beta[i] * self.xtx[i][j] * beta[j]
+                                 for i in range(size) for j in range(size)))
+            variance = residual / max(1, self.n - size)
+            self._solved = (beta, inverse, variance)
+        return self._solved
+
+
+class Estimate(NamedTuple):
+    """Predicted execution seconds with a 95% interval"""
+    seconds: float
+    low: float
+    high: float
+    source: str      # fit used: a model name, a precision tag, "all" or "prior"
+    samples: int
+
+    def describe(self) -> str:
+        return (f"~{self.seconds:.1f}s (95% {self.low:.1f}-{self.high:.1f}s, "
+                f"{self.source}{f', {self.samples} samples' if self.samples else ''})")
+
+
+class LatencyModel:
+    """Incrementally trained job latency regression with prediction intervals"""
+
+    # A fit is used once it has this many samples beyond its parameters
+    MIN_DEGREES_OF_FREEDOM = 2
+
+    def __init__(self, path: Optional[Path] = DEFAULT_SAMPLES_PATH):
+        self.path = Path(path) if path else None
+        self.samples = 0
+        self._fits: Dict[Tuple[str, str], _LeastSquares] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Optional[Path] = DEFAULT_SAMPLES_PATH) -> "LatencyModel":
+        """Model trained on every sample recorded at path so far"""
+        model = cls(path)
+        if model.path and model.path.exists():
+            with open(model.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        sample = json.loads(line)
+                        model._add(sample["features"], float(sample["seconds"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn write or foreign line
+        return model
+
+    @staticmethod
+    def _keys(features: Dict) -> List[Tuple[str, str]]:
+        keys = [("all", "")]
+        if features.get("precision"):
+            keys.append(("precision", features["precision"]))
+        if features.get("model"):
+            keys.append(("model", features["model"]))
+        return keys
+
+    def _add(self, features: Dict, seconds: float):
+        x = _vector(features)
+        prior = self.prior(features).seconds
+        with self._lock:
+            for key in self._keys(features):
+                self._fits.setdefault(key, _LeastSquares(len(x))).add(x, seconds, prior)
+            self.samples += 1
+
+    def observe(self, features: Dict, seconds: float):
+        """Train on one measured job and append it to the samples file"""
+        if seconds <= 0:
+            return
+        self._add(features, seconds)
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            line = json.dumps({"time": time.time(), "features": features, "seconds": round(seconds, 4)})
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def record(self, workflow: Union[Dict, bytes], timing: Optional[Dict]) -> Optional[Dict]:
+        """Train on a finished job from its workflow (or /prompt payload
+        bytes) and ExecutionTimer result
+
+        Only successful runs are used. Returns the features recorded.
+        """
+        if not timing or timing.get("status") != "success" or not timing.get("seconds"):
+            return None
+        if isinstance(workflow, (bytes, str)):
+            workflow = json.loads(workflow)
+        features = job_features(workflow, timing.get("cached"))
+        self.observe(features, timing["seconds"])
+        return features
+
+    @staticmethod
+    def features(workflow: Dict) -> Dict:
+        """job_features() of a workflow about to be submitted (cold)"""
+        return job_features(workflow)
+
+    @staticmethod
+    def prior(features: Dict) -> Estimate:
+        """Rule-of-thumb estimate used before there is data"""
+        seconds = (PRIOR_OVERHEAD_SECONDS
+                   + PRIOR_SECONDS_PER_STEP_MP * features["steps"] * features["batch_size"]
+                   * max(features["megapixels"], 0.25)
+                   + (PRIOR_LOAD_SECONDS if features["cold"] else 0.0))
+        return Estimate(seconds, seconds * (1 - PRIOR_BAND), seconds * (1 + PRIOR_BAND), "prior", 0)
+
+    def _candidates(self, features_list: Sequence[Dict], counts: Sequence[int]):
+        """(fit name, fit, summed x, job count) per fit usable for every job"""
+        vectors = [_vector(features) for features in features_list]
+        total = [sum(count * value for count, value in zip(counts, column)) for column in zip(*vectors)]
+        common = set(self._keys(features_list[0]))
+        for features in features_list[1:]:
+            common &= set(self._keys(features))
+        for key in common:
+            fit = self._fits.get(key)
+            if (fit and fit.n - len(total) >= self.MIN_DEGREES_OF_FREEDOM
+                    and all(fit.covers(x) for x in vectors)):
+                yield (key[1] or key[0]), fit, total, sum(counts)
+
+    def _fitted(self, features_list: Sequence[Dict], counts: Sequence[int]) -> Optional[Estimate]:
+        """Tightest estimate among the fits covering every job"""
+        best: Optional[Estimate] = None
+        with self._lock:
+            for name, fit, total, count in self._candidates(features_list, counts):
+                beta, inverse, variance = fit.solve()
+                size = len(total)
+                mean = sum(b * x for b, x in zip(beta, total))
+                spread = sum(total[i] * inverse[i][j] * total[j] for i in range(size) for j in range(size))
+                half = _t95(fit.n - size) * math.sqrt(max(0.0, variance * (count + spread)))
+                candidate = Estimate(max(mean, 0.0), max(mean - half, 0.0), mean + half, name, fit.n)
+                if best is None or candidate.high - candidate.low < best.high - best.low:
+                    best = candidate
+        return best
+
+    def estimate(self, features: Dict) -> Estimate:
+        """Execution time of one job"""
+        return self.estimate_batch([features])
+
+    def estimate_batch(self, features_list: Sequence[Dict],
+                       counts: Optional[Sequence[int]] = None) -> Estimate:
+        """Total execution time of jobs run back to back on one GPU
+
+        counts[i] repeats features_list[i] (a long batch is a handful of
+        distinct job shapes). The interval covers both the per-job noise and
+        the uncertainty of the fitted coefficients, which is shared by all
+        jobs and so does not average out over a long batch. Jobs of
+        different models are estimated model by model and summed.
+        """
+        features_list = list(features_list)
+        counts = list(counts) if counts is not None else [1] * len(features_list)
+        if not features_list or not sum(counts):
+            return Estimate(0.0, 0.0, 0.0, "empty", 0)
+        groups: Dict[str, Tuple[List[Dict], List[int]]] = {}
+        for features, count in zip(features_list, counts):
+            group = groups.setdefault(features["model"], ([], []))
+            group[0].append(features)
+            group[1].append(count)
+        if len(groups) > 1:
+            parts = [self.estimate_batch(*group) for group in groups.values()]
+            return Estimate(sum(p.seconds for p in parts), sum(p.low for p in parts),
+                            sum(p.high for p in parts), "per model",
+                            min(p.samples for p in parts))
+
+        best = self._fitted(features_list, counts)
+        if best is not None:
+            return best
+
+        # Only warm runs measured so far: warm estimate plus the prior load cost
+        cold = sum(count for features, count in zip(features_list, counts) if features["cold"])
+        if cold:
+            warm = self._fitted([{**features, "cold": False} for features in features_list], counts)
+            if warm is not None:
+                load = cold * PRIOR_LOAD_SECONDS
+                return Estimate(warm.seconds + load, warm.low + load * (1 - PRIOR_BAND),
+                                warm.high + load * (1 + PRIOR_BAND), f"{warm.source}+prior load",
+                                warm.samples)
+
+        # A shape no fit has seen: the rule of thumb, rescaled by how far off
+        # it was for the most specific measured samples
+        scale, source, samples = 1.0, "prior", 0
+        with self._lock:
+            for key in reversed(self._keys(features_list[0])):
+                fit = self._fits.get(key)
+                if fit and fit.prior_seconds > 0:
+                    scale = fit.seconds / fit.prior_seconds
+                    source, samples = f"prior scaled by {key[1] or key[0]}", fit.n
+                    break
+        prior = sum(self.prior(features).seconds * count
+                    for features, count in zip(features_list, counts)) * scale
+        return Estimate(prior, prior * (1 - PRIOR_BAND), prior * (1 + PRIOR_BAND), source, samples)
+
+    def schedule(self, features_list: Sequence[Dict]) -> List[Dict]:
+        """Features of jobs run in this order: cold only where the model changes"""
+        scheduled = []
+        previous = None
+        for features in features_list:
+            scheduled.append({**features, "cold": features["model"] != previous})
+            previous = features["model"]
+        return scheduled
+
+    def largest_batch(self, features: Dict, limit: int, max_seconds: float) -> int:
+        """Largest batch_size up to limit whose upper estimate fits max_seconds"""
+        for batch_size in range(limit, 1, -1):
+            if self.estimate({**features, "batch_size": batch_size}).high <= max_seconds:
+                return batch_size
+        return 1
+
+
+class ExecutionTimer:
+    """Websocket listener timing each job from execution_start to its end
+
+    result(prompt_id) -> {"seconds", "status", "cached"} where cached lists
+    the node IDs ComfyUI reused from the previous job.
+    """
+
+    def __init__(self, max_jobs: int = 4096):
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, message: Dict, received: float):
+        msg_type = message.get("type")
+        if msg_type not in ("execution_start", "execution_cached", "executing") + _END_EVENTS:
+            return
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        with self._lock:
+            job = self._jobs.get(prompt_id)
+            if msg_type == "execution_start":
+                self._jobs[prompt_id] = {"started": received, "seconds": None,
+                                         "status": None, "cached": []}
+                while len(self._jobs) > self.max_jobs:
+                    del self._jobs[next(iter(self._jobs))]
+            elif job is None or job["status"] is not None:
+                return
+            elif msg_type == "execution_cached":
+                job["cached"] = [str(node) for node in data.get("nodes") or []]
+            elif msg_type in _END_EVENTS or (msg_type == "executing" and data.get("node") is None):
+                job["seconds"] = received - job["started"]
+                job["status"] = {"execution_error": "error",
+                                 "execution_interrupted": "interrupted"}.get(msg_type, "success")
+
+    def result(self, prompt_id: str) -> Optional[Dict]:
+        """Timing of a finished job, None if its events were not seen"""
+        with self._lock:
+            job = self._jobs.get(prompt_id)
+            if job is None or job["status"] is None:
+                return None
+            return {"seconds": job["seconds"], "status": job["status"], "cached": list(job["cached"])}
+
+
+def format_duration(seconds: float) -> str:
+    """Compact human duration (42s, 3m05s, 1h12m)"""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the fitted job latency model")
+    parser.add_argument("workflows", nargs="*", help="API-format workflow files to estimate")
+    parser.add_argument("--samples", type=str, default=str(DEFAULT_SAMPLES_PATH),
+                        help="Samples file (default: .cache/latency_samples.jsonl)")
+    args = parser.parse_args()
+
+    latency = LatencyModel.load(Path(args.samples))
+    print(f"{latency.samples} samples in {args.samples}")
+    for (kind, name), fit in sorted(latency._fits.items()):
+        if fit.n - len(fit.xty) < LatencyModel.MIN_DEGREES_OF_FREEDOM:
+            print(f"  {kind:<10} {name or '-':<40} {fit.n:>5} samples (too few to fit)")
+            continue
+        beta, _, variance = fit.solve()
+        print(f"  {kind:<10} {name or '-':<40} {fit.n:>5} samples  overhead {beta[0]:.1f}s  "
+              f"load {beta[1]:.1f}s  per LoRA {beta[2]:.2f}s  per step-MP {beta[3]:.3f}s  "
+              f"per MP {beta[4]:.2f}s  sd {math.sqrt(variance):.1f}s")
+    for path in args.workflows:
+        with open(path, "r", encoding="utf-8") as f:
+            features = job_features(json.load(f))
+        print(f"{path}:")
+        print(f"  cold: {latency.estimate(features).describe()}")
+        print(f"  warm: {latency.estimate({**features, 'cold': False}).describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+VRAM / RAM Sampler
+Polls /system_stats at a fixed interval on a background thread and keeps a
+time series of GPU memory in use (vram_total - vram_free of the first
+device, so other processes on the GPU count too) and, where the server
+reports it, system RAM in use.
+
+As a websocket listener it also notes when each job executed, so usage can
+be read back per job, and per phase (load, sampling, decode, ...) given the
+job's intervals from benchmark.phase_intervals():
+
+    sampler = MemorySampler(client, interval=0.5).start()
+    tracker.add_listener(sampler)
+    ...
+    sampler.job(prompt_id)
+    # {"peak_vram_gb", "mean_vram_gb", "vram_total_gb", "idle_vram_gb",
+    #  "peak_ram_gb", "mean_ram_gb", "samples"}
+
+Usage is sampled, not traced: a spike shorter than the interval can fall
+between two polls. Jobs shorter than the interval are measured from the
+samples just around them.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from comfy_client import ComfyClient
+
+GB = 1024 ** 3
+DEFAULT_INTERVAL = 0.5
+
+# About 14 hours at the default interval
+MAX_SAMPLES = 100_000
+
+_END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+class MemorySample(NamedTuple):
+    """One poll, memory in bytes"""
+    at: float
+    vram_used: int
+    vram_total: int
+    ram_used: Optional[int]   # None if the server does not report RAM
+
+
+def read_memory(stats: Dict) -> Optional[Tuple[int, int, Optional[int]]]:
+    """(vram_used, vram_total, ram_used) of a /system_stats response"""
+    devices = stats.get("devices") or []
+    if not devices or not devices[0].get("vram_total"):
+        return None
+    device = devices[0]
+    system = stats.get("system") or {}
+    ram_used = None
+    if system.get("ram_total") and system.get("ram_free") is not None:
+        ram_used = system["ram_total"] - system["ram_free"]
+    return device["vram_total"] - device.get("vram_free", 0), device["vram_total"], ram_used
+
+
+def summarize_samples(samples: List[MemorySample]) -> Optional[Dict]:
+    """Peak and mean usage of samples, in GB"""
+    if not samples:
+        return None
+    ram = [sample.ram_used for sample in samples if sample.ram_used is not None]
+    return {
+        "peak_vram_gb": round(max(sample.vram_used for sample in samples) / GB, 3),
+        "mean_vram_gb": round(sum(sample.vram_used for sample in samples) / len(samples) / GB, 3),
+        "vram_total_gb": round(samples[-1].vram_total / GB, 3),
+        "peak_ram_gb": round(max(ram) / GB, 3) if ram else None,
+        "mean_ram_gb": round(sum(ram) / len(ram) / GB, 3) if ram else None,
+        "samples": len(samples),
+    }
+
+
+class MemorySampler:
+    """Background /system_stats poller that attributes memory use to jobs"""
+
+    def __init__(self, client: ComfyClient, interval: float = DEFAULT_INTERVAL,
+                 max_samples: int = MAX_SAMPLES, max_jobs: int = 4096):
+        self.client = client
+        self.interval = interval
+        self.max_jobs = max_jobs
+        self._samples: "deque[MemorySample]" = deque(maxlen=max_samples)
+        self._windows: "OrderedDict[str, List[Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MemorySampler":
+        """Start polling (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="comfy-memory-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MemorySampler":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def poll(self) -> Optional[MemorySample]:
+        """Take one sample now"""
+        before = time.time()
+        try:
+            memory = read_memory(self.client.system_stats())
+        except Exception:
+            return None
+        if memory is None:
+            return None
+        sample = MemorySample((before + time.time()) / 2, *memory)
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.time()
+            self.poll()
+            self._stop.wait(max(0.0, self.interval - (time.time() - started)))
+
+    def __call__(self, message: Dict, received: float):
+        msg_type = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        with self._lock:
+            if msg_type == "execution_start":
+                self._windows[prompt_id] = [received, None]
+                while len(self._windows) > self.max_jobs:
+                    self._windows.popitem(last=False)
+            elif msg_type in _END_EVENTS or (msg_type == "executing" and data.get("node") is None):
+                window = self._windows.get(prompt_id)
+                if window is not None and window[1] is None:
+                    window[1] = received
+
+    def _between(self, start: float, end: float) -> List[MemorySample]:
+        """Samples from start to end, oldest first (scans back from the newest,
+        since the spans asked about are recent)"""
+        found = []
+        with self._lock:
+            for sample in reversed(self._samples):
+                if sample.at < start:
+                    break
+                if sample.at <= end:
+                    found.append(sample)
+        found.reverse()
+        return found
+
+    def samples(self, start: float, end: float) -> List[MemorySample]:
+        """Samples taken between start and end; for a span shorter than the
+        interval, the samples within one interval of it"""
+        return self._between(start, end) or self._between(start - self.interval, end + self.interval)
+
+    def usage(self, start: float, end: float) -> Optional[Dict]:
+        """Peak and mean usage between start and end (see summarize_samples)"""
+        return summarize_samples(self.samples(start, end))
+
+    def window(self, prompt_id: str) -> Optional[Tuple[float, float]]:
+        """(execution_start, end) of a finished job, None if not seen"""
+        with self._lock:
+            window = self._windows.get(prompt_id)
+            return tuple(window) if window and window[1] is not None else None
+
+    def job(self, prompt_id: str,
+            phases: Optional[Iterable[Tuple[str, float, float]]] = None) -> Optional[Dict]:
+        """Usage while a finished job executed, plus "idle_vram_gb" (the last
+        sample before it started: models still loaded from earlier jobs)
+        and, given its (phase, start, end) intervals, usage per phase"""
+        window = self.window(prompt_id)
+        if window is None:
+            return None
+        usage = self.usage(*window)
+        if usage is None:
+            return None
+        before = self._between(window[0] - 10 * self.interval, window[0])
+        usage["idle_vram_gb"] = round(before[-1].vram_used / GB, 3) if before else None
+        if phases is not None:
+            spans: Dict[str, List[Tuple[float, float]]] = {}
+            for phase, start, end in phases:
+                spans.setdefault(phase, []).append((start, end))
+            usage["phases"] = {}
+            for phase, intervals in spans.items():
+                summary = summarize_samples([sample for start, end in intervals
+                                             for sample in self._between(start, end)])
+                if summary:
+                    usage["phases"][phase] = {"peak_vram_gb": summary["peak_vram_gb"],
+                                              "mean_vram_gb": summary["mean_vram_gb"],
+                                              "samples": summary["samples"]}
+        return usage
+
+    def peak(self) -> Optional[Dict]:
+        """Usage over everything sampled so far"""
+        with self._lock:
+            samples = list(self._samples)
+        return summarize_samples(samples)
+
+
+def describe_memory(usage: Optional[Dict]) -> str:
+    """Short report of a job() result, e.g. "VRAM peak 14.2/24.0GB"; '' if unknown"""
+    if not usage:
+        return ""
+    return f"VRAM peak {usage['peak_vram_gb']:.1f}/{usage['vram_total_gb']:.1f}GB"
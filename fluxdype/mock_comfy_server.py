@@ -0,0 +1,746 @@
+#!/usr/bin/env python3
+"""
+Mock ComfyUI Server
+A CPU-only stand-in for ComfyUI that speaks the same HTTP and websocket API
+(/prompt, /queue, /history, /view, /ws, /system_stats, /object_info,
+/interrupt, /free), so the batch, download and scheduling scripts can be
+exercised and benchmarked without a GPU.
+
+Jobs are "executed" by sleeping according to an execution-time model:
+sampling time scales with steps, megapixels, batch size and model precision,
+loading a model that is not resident costs its size / disk bandwidth, and a
+job whose weights plus activations exceed the simulated VRAM fails with the
+same out-of-memory execution_error a real server reports. Nodes unchanged
+since the previous prompt are reported as cached, like ComfyUI's node cache.
+
+    python mock_comfy_server.py --port 8188 --time-scale 0.05
+    python batch_generate.py -f prompts.txt --queue-depth 3    # unchanged
+
+    server = MockComfyServer(time_scale=0.01)
+    url = server.start_in_thread(port=0)
+    ...
+    server.stop()
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+from model_scheduler import BASE_LOADERS, ENCODER_LOADERS, LORA_LOADERS, POWER_LORA_LOADER, VAE_LOADERS
+from workflow_graph import is_link
+
+# RTX 3090 reference figures (see TURBO_FAST_SETUP.md / BATCH_GENERATION_GUIDE.md):
+# Flux dev FP8 runs about 1 s/it at 1024x1024
+DEFAULT_SECONDS_PER_STEP_MP = 1.0
+DEFAULT_VRAM_GB = 24.0
+DEFAULT_DISK_GBPS = 1.5         # model load bandwidth
+DEFAULT_ACTIVATION_GB_PER_MP = 1.6
+
+# Per-step cost relative to FP8, by precision tag found in the file name
+PRECISION_SPEED = {
+    "fp16": 1.15, "bf16": 1.15, "fp32": 1.6, "fp8": 1.0,
+    "q8": 1.05, "q6": 1.1, "q5": 1.1, "q4": 1.15, "nf4": 1.2,
+}
+# Weight size in GB of a Flux-sized (12B) transformer, by precision tag
+PRECISION_GB = {
+    "fp16": 23.8, "bf16": 23.8, "fp32": 47.6, "fp8": 11.9,
+    "q8": 12.7, "q6": 9.9, "q5": 8.4, "q4": 6.8, "nf4": 6.7,
+}
+SAMPLER_NODES = ("KSampler", "KSamplerAdvanced", "SamplerCustom", "SamplerCustomAdvanced")
+OUTPUT_NODES = {"SaveImage": "output", "PreviewImage": "temp"}
+
+
+def _precision(name: str) -> Optional[str]:
+    lowered = name.lower()
+    for tag in sorted(PRECISION_SPEED, key=len, reverse=True):
+        if tag in lowered:
+            return tag
+    return None
+
+
+class ExecutionModel:
+    """Simulated timing and memory of a Flux pipeline on one GPU
+
+    time_scale multiplies every simulated duration (0.01 runs a 30s job in
+    0.3s); oom_rate adds random out-of-memory failures on top of the
+    deterministic VRAM check.
+    """
+
+    def __init__(
+        self,
+        seconds_per_step_mp: float = DEFAULT_SECONDS_PER_STEP_MP,
+        vram_gb: float = DEFAULT_VRAM_GB,
+        disk_gbps: float = DEFAULT_DISK_GBPS,
+        activation_gb_per_mp: float = DEFAULT_ACTIVATION_GB_PER_MP,
+        time_scale: float = 1.0,
+        oom_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.seconds_per_step_mp = seconds_per_step_mp
+        self.vram_gb = vram_gb
+        self.disk_gbps = disk_gbps
+        self.activation_gb_per_mp = activation_gb_per_mp
+        self.time_scale = time_scale
+        self.oom_rate = oom_rate
+        self.rng = random.Random(seed)
+
+    def model_gb(self, name: str, kind: str) -> float:
+        """Approximate weight size of a model file"""
+        lowered = name.lower()
+        if kind == "lora":
+            return 0.3
+        if kind == "vae":
+            return 0.33
+        if kind == "encoder":
+            if "clip_l" in lowered:
+                return 0.25
+            return 4.9 if "fp8" in lowered else 9.8
+        return PRECISION_GB.get(_precision(name) or "", 11.9)
+
+    def load_seconds(self, gb: float) -> float:
+        return gb / self.disk_gbps
+
+    def step_seconds(self, model_name: str, width: int, height: int, batch: int) -> float:
+        megapixels = width * height / 1_000_000
+        speed = PRECISION_SPEED.get(_precision(model_name) or "", 1.0)
+        return self.seconds_per_step_mp * megapixels * batch * speed
+
+    def activation_gb(self, width: int, height: int, batch: int) -> float:
+        return self.activation_gb_per_mp * width * height * batch / 1_000_000
+
+    def random_oom(self) -> bool:
+        return self.oom_rate > 0 and self.rng.random() < self.oom_rate
+
+
+def make_png(width: int, height: int, seed: int) -> bytes:
+    """Uncompressed-noise RGB PNG, roughly the size of a real render"""
+    rng = random.Random(seed)
+    row_bytes = width * 3
+    raw = b"".join(b"\x00" + rng.randbytes(row_bytes) for _ in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + tag + data +
+                struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(raw, 0)) + chunk(b"IEND", b""))
+
+
+def _spec(required: Dict, optional: Optional[Dict] = None, output=(), output_node: bool = False,
+          category: str = "mock") -> Dict:
+    return {
+        "input": {"required": required, "optional": optional or {}},
+        "input_order": {"required": list(required), "optional": list(optional or {})},
+        "output": list(output),
+        "output_is_list": [False] * len(output),
+        "output_name": list(output),
+        "output_node": output_node,
+        "category": category,
+    }
+
+
+SAMPLERS = ["euler", "euler_ancestral", "heun", "dpmpp_2m", "dpmpp_2m_sde", "dpmpp_sde", "uni_pc"]
+SCHEDULERS = ["normal", "karras", "exponential", "sgm_uniform", "simple", "ddim_uniform", "beta"]
+INT = ["INT", {"default": 0, "min": 0, "max": 0xFFFFFFFFFFFFFFFF}]
+FLOAT = ["FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0, "step": 0.01}]
+STRING = ["STRING", {"multiline": True}]
+
+# The subset of core and custom nodes the repo's workflows use
+OBJECT_INFO = {
+    "CheckpointLoaderSimple": _spec({"ckpt_name": [[]]}, output=("MODEL", "CLIP", "VAE")),
+    "UNETLoader": _spec({"unet_name": [[]], "weight_dtype": [["default", "fp8_e4m3fn", "fp8_e5m2"]]},
+                        output=("MODEL",)),
+    "UnetLoaderGGUF": _spec({"unet_name": [[]]}, output=("MODEL",)),
+    "CLIPLoader": _spec({"clip_name": [[]], "type": [["stable_diffusion", "flux"]]}, output=("CLIP",)),
+    "DualCLIPLoader": _spec({"clip_name1": [[]], "clip_name2": [[]], "type": [["flux", "sdxl", "sd3"]]},
+                            output=("CLIP",)),
+    "DualCLIPLoaderGGUF": _spec({"clip_name1": [[]], "clip_name2": [[]], "type": [["flux", "sdxl", "sd3"]]},
+                                output=("CLIP",)),
+    "VAELoader": _spec({"vae_name": [[]]}, output=("VAE",)),
+    "LoraLoader": _spec({"model": ["MODEL"], "clip": ["CLIP"], "lora_name": [[]],
+                         "strength_model": FLOAT, "strength_clip": FLOAT}, output=("MODEL", "CLIP")),
+    "LoraLoaderModelOnly": _spec({"model": ["MODEL"], "lora_name": [[]], "strength_model": FLOAT},
+                                 output=("MODEL",)),
+    POWER_LORA_LOADER: _spec({}, {"model": ["MODEL"], "clip": ["CLIP"]}, output=("MODEL", "CLIP")),
+    "CLIPTextEncode": _spec({"text": STRING, "clip": ["CLIP"]}, output=("CONDITIONING",)),
+    "FluxGuidance": _spec({"conditioning": ["CONDITIONING"], "guidance": FLOAT}, output=("CONDITIONING",)),
+    "ConditioningZeroOut": _spec({"conditioning": ["CONDITIONING"]}, output=("CONDITIONING",)),
+    "EmptyLatentImage": _spec({"width": INT, "height": INT, "batch_size": INT}, output=("LATENT",)),
+    "EmptySD3LatentImage": _spec({"width": INT, "height": INT, "batch_size": INT}, output=("LATENT",)),
+    "LatentFromBatch": _spec({"samples": ["LATENT"], "batch_index": INT, "length": INT}, output=("LATENT",)),
+    "KSampler": _spec({"model": ["MODEL"], "seed": INT, "steps": INT, "cfg": FLOAT,
+                       "sampler_name": [SAMPLERS], "scheduler": [SCHEDULERS],
+                       "positive": ["CONDITIONING"], "negative": ["CONDITIONING"],
+                       "latent_image": ["LATENT"], "denoise": FLOAT}, output=("LATENT",)),
+    "KSamplerAdvanced": _spec({"model": ["MODEL"], "add_noise": [["enable", "disable"]], "noise_seed": INT,
+                               "steps": INT, "cfg": FLOAT, "sampler_name": [SAMPLERS],
+                               "scheduler": [SCHEDULERS], "positive": ["CONDITIONING"],
+                               "negative": ["CONDITIONING"], "latent_image": ["LATENT"],
+                               "start_at_step": INT, "end_at_step": INT,
+                               "return_with_leftover_noise": [["disable", "enable"]]}, output=("LATENT",)),
+    "VAEDecode": _spec({"samples": ["LATENT"], "vae": ["VAE"]}, output=("IMAGE",)),
+    "VAEEncode": _spec({"pixels": ["IMAGE"], "vae": ["VAE"]}, output=("LATENT",)),
+    "LoadImage": _spec({"image": [[]]}, output=("IMAGE", "MASK")),
+    "SaveImage": _spec({"images": ["IMAGE"], "filename_prefix": ["STRING", {"default": "ComfyUI"}]},
+                       output_node=True),
+    "PreviewImage": _spec({"images": ["IMAGE"]}, output_node=True),
+}
+
+
+class MockComfyServer:
+    """In-process ComfyUI API stand-in driven by an ExecutionModel"""
+
+    def __init__(self, model: Optional[ExecutionModel] = None, strict_nodes: bool = False,
+                 **model_kwargs):
+        self.model = model or ExecutionModel(**model_kwargs)
+        # Reject class_types missing from OBJECT_INFO (like a real server
+        # without the custom node installed); off by default
+        self.strict_nodes = strict_nodes
+        self.app = web.Application(client_max_size=64 * 1024 ** 2)
+        self.app.add_routes([
+            web.post("/prompt", self.post_prompt),
+            web.get("/prompt", self.get_prompt),
+            web.get("/queue", self.get_queue),
+            web.post("/queue", self.post_queue),
+            web.get("/history", self.get_history),
+            web.get("/history/{prompt_id}", self.get_history),
+            web.post("/history", self.post_history),
+            web.get("/view", self.get_view),
+            web.get("/ws", self.websocket),
+            web.get("/system_stats", self.get_system_stats),
+            web.get("/object_info", self.get_object_info),
+            web.get("/object_info/{node_class}", self.get_object_info),
+            web.post("/interrupt", self.post_interrupt),
+            web.post("/free", self.post_free),
+        ])
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_shutdown.append(self._on_shutdown)
+
+        self.pending: List[Tuple] = []          # (number, prompt_id, prompt, extra, outputs)
+        self.running: Optional[Tuple] = None
+        self.history: "OrderedDict[str, Dict]" = OrderedDict()
+        self.resident: "OrderedDict[str, float]" = OrderedDict()  # model name -> GB, LRU order
+        self.files: Dict[Tuple[str, str, str], Tuple[int, int, int]] = {}
+        self.sockets: Dict[str, List[web.WebSocketResponse]] = {}
+        self.stats = {"executed": 0, "failed": 0, "interrupted": 0, "model_loads": 0, "cached_nodes": 0}
+
+        self._number = 0
+        self._counter = 0
+        self._node_cache: set = set()
+        self._interrupt = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._png_cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def _on_startup(self, app):
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.ensure_future(self._work())
+
+    async def _on_shutdown(self, app):
+        if self._worker:
+            self._worker.cancel()
+        for sockets in list(self.sockets.values()):
+            for ws in list(sockets):
+                await ws.close()
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve on a background thread; returns the base URL (port 0 picks a free port)"""
+        started = threading.Event()
+        address = {}
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port)
+            self._loop.run_until_complete(site.start())
+            address["port"] = site._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name="mock-comfy", daemon=True)
+        self._thread.start()
+        started.wait(10)
+        return f"http://{host}:{address['port']}"
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    # ------------------------------------------------------------------
+    # Websocket events
+    # ------------------------------------------------------------------
+
+    async def send(self, event: str, data: Dict, client_id: Optional[str] = None):
+        """Send to one client's sockets, or broadcast when client_id is None"""
+        message = json.dumps({"type": event, "data": data})
+        targets = self.sockets.get(client_id, []) if client_id else \
+            [ws for sockets in self.sockets.values() for ws in sockets]
+        for ws in list(targets):
+            try:
+                await ws.send_str(message)
+            except Exception:
+                pass
+
+    def _queue_status(self) -> Dict:
+        remaining = len(self.pending) + (1 if self.running else 0)
+        return {"status": {"exec_info": {"queue_remaining": remaining}}}
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        client_id = request.query.get("clientId") or uuid.uuid4().hex
+        self.sockets.setdefault(client_id, []).append(ws)
+        try:
+            await ws.send_str(json.dumps({"type": "status", "data": {**self._queue_status(), "sid": client_id}}))
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self.sockets[client_id].remove(ws)
+            if not self.sockets[client_id]:
+                del self.sockets[client_id]
+        return ws
+
+    # ------------------------------------------------------------------
+    # HTTP endpoints
+    # ------------------------------------------------------------------
+
+    def validate(self, prompt: Dict) -> Tuple[Optional[Dict], Dict, List[str]]:
+        """(error, node_errors, output node IDs), mirroring ComfyUI's checks"""
+        if not isinstance(prompt, dict) or not prompt:
+            return {"type": "invalid_prompt", "message": "Cannot execute because prompt is empty",
+                    "details": "", "extra_info": {}}, {}, []
+        node_errors = {}
+        outputs = []
+        for node_id, node in prompt.items():
+            class_type = node.get("class_type") if isinstance(node, dict) else None
+            if class_type is None:
+                return {"type": "invalid_prompt",
+                        "message": f"Cannot execute because a node is missing the class_type property.: Node ID '#{node_id}'",
+                        "details": "", "extra_info": {}}, {}, []
+            spec = OBJECT_INFO.get(class_type)
+            if spec is None:
+                if self.strict_nodes:
+                    return {"type": "invalid_prompt",
+                            "message": f"Cannot execute because node {class_type} does not exist.",
+                            "details": f"Node ID '#{node_id}'", "extra_info": {}}, {}, []
+            else:
+                errors = []
+                inputs = node.get("inputs", {})
+                for name in spec["input"]["required"]:
+                    if name not in inputs:
+                        errors.append({"type": "required_input_missing", "message": "Required input is missing",
+                                       "details": name, "extra_info": {"input_name": name}})
+                for name, value in inputs.items():
+                    if is_link(value) and str(value[0]) not in prompt:
+                        errors.append({"type": "bad_linked_input", "message": "Bad linked input",
+                                       "details": f"{name}: node {value[0]} does not exist",
+                                       "extra_info": {"input_name": name}})
+                if errors:
+                    node_errors[node_id] = {"errors": errors, "dependent_outputs": [], "class_type": class_type}
+                if spec["output_node"]:
+                    outputs.append(node_id)
+        if not outputs and not node_errors:
+            return {"type": "prompt_no_outputs", "message": "Prompt has no outputs",
+                    "details": "", "extra_info": {}}, {}, []
+        if node_errors:
+            return {"type": "prompt_outputs_failed_validation", "message": "Prompt outputs failed validation",
+                    "details": "", "extra_info": {}}, node_errors, outputs
+        return None, {}, outputs
+
+    async def post_prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prompt = body.get("prompt")
+        error, node_errors, outputs = self.validate(prompt)
+        if error:
+            return web.json_response({"error": error, "node_errors": node_errors}, status=400)
+
+        prompt_id = body.get("prompt_id") or str(uuid.uuid4())
+        self._number += 1
+        number = -self._number if body.get("front") else self._number
+        extra = dict(body.get("extra_data") or {})
+        if body.get("client_id"):
+            extra["client_id"] = body["client_id"]
+        self.pending.append((number, prompt_id, prompt, extra, outputs))
+        self.pending.sort(key=lambda entry: entry[0])
+        self._wakeup.set()
+        await self.send("status", self._queue_status())
+        return web.json_response({"prompt_id": prompt_id, "number": number, "node_errors": {}})
+
+    async def get_prompt(self, request: web.Request) -> web.Response:
+        return web.json_response(self._queue_status())
+
+    async def get_queue(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "queue_running": [list(self.running)] if self.running else [],
+            "queue_pending": [list(entry) for entry in self.pending],
+        })
+
+    async def post_queue(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get("clear"):
+            self.pending.clear()
+        for prompt_id in body.get("delete", []):
+            self.pending = [entry for entry in self.pending if entry[1] != prompt_id]
+        await self.send("status", self._queue_status())
+        return web.Response(status=200)
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        prompt_id = request.match_info.get("prompt_id")
+        if prompt_id:
+            entry = self.history.get(prompt_id)
+            return web.json_response({prompt_id: entry} if entry else {})
+        items = list(self.history.items())
+        max_items = request.query.get("max_items")
+        if max_items:
+            items = items[-int(max_items):]
+        return web.json_response(dict(items))
+
+    async def post_history(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get("clear"):
+            self.history.clear()
+        for prompt_id in body.get("delete", []):
+            self.history.pop(prompt_id, None)
+        return web.Response(status=200)
+
+    async def get_view(self, request: web.Request) -> web.Response:
+        key = (request.query.get("filename", ""), request.query.get("subfolder", ""),
+               request.query.get("type", "output"))
+        if key not in self.files:
+            return web.Response(status=404)
+        if key not in self._png_cache:
+            width, height, seed = self.files[key]
+            self._png_cache[key] = await asyncio.get_event_loop().run_in_executor(
+                None, make_png, width, height, seed)
+            while len(self._png_cache) > 16:
+                self._png_cache.popitem(last=False)
+        self._png_cache.move_to_end(key)
+        return web.Response(body=self._png_cache[key], content_type="image/png")
+
+    async def get_system_stats(self, request: web.Request) -> web.Response:
+        total = int(self.model.vram_gb * 1024 ** 3)
+        used = int(sum(self.resident.values()) * 1024 ** 3)
+        return web.json_response({
+            "system": {"os": "mock", "python_version": "", "comfyui_version": "mock",
+                       "embedded_python": False},
+            "devices": [{
+                "name": "cuda:0 Mock GPU", "type": "cuda", "index": 0,
+                "vram_total": total, "vram_free": total - used,
+                "torch_vram_total": total, "torch_vram_free": total - used,
+            }],
+        })
+
+    async def get_object_info(self, request: web.Request) -> web.Response:
+        node_class = request.match_info.get("node_class")
+        names = [node_class] if node_class else list(OBJECT_INFO)
+        return web.json_response({
+            name: {**OBJECT_INFO[name], "name": name, "display_name": name, "description": ""}
+            for name in names if name in OBJECT_INFO
+        })
+
+    async def post_interrupt(self, request: web.Request) -> web.Response:
+        self._interrupt = self.running is not None
+        return web.Response(status=200)
+
+    async def post_free(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        if body.get("unload_models"):
+            self.resident.clear()
+        if body.get("free_memory"):
+            self._node_cache.clear()
+        return web.Response(status=200)
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    async def _work(self):
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self.running = self.pending.pop(0)
+            try:
+                await self._execute(*self.running)
+            finally:
+                self.running = None
+                self._interrupt = False
+                await self.send("status", self._queue_status())
+
+    async def _sleep(self, seconds: float):
+        if seconds > 0:
+            await asyncio.sleep(seconds * self.model.time_scale)
+
+    @staticmethod
+    def _signatures(prompt: Dict) -> Dict[str, str]:
+        signatures: Dict[str, str] = {}
+
+        def signature(node_id: str, visiting=()) -> str:
+            if node_id not in signatures:
+                node = prompt.get(node_id, {})
+                inputs = {
+                    name: (["@" + signature(str(value[0]), visiting + (node_id,)), value[1]]
+                           if is_link(value) and str(value[0]) not in visiting else value)
+                    for name, value in node.get("inputs", {}).items()
+                }
+                payload = json.dumps([node.get("class_type"), inputs], sort_keys=True)
+                signatures[node_id] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+            return signatures[node_id]
+
+        for node_id in prompt:
+            signature(node_id)
+        return signatures
+
+    @staticmethod
+    def _order(prompt: Dict, outputs: List[str]) -> List[str]:
+        """Nodes the outputs depend on, dependencies first"""
+        order, seen = [], set()
+
+        def visit(node_id: str):
+            if node_id in seen or node_id not in prompt:
+                return
+            seen.add(node_id)
+            for value in prompt[node_id].get("inputs", {}).values():
+                if is_link(value):
+                    visit(str(value[0]))
+            order.append(node_id)
+
+        for node_id in outputs:
+            visit(node_id)
+        return order
+
+    def _upstream(self, prompt: Dict, node_id: str, match, seen=None):
+        """First node at or above node_id satisfying match, depth first"""
+        seen = seen if seen is not None else set()
+        if node_id in seen or node_id not in prompt:
+            return None
+        seen.add(node_id)
+        if match(prompt[node_id]):
+            return node_id
+        for value in prompt[node_id].get("inputs", {}).values():
+            if is_link(value):
+                found = self._upstream(prompt, str(value[0]), match, seen)
+                if found:
+                    return found
+        return None
+
+    def _latent_shape(self, prompt: Dict, node_id: str) -> Tuple[int, int, int]:
+        node = prompt.get(node_id, {})
+        inputs = node.get("inputs", {})
+        if all(isinstance(inputs.get(key), int) for key in ("width", "height")):
+            return inputs["width"], inputs["height"], int(inputs.get("batch_size", 1))
+        if node.get("class_type") == "LatentFromBatch" and is_link(inputs.get("samples")):
+            width, height, _ = self._latent_shape(prompt, str(inputs["samples"][0]))
+            return width, height, int(inputs.get("length", 1))
+        for value in inputs.values():
+            if is_link(value):
+                shape = self._latent_shape(prompt, str(value[0]))
+                if shape != (0, 0, 0):
+                    return shape
+        return 0, 0, 0
+
+    def _model_name(self, prompt: Dict, node_id: str) -> str:
+        loader = self._upstream(prompt, node_id, lambda n: n.get("class_type") in BASE_LOADERS)
+        if loader is None:
+            return ""
+        node = prompt[loader]
+        keys = BASE_LOADERS[node["class_type"]]
+        return str(node.get("inputs", {}).get(keys[0], ""))
+
+    def _node_models(self, node: Dict) -> List[Tuple[str, str]]:
+        """(name, kind) of every weight file a loader node loads"""
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        for table, kind in ((BASE_LOADERS, "base"), (ENCODER_LOADERS, "encoder"), (VAE_LOADERS, "vae")):
+            if class_type in table:
+                return [(str(inputs[key]), kind) for key in table[class_type] if isinstance(inputs.get(key), str)]
+        if class_type in LORA_LOADERS and isinstance(inputs.get("lora_name"), str):
+            return [(inputs["lora_name"], "lora")]
+        if class_type == POWER_LORA_LOADER:
+            return [(value["lora"], "lora") for key, value in inputs.items()
+                    if key.startswith("lora_") and isinstance(value, dict)
+                    and value.get("on", True) and value.get("lora") not in (None, "None")]
+        return []
+
+    async def _load(self, name: str, kind: str) -> float:
+        """Make a model resident, evicting least recently used ones; returns GB"""
+        gb = self.model.model_gb(name, kind)
+        if name in self.resident:
+            self.resident.move_to_end(name)
+            return gb
+        while self.resident and sum(self.resident.values()) + gb > self.model.vram_gb:
+            self.resident.popitem(last=False)
+        await self._sleep(self.model.load_seconds(gb))
+        self.resident[name] = gb
+        self.stats["model_loads"] += 1
+        return gb
+
+    async def _execute(self, number: int, prompt_id: str, prompt: Dict, extra: Dict, outputs: List[str]):
+        client_id = extra.get("client_id")
+        messages = []
+        started = time.time()
+
+        async def emit(event: str, data: Dict, record: bool = False):
+            data = {**data, "prompt_id": prompt_id}
+            if record:
+                messages.append([event, {**data, "timestamp": int(time.time() * 1000)}])
+            await self.send(event, data, client_id)
+
+        def finish(status_str: str, node_outputs: Dict):
+            self.history[prompt_id] = {
+                "prompt": [number, prompt_id, prompt, extra, outputs],
+                "outputs": node_outputs,
+                "status": {"status_str": status_str, "completed": status_str == "success",
+                           "messages": messages},
+                "meta": {node_id: {"node_id": node_id, "display_node": node_id}
+                         for node_id in node_outputs},
+            }
+
+        await emit("execution_start", {}, record=True)
+        signatures = self._signatures(prompt)
+        order = self._order(prompt, outputs)
+        cached = [node_id for node_id in order
+                  if node_id not in outputs and signatures[node_id] in self._node_cache]
+        self.stats["cached_nodes"] += len(cached)
+        await emit("execution_cached", {"nodes": cached}, record=True)
+
+        node_outputs = {}
+        for node_id in order:
+            if node_id in cached:
+                continue
+            if self._interrupt:
+                await emit("execution_interrupted", {"node_id": node_id, "node_type": prompt[node_id]["class_type"],
+                                                     "executed": list(node_outputs)}, record=True)
+                self.stats["interrupted"] += 1
+                finish("error", node_outputs)
+                return
+            node = prompt[node_id]
+            class_type = node["class_type"]
+            inputs = node.get("inputs", {})
+            await emit("executing", {"node": node_id, "display_node": node_id})
+
+            oom = None
+            models = self._node_models(node)
+            for name, kind in models:
+                await self._load(name, kind)
+
+            if class_type in SAMPLER_NODES:
+                width, height, batch = self._latent_shape(prompt, node_id)
+                model_name = self._model_name(prompt, node_id)
+                needed = self.model.model_gb(model_name, "base") + self.model.activation_gb(width, height, batch)
+                if needed > self.model.vram_gb or self.model.random_oom():
+                    oom = f"Allocation on device 0 would exceed allowed memory. (out of memory)\n" \
+                          f"Needed {needed:.1f}GB of {self.model.vram_gb:.1f}GB"
+                else:
+                    steps = int(inputs.get("steps", 20))
+                    per_step = self.model.step_seconds(model_name, width, height, batch)
+                    for step in range(1, steps + 1):
+                        if self._interrupt:
+                            break
+                        await self._sleep(per_step)
+                        await emit("progress", {"value": step, "max": steps, "node": node_id})
+            elif class_type == "CLIPTextEncode":
+                await self._sleep(0.15)
+            elif class_type == "VAEDecode":
+                width, height, batch = self._latent_shape(prompt, node_id)
+                await self._sleep(0.25 * width * height * batch / 1_000_000)
+            elif class_type in OUTPUT_NODES:
+                width, height, batch = self._latent_shape(prompt, node_id)
+                images = []
+                prefix = str(inputs.get("filename_prefix", "ComfyUI")) if class_type == "SaveImage" \
+                    else f"ComfyUI_temp_{uuid.uuid4().hex[:5]}"
+                for index in range(max(1, batch)):
+                    self._counter += 1
+                    subfolder, _, base = prefix.rpartition("/")
+                    image = {"filename": f"{base}_{self._counter:05d}_.png", "subfolder": subfolder,
+                             "type": OUTPUT_NODES[class_type]}
+                    self.files[(image["filename"], subfolder, image["type"])] = (
+                        max(width, 64), max(height, 64), zlib.crc32(f"{prompt_id}:{index}".encode("utf-8")))
+                    images.append(image)
+                await self._sleep(0.05 * len(images))
+                node_outputs[node_id] = {"images": images}
+                await emit("executed", {"node": node_id, "display_node": node_id,
+                                        "output": node_outputs[node_id]})
+            elif not models:
+                await self._sleep(0.01)
+
+            if oom:
+                await emit("execution_error", {
+                    "node_id": node_id, "node_type": class_type, "executed": list(node_outputs),
+                    "exception_message": oom, "exception_type": "torch.OutOfMemoryError",
+                    "traceback": [], "current_inputs": {}, "current_outputs": {},
+                }, record=True)
+                self.stats["failed"] += 1
+                finish("error", node_outputs)
+                return
+
+        if self._interrupt:
+            await emit("execution_interrupted", {"node_id": None, "node_type": None,
+                                                 "executed": list(node_outputs)}, record=True)
+            self.stats["interrupted"] += 1
+            finish("error", node_outputs)
+            return
+
+        self._node_cache = set(signatures[node_id] for node_id in order)
+        self.stats["executed"] += 1
+        await emit("execution_success", {}, record=True)
+        finish("success", node_outputs)
+        await emit("executing", {"node": None})
+        self.history[prompt_id]["meta"]["elapsed"] = time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU-only mock ComfyUI server for client testing and benchmarks")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Multiply all simulated durations (e.g. 0.05 = 20x faster than an RTX 3090)")
+    parser.add_argument("--seconds-per-step-mp", type=float, default=DEFAULT_SECONDS_PER_STEP_MP,
+                        help=f"Sampling seconds per step per megapixel per image (default: {DEFAULT_SECONDS_PER_STEP_MP})")
+    parser.add_argument("--vram", type=float, default=DEFAULT_VRAM_GB, help="Simulated VRAM in GB")
+    parser.add_argument("--disk-gbps", type=float, default=DEFAULT_DISK_GBPS,
+                        help="Model load bandwidth in GB/s")
+    parser.add_argument("--oom-rate", type=float, default=0.0,
+                        help="Probability of a random out-of-memory failure per sampler run")
+    parser.add_argument("--strict-nodes", action="store_true",
+                        help="Reject node types the mock does not know")
+    args = parser.parse_args()
+
+    server = MockComfyServer(
+        ExecutionModel(args.seconds_per_step_mp, args.vram, args.disk_gbps,
+                       time_scale=args.time_scale, oom_rate=args.oom_rate),
+        strict_nodes=args.strict_nodes,
+    )
+    print(f"Mock ComfyUI on http://{args.host}:{args.port} (time scale {args.time_scale})")
+    web.run_app(server.app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
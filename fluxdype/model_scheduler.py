@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Model-Affinity Job Scheduler
+Reorders pending jobs so that jobs sharing loaded weights run back to back:
+grouped by base model (checkpoint / unet), then text encoders, then LoRA
+stack. Swapping a 12-23GB checkpoint costs far more than any queue reorder.
+
+    scheduler = ModelAffinityScheduler()
+    for job in jobs:
+        scheduler.add(job, job["workflow"])
+    for job in scheduler.order():
+        submit(job)
+    print(scheduler.report())
+
+With a LatencyModel (latency_model.py) the model groups run shortest
+first and report() adds the estimated run time of both orders. Jobs added
+with a shape key (e.g. latent width, height and batch size) are also
+grouped by it within each model group.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Loader class_type -> input names holding the weights it loads
+BASE_LOADERS = {
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "CheckpointLoader": ("ckpt_name",),
+    "UNETLoader": ("unet_name",),
+    "UnetLoaderGGUF": ("unet_name",),
+    "UnetLoaderGGUFAdvanced": ("unet_name",),
+}
+ENCODER_LOADERS = {
+    "CLIPLoader": ("clip_name",),
+    "DualCLIPLoader": ("clip_name1", "clip_name2"),
+    "TripleCLIPLoader": ("clip_name1", "clip_name2", "clip_name3"),
+    "DualCLIPLoaderGGUF": ("clip_name1", "clip_name2"),
+    "CLIPLoaderGGUF": ("clip_name",),
+}
+VAE_LOADERS = {
+    "VAELoader": ("vae_name",),
+}
+LORA_LOADERS = ("LoraLoader", "LoraLoaderModelOnly")
+POWER_LORA_LOADER = "Power Lora Loader (rgthree)"
+
+
+class ModelSignature(NamedTuple):
+    """Weights a workflow needs resident on the GPU"""
+    base: Tuple[str, ...]
+    encoders: Tuple[str, ...]
+    vae: Tuple[str, ...]
+    loras: Tuple[Tuple[str, float, float], ...]
+
+
+def _names(node: Dict, keys: Tuple[str, ...]) -> List[str]:
+    inputs = node.get("inputs", {})
+    return [str(inputs[key]) for key in keys if isinstance(inputs.get(key), str)]
+
+
+def lora_stack(workflow: Dict) -> List[Tuple[str, float, float]]:
+    """(lora_name, strength_model, strength_clip) for every active LoRA"""
+    stack = []
+    for node in workflow.values():
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        if class_type in LORA_LOADERS and isinstance(inputs.get("lora_name"), str):
+            strength = float(inputs.get("strength_model", 1.0))
+            stack.append((inputs["lora_name"], strength,
+                          float(inputs.get("strength_clip", strength))))
+        elif class_type == POWER_LORA_LOADER:
+            for key, value in inputs.items():
+                if key.startswith("lora_") and isinstance(value, dict) and value.get("on", True):
+                    if not value.get("lora") or value["lora"] == "None":
+                        continue
+                    strength = float(value.get("strength", 1.0))
+                    strength_two = value.get("strengthTwo")
+                    stack.append((value["lora"], strength,
+                                  float(strength_two) if strength_two is not None else strength))
+    return stack
+
+
+def model_signature(workflow: Dict) -> ModelSignature:
+    """Extract the model identity of an API-format workflow"""
+    base, encoders, vae = [], [], []
+    for node in workflow.values():
+        class_type = node.get("class_type")
+        if class_type in BASE_LOADERS:
+            base += _names(node, BASE_LOADERS[class_type])
+        elif class_type in ENCODER_LOADERS:
+            encoders += _names(node, ENCODER_LOADERS[class_type])
+        elif class_type in VAE_LOADERS:
+            vae += _names(node, VAE_LOADERS[class_type])
+    # Checkpoints bundle their own encoders and VAE
+    return ModelSignature(
+        base=tuple(sorted(base)),
+        encoders=tuple(sorted(encoders)),
+        vae=tuple(sorted(vae)),
+        loras=tuple(sorted(lora_stack(workflow))),
+    )
+
+
+def count_model_loads(signatures: List[ModelSignature]) -> int:
+    """Loads needed to run signatures in order, one resident model set at a time
+
+    A base model, encoder set or VAE change is one load each; a LoRA stack
+    change is one re-patch of the model.
+    """
+    loads = 0
+    current: Optional[ModelSignature] = None
+    for sig in signatures:
+        if current is None:
+            loads += sum(1 for part in (sig.base, sig.encoders, sig.vae) if part)
+            loads += 1 if sig.loras else 0
+        else:
+            loads += sum(1 for a, b in zip(sig, current) if a != b)
+        current = sig
+    return loads
+
+
+class ModelAffinityScheduler:
+    """Order jobs so that jobs sharing weights run consecutively"""
+
+    def __init__(self, latency: Optional[Any] = None):
+        self.latency = latency
+        self._jobs: List[Tuple[int, Any, ModelSignature]] = []
+        self._features: Dict[int, Dict] = {}
+        self._shapes: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def add(self, job: Any, workflow: Optional[Dict] = None,
+            signature: Optional[ModelSignature] = None, shape: Optional[Any] = None):
+        """Queue a job; its signature comes from workflow unless given"""
+        if signature is None:
+            signature = model_signature(workflow or {})
+        if self.latency is not None and workflow:
+            self._features[len(self._jobs)] = self.latency.features(workflow)
+        if shape is not None:
+            self._shapes[len(self._jobs)] = shape
+        self._jobs.append((len(self._jobs), job, signature))
+
+    def _estimate(self, jobs: List[Tuple[int, Any, ModelSignature]]):
+        """Estimated run time of jobs in this order (cold where the model changes)"""
+        features = [self._features[index] for index, _, _ in jobs if index in self._features]
+        return self.latency.estimate_batch(self.latency.schedule(features))
+
+    def _ordered(self) -> List[Tuple[int, Any, ModelSignature]]:
+        # Group keys in order of first appearance so the original order is
+        # kept as far as possible (stable within and between groups)
+        first_seen: Dict[Tuple, int] = {}
+
+        def rank(*key) -> int:
+            return first_seen.setdefault(key, len(first_seen))
+
+        if self.latency is not None and self._features:
+            # Shortest model group first: same loads, earlier results
+            groups: Dict[Tuple, List[Tuple[int, Any, ModelSignature]]] = {}
+            for item in self._jobs:
+                groups.setdefault(item[2].base, []).append(item)
+            for base, _ in sorted(groups.items(), key=lambda group: self._estimate(group[1]).seconds):
+                rank("base", base)
+
+        for index, _, sig in self._jobs:
+            rank("base", sig.base)
+            rank("enc", sig.base, sig.encoders)
+            rank("vae", sig.base, sig.encoders, sig.vae)
+            rank("lora", sig.base, sig.encoders, sig.vae, sig.loras)
+            rank("shape", sig, self._shapes.get(index))
+
+        return sorted(self._jobs, key=lambda item: (
+            first_seen[("base", item[2].base)],
+            first_seen[("enc", item[2].base, item[2].encoders)],
+            first_seen[("vae", item[2].base, item[2].encoders, item[2].vae)],
+            first_seen[("lora", item[2].base, item[2].encoders, item[2].vae, item[2].loras)],
+            first_seen[("shape", item[2], self._shapes.get(item[0]))],
+            item[0],
+        ))
+
+    def order(self) -> List[Any]:
+        """Jobs in affinity order"""
+        return [job for _, job, _ in self._ordered()]
+
+    def report(self) -> Dict[str, Any]:
+        """Model loads (and with a latency model, estimated time) in
+        submission order vs affinity order"""
+        ordered = self._ordered()
+        naive = count_model_loads([sig for _, _, sig in self._jobs])
+        scheduled = count_model_loads([sig for _, _, sig in ordered])
+        report = {
+            "jobs": len(self._jobs),
+            "model_groups": len({sig for _, _, sig in self._jobs}),
+            "loads_submission_order": naive,
+            "loads_scheduled": scheduled,
+            "loads_avoided": naive - scheduled,
+        }
+        if self.latency is not None and self._features:
+            report["estimate_submission_order"] = self._estimate(self._jobs)
+            report["estimate_scheduled"] = self._estimate(ordered)
+        return report
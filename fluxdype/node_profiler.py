@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Node Profiler
+Where does a job's time go: UnetLoaderGGUF, DualCLIPLoader, KSampler or
+VAEDecode? Timestamps every node from the websocket "executing" and
+"progress" events (see benchmark.PhaseTimer), then aggregates many jobs:
+
+  - per class_type: executions, cache hits, total and share of execution
+    time, p50 / p90 / p99 seconds
+  - per workflow template: a flame-style chart of the mean job, split into
+    phases (queue, load, encode, sampling, decode, other) and the node
+    classes inside each. A sampler's time before its first step is listed
+    under load, as "KSampler (to GPU)".
+
+    python node_profiler.py GGUF-Flux-Dev-Turbo-8Step-LoRA.json Flux-Professional-High-Quality.json --runs 5
+    python node_profiler.py --results benchmarks/benchmark_20250101_120000.json
+    python batch_generate.py -f prompts.txt --profile-nodes
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from benchmark import COMFY_URL, PHASES, Benchmark, PhaseTimer, node_phase, node_segments
+
+FLAME_WIDTH = 100
+BETWEEN_NODES = "(between nodes)"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """q-th percentile (0-100) of values, linearly interpolated"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class NodeProfiler:
+    """Aggregates node timelines of finished jobs by class_type and by template
+
+    As a websocket listener (tracker.add_listener(profiler)) it times the
+    jobs registered with expect(); record() then adds a finished job.
+    Timelines from elsewhere (benchmark results) go in through add().
+    """
+
+    def __init__(self, timer: Optional[PhaseTimer] = None):
+        self.timer = timer or PhaseTimer()
+        # class_type -> executed seconds, and how often it came from the cache
+        self._seconds: Dict[str, List[float]] = defaultdict(list)
+        self._cached: Dict[str, int] = defaultdict(int)
+        # template -> {"jobs", "execution", "queue", "segments": {(phase, label): seconds}}
+        self._templates: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, message: Dict, received: float):
+        self.timer(message, received)
+
+    def expect(self, prompt_id: str, workflow: Union[Dict, bytes], submitted: Optional[float] = None):
+        self.timer.expect(prompt_id, workflow, time.time() if submitted is None else submitted)
+
+    def record(self, prompt_id: str, template: str) -> bool:
+        """Add a finished job; False if its events were not seen"""
+        timeline = self.timer.timeline(prompt_id)
+        if timeline is None or timeline["status"] != "success":
+            return False
+        queue = timeline["started"] - timeline["submitted"] if timeline["submitted"] is not None else None
+        self.add(template, timeline["nodes"], timeline["cached"],
+                 timeline["ended"] - timeline["started"], queue)
+        return True
+
+    def add(self, template: str, nodes: List[Dict], cached: Iterable[Dict],
+            execution: float, queue: Optional[float] = None):
+        """Add one job: its executed and cached timeline nodes, seconds from
+        execution_start to the end, and seconds queued"""
+        with self._lock:
+            for node in nodes:
+                self._seconds[node["class_type"]].append(node["seconds"] or 0.0)
+            for node in cached:
+                self._cached[node["class_type"]] += 1
+
+            entry = self._templates.setdefault(template, {
+                "jobs": 0, "execution": 0.0, "queue": 0.0, "segments": defaultdict(float)})
+            entry["jobs"] += 1
+            entry["execution"] += execution
+            if queue is not None:
+                entry["queue"] += max(0.0, queue)
+                entry["segments"][("queue", "(queued)")] += max(0.0, queue)
+            accounted = 0.0
+            for node in nodes:
+                for phase, seconds in node_segments(node):
+                    label = node["class_type"] or "?"
+                    if phase != node_phase(node["class_type"]):
+                        label += " (to GPU)"
+                    entry["segments"][(phase, label)] += seconds
+                    accounted += seconds
+            if execution > accounted:
+                entry["segments"][("other", BETWEEN_NODES)] += execution - accounted
+
+    def add_results(self, results: Dict, warmup: bool = False):
+        """Add the runs of a benchmark.py results document (warmup runs only if warmup)"""
+        for case in results.get("cases", []):
+            for run in case.get("runs", []):
+                if run.get("status") != "success" or not run.get("phases") or (run.get("warmup") and not warmup):
+                    continue
+                self.add(case["name"], run["nodes"], run.get("cached", []),
+                         run["phases"]["execution"], run["phases"]["queue"])
+
+    def classes(self) -> List[Dict]:
+        """Per-class_type breakdown, most total time first"""
+        with self._lock:
+            total = sum(sum(values) for values in self._seconds.values())
+            rows = []
+            for class_type in set(self._seconds) | set(self._cached):
+                values = self._seconds.get(class_type, [])
+                seconds = sum(values)
+                rows.append({
+                    "class_type": class_type,
+                    "phase": node_phase(class_type),
+                    "executed": len(values),
+                    "cached": self._cached.get(class_type, 0),
+                    "total": seconds,
+                    "share": seconds / total if total else 0.0,
+                    "mean": seconds / len(values) if values else None,
+                    "p50": percentile(values, 50),
+                    "p90": percentile(values, 90),
+                    "p99": percentile(values, 99),
+                    "max": max(values) if values else None,
+                })
+        return sorted(rows, key=lambda row: -row["total"])
+
+    def flame(self, template: str) -> Optional[Dict]:
+        """Mean job of a template as {"jobs", "seconds", "phases": [{"phase",
+        "seconds", "nodes": [{"label", "seconds"}]}]}, phases in execution order"""
+        with self._lock:
+            entry = self._templates.get(template)
+            if entry is None:
+                return None
+            jobs = entry["jobs"]
+            phases = []
+            for phase in PHASES:
+                nodes = sorted(({"label": label, "seconds": seconds / jobs}
+                                for (segment_phase, label), seconds in entry["segments"].items()
+                                if segment_phase == phase and seconds > 0),
+                               key=lambda node: -node["seconds"])
+                if nodes:
+                    phases.append({"phase": phase, "seconds": sum(node["seconds"] for node in nodes),
+                                   "nodes": nodes})
+            return {"jobs": jobs, "seconds": (entry["execution"] + entry["queue"]) / jobs, "phases": phases}
+
+    def templates(self) -> List[str]:
+        with self._lock:
+            return list(self._templates)
+
+    def to_dict(self) -> Dict:
+        return {"classes": self.classes(),
+                "templates": {template: self.flame(template) for template in self.templates()}}
+
+    def report(self, width: int = FLAME_WIDTH) -> str:
+        lines = []
+        for template in self.templates():
+            lines.extend(flame_chart(template, self.flame(template), width))
+            lines.append("")
+        lines.extend(class_table(self.classes()))
+        return "\n".join(lines)
+
+
+def _bar(label: str, columns: int) -> str:
+    """label in a box of columns characters: "|label....." """
+    if columns <= 0:
+        return ""
+    text = label[:columns - 1]
+    return "|" + text + "." * (columns - 1 - len(text)) if columns > 1 else "|"
+
+
+def _spans(parts: List[float], total: float, start: int, width: int) -> List[int]:
+    """Column widths of consecutive parts of total, drawn from column start"""
+    widths = []
+    elapsed = 0.0
+    column = start
+    for seconds in parts:
+        elapsed += seconds
+        end = start + round(width * elapsed / total) if total else start
+        widths.append(end - column)
+        column = end
+    return widths
+
+
+def flame_chart(template: str, flame: Dict, width: int = FLAME_WIDTH) -> List[str]:
+    """Icicle chart of a template's mean job (time left to right), then the
+    same segments with their seconds and shares"""
+    total = flame["seconds"]
+    lines = [f"{template} - {flame['jobs']} job(s), {total:.2f}s per job",
+             _bar("job", width)]
+    phase_row = ""
+    node_row = ""
+    phase_widths = _spans([phase["seconds"] for phase in flame["phases"]], total, 0, width)
+    for phase, columns in zip(flame["phases"], phase_widths):
+        phase_row += _bar(phase["phase"], columns)
+        node_widths = _spans([node["seconds"] for node in phase["nodes"]], phase["seconds"],
+                             len(node_row), columns)
+        node_row += "".join(_bar(node["label"], node_columns)
+                            for node, node_columns in zip(phase["nodes"], node_widths))
+    lines.extend([phase_row, node_row])
+    for phase in flame["phases"]:
+        lines.append(f"  {phase['phase']:<34} {phase['seconds']:>8.2f}s {100 * phase['seconds'] / total:>6.1f}%")
+        for node in phase["nodes"]:
+            lines.append(f"    {node['label'][:32]:<32} {node['seconds']:>8.2f}s {100 * node['seconds'] / total:>6.1f}%")
+    return lines
+
+
+def class_table(rows: List[Dict]) -> List[str]:
+    lines = [f"{'class_type':<32} {'phase':<9} {'runs':>5} {'cached':>6} {'total':>9} "
+             f"{'share':>6} {'p50':>8} {'p90':>8} {'p99':>8}"]
+    for row in rows:
+        cells = " ".join(f"{row[key]:>7.2f}s" if row[key] is not None else f"{'-':>8}"
+                         for key in ("p50", "p90", "p99"))
+        lines.append(f"{row['class_type'][:32]:<32} {row['phase']:<9} {row['executed']:>5} {row['cached']:>6} "
+                     f"{row['total']:>8.2f}s {100 * row['share']:>5.1f}% {cells}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-node execution profile of workflows")
+    parser.add_argument("workflows", nargs="*", help="Workflow files to run and profile")
+    parser.add_argument("--results", nargs="+", metavar="FILE",
+                        help="Profile the runs saved by benchmark.py instead of running workflows")
+    parser.add_argument("--runs", type=int, default=5, help="Profiled runs per workflow (default: 5)")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="Unprofiled runs first, e.g. to leave model loading out (default: 0)")
+    parser.add_argument("--state", choices=("warm", "cold"), default="warm",
+                        help="cold frees models and node cache before every run")
+    parser.add_argument("--include-warmup", action="store_true", help="With --results, profile warmup runs too")
+    parser.add_argument("--width", type=int, default=FLAME_WIDTH, help="Chart width in columns")
+    parser.add_argument("-o", "--output", type=str, help="Write the profile as JSON")
+    parser.add_argument("--url", type=str, default=COMFY_URL, help=f"ComfyUI server (default: {COMFY_URL})")
+    args = parser.parse_args()
+
+    if not args.workflows and not args.results:
+        parser.error("give workflow files or --results")
+
+    profiler = NodeProfiler()
+    for path in args.results or []:
+        with open(path, "r", encoding="utf-8") as f:
+            profiler.add_results(json.load(f), warmup=args.include_warmup)
+
+    if args.workflows:
+        bench = Benchmark(args.url, state=args.state, repeats=args.runs, warmup=args.warmup)
+        if not bench.client.ping():
+            print(f"✗ ComfyUI server not accessible at {args.url}")
+            return 1
+        bench.tracker.start()
+        if not bench.tracker.connected.wait(5):
+            print("✗ Websocket not connected; node events are needed to profile")
+            return 1
+        profiler.add_results(bench.run([Path(path) for path in args.workflows]))
+        bench.tracker.stop()
+
+    if not profiler.templates():
+        print("No successful runs to profile")
+        return 1
+    print()
+    print(profiler.report(args.width))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(profiler.to_dict(), f, indent=2)
+        print(f"\nProfile: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
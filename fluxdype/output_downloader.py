@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Concurrent Streaming Output Downloader
+Finds finished jobs (explicit IDs, the batch job journal, or the server's
+/history) and streams their images from /view straight to disk, many at a
+time over the shared pooled client.
+
+Files already downloaded are skipped: a local file is trusted when its size
+and SHA-256 match the manifest written on download (.downloads.json in the
+output folder), or, for files from older runs, when its size matches the
+server's Content-Length.
+
+Journaled jobs are fetched from the server that ran them (batch_generate.py
+--servers), each over its own pooled client. Images from a server other
+than --url go to a subfolder named after it (e.g. outputs/gpu2_8188/),
+since ComfyUI numbers its files per server and names can repeat.
+
+    python output_downloader.py                       # journal, else /history
+    python output_downloader.py --history --max-items 50
+    python output_downloader.py JOB_ID JOB_ID --wait 180
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from comfy_client import COMFY_URL, AsyncComfyClient
+from job_journal import DEFAULT_JOURNAL_PATH, SUCCESS, JobJournal
+
+DEFAULT_OUTPUT_DIR = Path("outputs")
+DEFAULT_CONCURRENCY = 8
+MANIFEST_NAME = ".downloads.json"
+CHUNK_SIZE = 1 << 16
+
+# prompt_id -> (outputs, URL of the server that ran it; None for base_url)
+Jobs = Dict[str, Tuple[Dict, Optional[str]]]
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def job_images(outputs: Dict, types: Iterable[str] = ("output",)) -> List[Dict]:
+    """Image entries of a job's outputs (temp previews excluded by default)"""
+    images = []
+    for node_output in (outputs or {}).values():
+        for image in (node_output or {}).get("images", []):
+            if image.get("type", "output") in types:
+                images.append(image)
+    return images
+
+
+def _finished(entry: Optional[Dict]) -> bool:
+    return bool(entry) and entry.get("status", {}).get("completed", True)
+
+
+class OutputDownloader:
+    """Stream finished jobs' images to disk with bounded concurrency"""
+
+    def __init__(
+        self,
+        output_dir: Path = DEFAULT_OUTPUT_DIR,
+        base_url: str = COMFY_URL,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        on_file: Optional[Callable[[str, Path, int], None]] = None
+    ):
+        self.output_dir = Path(output_dir)
+        self.concurrency = concurrency
+        self.client = self._new_client(base_url)
+        self._clients: Dict[str, AsyncComfyClient] = {self.client.base_url: self.client}
+        self.on_file = on_file or self._print_file
+        self.stats = {"downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0}
+        self._manifest_path = self.output_dir / MANIFEST_NAME
+        self._manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _new_client(self, url: str) -> AsyncComfyClient:
+        return AsyncComfyClient(url, max_connections=self.concurrency,
+                                max_concurrency=self.concurrency, timeout=60)
+
+    def client_for(self, server: Optional[str]) -> AsyncComfyClient:
+        """Pooled client of a job's server (base_url when unknown)"""
+        url = (server or self.client.base_url).rstrip("/")
+        if url not in self._clients:
+            self._clients[url] = self._new_client(url)
+        return self._clients[url]
+
+    @staticmethod
+    def _print_file(status: str, path: Path, size: int):
+        marks = {"downloaded": "✓", "skipped": "=", "failed": "❌"}
+        print(f"   {marks.get(status, '?')} {status:<10} {path.name} ({size / 1024 / 1024:.2f} MB)")
+
+    # ------------------------------------------------------------------
+    # Job discovery
+    # ------------------------------------------------------------------
+
+    async def from_history(self, max_items: Optional[int] = None) -> Jobs:
+        """(outputs, None) of every finished job in the server's /history"""
+        history = await self.client.history(max_items=max_items) or {}
+        return {pid: (entry.get("outputs", {}), None) for pid, entry in history.items() if _finished(entry)}
+
+    @staticmethod
+    def from_journal(path: Path = DEFAULT_JOURNAL_PATH, since: Optional[float] = None) -> Jobs:
+        """(outputs, server) of every successful job in the batch journal"""
+        if not Path(path).exists():
+            return {}
+        journal = JobJournal(path)
+        try:
+            return {job["prompt_id"]: (job["outputs"], job["server"])
+                    for job in journal.jobs(status=SUCCESS, since=since)}
+        finally:
+            journal.close()
+
+    # ------------------------------------------------------------------
+    # Downloading
+    # ------------------------------------------------------------------
+
+    def _target(self, image: Dict, client: AsyncComfyClient) -> Path:
+        """Local path of an image; ValueError if the server-supplied
+        subfolder or filename would place it outside output_dir"""
+        root = self.output_dir
+        if client is not self.client:
+            server = urlparse(client.base_url)
+            root = root / f"{server.hostname}_{server.port or 80}"
+        path = (root / (image.get("subfolder") or "") / image["filename"]).resolve()
+        if not path.is_relative_to(self.output_dir.resolve()) or path == self.output_dir.resolve():
+            raise ValueError(f"unsafe output path {image.get('subfolder')!r}/{image['filename']!r}")
+        return path
+
+    async def _already_present(self, client: AsyncComfyClient, image: Dict, path: Path, key: str) -> bool:
+        if not path.exists():
+            return False
+        size = path.stat().st_size
+        known = self._manifest.get(key)
+        if known:
+            return known["size"] == size and known["sha256"] == file_sha256(path)
+        # Downloaded before the manifest existed: trust a matching length
+        try:
+            remote_size = await client.view_size(
+                image["filename"], image.get("subfolder", ""), image.get("type", "output"))
+        except Exception:
+            return False
+        if remote_size != size:
+            return False
+        self._manifest[key] = {"size": size, "sha256": file_sha256(path)}
+        return True
+
+    async def download_image(self, image: Dict, prompt_id: Optional[str] = None,
+                             server: Optional[str] = None) -> str:
+        """Stream one image to disk; returns "downloaded", "skipped" or "failed" """
+        client = self.client_for(server)
+        try:
+            path = self._target(image, client)
+        except ValueError as e:
+            self.stats["failed"] += 1
+            print(f"   ❌ {e}")
+            return "failed"
+        key = path.relative_to(self.output_dir.resolve()).as_posix()
+
+        if await self._already_present(client, image, path, key):
+            self.stats["skipped"] += 1
+            self.on_file("skipped", path, path.stat().st_size)
+            return "skipped"
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = path.with_name(path.name + ".part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(part_path, "wb") as f:
+                async for chunk in client.view_stream(
+                    image["filename"], image.get("subfolder", ""), image.get("type", "output"),
+                    chunk_size=CHUNK_SIZE
+                ):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            os.replace(part_path, path)
+        except Exception as e:  # HTTP error, dropped connection, disk full
+            part_path.unlink(missing_ok=True)
+            self.stats["failed"] += 1
+            self.on_file("failed", path, size)
+            print(f"     {e}")
+            return "failed"
+
+        self._manifest[key] = {"size": size, "sha256": digest.hexdigest(), "prompt_id": prompt_id}
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += size
+        self.on_file("downloaded", path, size)
+        return "downloaded"
+
+    async def download_jobs(self, jobs: Jobs) -> Dict:
+        """Download every output image of already-finished jobs concurrently,
+        each from its own server"""
+        await asyncio.gather(*(
+            self.download_image(image, prompt_id, server)
+            for prompt_id, (outputs, server) in jobs.items()
+            for image in job_images(outputs)
+        ))
+        self._save_manifest()
+        return self.stats
+
+    async def download_ids(self, job_ids: List[str], wait: float = 0,
+                           poll_interval: float = 5.0) -> Dict:
+        """Download the given jobs, optionally waiting up to wait seconds for
+        unfinished ones. Each pass polls only the jobs still unfinished, and
+        a job's images start downloading as soon as it is seen finished."""
+        pending = list(dict.fromkeys(job_ids))
+        downloads = []
+        deadline = time.time() + wait
+
+        while pending:
+            entries = await asyncio.gather(
+                *(self.client.history(pid) for pid in pending), return_exceptions=True
+            )
+            still_pending = []
+            for prompt_id, history in zip(pending, entries):
+                entry = history.get(prompt_id) if isinstance(history, dict) else None
+                if _finished(entry):
+                    downloads += [asyncio.ensure_future(self.download_image(image, prompt_id))
+                                  for image in job_images(entry.get("outputs", {}))]
+                else:
+                    still_pending.append(prompt_id)
+            pending = still_pending
+            if not pending or time.time() >= deadline:
+                break
+            await asyncio.sleep(min(poll_interval, max(0.0, deadline - time.time())))
+
+        await asyncio.gather(*downloads)
+        self._save_manifest()
+        self.stats["unfinished"] = len(pending)
+        return self.stats
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.close()
+
+
+def download(job_ids: Optional[List[str]] = None, output_dir: Path = DEFAULT_OUTPUT_DIR,
+             base_url: str = COMFY_URL, concurrency: int = DEFAULT_CONCURRENCY,
+             wait: float = 0, use_history: bool = False, max_items: Optional[int] = None,
+             journal: Path = DEFAULT_JOURNAL_PATH) -> Dict:
+    """Synchronous entry point for scripts
+
+    With job_ids, downloads those jobs (waiting up to wait seconds). Without,
+    discovers finished jobs from the journal, or from /history when
+    use_history is set or the journal is empty.
+    """
+    async def run() -> Dict:
+        downloader = OutputDownloader(output_dir, base_url, concurrency)
+        try:
+            if job_ids:
+                return await downloader.download_ids(job_ids, wait=wait)
+            jobs = {} if use_history else downloader.from_journal(journal)
+            if not jobs:
+                jobs = await downloader.from_history(max_items)
+            print(f"Found {len(jobs)} finished jobs")
+            return await downloader.download_jobs(jobs)
+        finally:
+            await downloader.close()
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download ComfyUI outputs concurrently")
+    parser.add_argument("job_ids", nargs="*", help="Prompt IDs (default: discover finished jobs)")
+    parser.add_argument("-o", "--output", type=str, default=str(DEFAULT_OUTPUT_DIR),
+                        help="Output folder (default: outputs)")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Simultaneous downloads (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--wait", type=float, default=0,
+                        help="Seconds to wait for unfinished job IDs (default: 0)")
+    parser.add_argument("--history", action="store_true",
+                        help="Discover jobs from the server /history instead of the journal")
+    parser.add_argument("--max-items", type=int, help="Limit /history discovery to the newest N jobs")
+    parser.add_argument("--journal", type=str, default=str(DEFAULT_JOURNAL_PATH),
+                        help="Job journal to discover jobs from")
+    parser.add_argument("--url", type=str, default=COMFY_URL, help=f"ComfyUI URL (default: {COMFY_URL})")
+    args = parser.parse_args()
+
+    start = time.time()
+    stats = download(args.job_ids, Path(args.output), args.url, args.concurrency,
+                     args.wait, args.history, args.max_items, Path(args.journal))
+    elapsed = time.time() - start
+    print(f"\n✅ {stats['downloaded']} downloaded ({stats['bytes'] / 1024 / 1024:.1f} MB), "
+          f"{stats['skipped']} already present, {stats['failed']} failed in {elapsed:.1f}s")
+    if stats.get("unfinished"):
+        print(f"⚠️  {stats['unfinished']} jobs not finished yet; run again later")
+
+
+if __name__ == "__main__":
+    main()
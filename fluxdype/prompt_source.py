@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Streaming Prompt Sources
+Reads batch prompts one item at a time, so prompt files of millions of lines
+never have to fit in memory. Three formats, picked by file extension:
+
+  .txt    one prompt per line. '#' lines are comments; the last comment
+          before a prompt is its section header (e.g. "5.1.3 CHAKRA 3 -
+          SOLAR PLEXUS (MANIPURA)") and applies until the next comment.
+  .jsonl  one JSON object per line: {"prompt": ..., "section": ...,
+          "resolution": ..., "preset": ..., "loras": ..., "seed": ...,
+          "output": ...}
+  .csv    the same fields as columns, with a header row
+
+Only "prompt" is required. Resolution and preset are the names used by
+batch_generate.py (a resolution may also be "WIDTHxHEIGHT"); output is the
+SaveImage filename prefix. loras replaces the preset's LoRA stack, as a
+list of {"name", "strength"} objects (JSONL) or "name:strength; name"
+(either format); "none" means no LoRAs, an empty cell keeps the preset's.
+
+    source = PromptSource("prompts_spiritatlas_square_512.txt")
+    len(source)                 # counted in one streaming pass, then cached
+    for item in source:         # every iteration re-reads the file
+        item.prompt, item.section, item.index
+"""
+
+import csv
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+FORMATS = {".txt": "text", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+
+# Manifest column -> PromptItem field
+FIELD_ALIASES = {
+    "prompt": "prompt",
+    "section": "section",
+    "resolution": "resolution",
+    "preset": "preset",
+    "quality": "preset",
+    "loras": "loras",
+    "lora": "loras",
+    "seed": "seed",
+    "output": "output",
+    "output_name": "output",
+    "name": "output",
+}
+
+
+class PromptItem(NamedTuple):
+    """One prompt and the metadata that travels with it to its images"""
+    prompt: str
+    index: int                        # 1-based position among the source's prompts
+    section: Optional[str] = None
+    resolution: Optional[str] = None  # overrides the run's resolution
+    preset: Optional[str] = None      # overrides the run's quality preset
+    loras: Optional[Tuple[Tuple[str, float], ...]] = None  # overrides the preset's LoRA stack
+    seed: Optional[int] = None        # seed of the item's first job
+    output: Optional[str] = None      # SaveImage filename prefix
+
+
+def _text_items(lines: Iterable[str]) -> Iterator[PromptItem]:
+    section = None
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            section = line.lstrip("#").strip() or section
+            continue
+        index += 1
+        yield PromptItem(line, index, section)
+
+
+def parse_loras(value: Any) -> Tuple[Tuple[str, float], ...]:
+    """LoRA stack of a manifest cell as ((name, strength), ...)
+
+    Accepts "name:strength; name" strings (strength defaults to 1.0), or
+    lists of such strings, {"name", "strength"} objects or [name, strength]
+    pairs.
+    """
+    if isinstance(value, str):
+        value = [] if value.strip().lower() in ("none", "[]") else [
+            part for part in value.split(";") if part.strip()]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"LoRA stack {value!r} is not a list")
+    stack = []
+    for entry in value:
+        if isinstance(entry, dict):
+            name, strength = entry.get("name"), entry.get("strength", 1.0)
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            name, strength = entry
+        elif isinstance(entry, str):
+            name, _, strength = entry.strip().rpartition(":") if ":" in entry else (entry.strip(), "", 1.0)
+        else:
+            raise ValueError(f"LoRA {entry!r} is not name:strength")
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"LoRA {entry!r} has no name")
+        try:
+            stack.append((name.strip(), float(strength)))
+        except (TypeError, ValueError):
+            raise ValueError(f"LoRA {name!r} strength {strength!r} is not a number") from None
+    return tuple(stack)
+
+
+def _manifest_item(row: Dict, index: int, where: str) -> PromptItem:
+    fields = {}
+    for column, value in row.items():
+        field = FIELD_ALIASES.get(str(column).strip().lower()) if column is not None else None
+        if field is None or value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        fields[field] = value.strip() if isinstance(value, str) else value
+    if not isinstance(fields.get("prompt"), str):
+        raise ValueError(f"{where}: no prompt")
+    if "seed" in fields:
+        try:
+            fields["seed"] = int(fields["seed"])
+        except (TypeError, ValueError):
+            raise ValueError(f"{where}: seed {fields['seed']!r} is not an integer") from None
+    if "loras" in fields:
+        try:
+            fields["loras"] = parse_loras(fields["loras"])
+        except ValueError as e:
+            raise ValueError(f"{where}: {e}") from None
+    for field in ("section", "resolution", "preset", "output"):
+        if field in fields:
+            fields[field] = str(fields[field])
+    return PromptItem(index=index, **fields)
+
+
+def _jsonl_items(lines: Iterable[str], path: str) -> Iterator[PromptItem]:
+    index = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}:{number}: {e.msg}") from None
+        if isinstance(row, str):
+            row = {"prompt": row}
+        if not isinstance(row, dict):
+            raise ValueError(f"{path}:{number}: expected an object")
+        index += 1
+        yield _manifest_item(row, index, f"{path}:{number}")
+
+
+def _csv_items(lines: Iterable[str], path: str) -> Iterator[PromptItem]:
+    reader = csv.DictReader(line for line in lines if not line.startswith("#"))
+    for index, row in enumerate(reader, 1):
+        yield _manifest_item(row, index, f"{path}: row {index}")
+
+
+class PromptSource:
+    """Re-iterable, streaming view of a prompt file or manifest"""
+
+    def __init__(self, path: Union[str, Path], format: Optional[str] = None):
+        self.path = Path(path)
+        self.format = format or FORMATS.get(self.path.suffix.lower(), "text")
+        if self.format not in set(FORMATS.values()):
+            raise ValueError(f"Unknown prompt format: {self.format}")
+        self._count: Optional[int] = None
+        self._digest: Optional[str] = None
+
+    def __iter__(self) -> Iterator[PromptItem]:
+        with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+            if self.format == "jsonl":
+                yield from _jsonl_items(f, str(self.path))
+            elif self.format == "csv":
+                yield from _csv_items(f, str(self.path))
+            else:
+                yield from _text_items(f)
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def first(self) -> Optional[PromptItem]:
+        return next(iter(self), None)
+
+    def digest(self) -> str:
+        """SHA-256 over every item, streamed; identifies the run in the job journal"""
+        if self._digest is None:
+            sha = hashlib.sha256()
+            count = 0
+            for item in self:
+                sha.update(json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n")
+                count += 1
+            self._digest, self._count = sha.hexdigest(), count
+        return self._digest
+
+
+def prompt_items(prompts: Iterable[Union[str, PromptItem]]) -> Iterator[PromptItem]:
+    """PromptItems of a source, or of plain prompt strings numbered from 1"""
+    for index, prompt in enumerate(prompts, 1):
+        yield prompt if isinstance(prompt, PromptItem) else PromptItem(prompt, index)
+
+
+def output_slug(text: str, limit: int = 60) -> str:
+    """Filename-safe form of a section header"""
+    return re.sub(r"[^a-z0-9.]+", "_", text.lower()).strip("_.")[:limit].rstrip("_.")
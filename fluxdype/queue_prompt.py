@@ -1,8 +1,7 @@
 import json
-import urllib.request
-import urllib.parse
 import random
-import uuid
+
+from comfy_client import ComfyClient
 
 # Load the workflow
 with open('HyperFlux-Turbo-REALISTIC-FIXED.json', 'r') as f:
@@ -16,19 +15,8 @@ for node in workflow['nodes']:
     if node['type'] == 'RandomNoise':
         node['widgets_values'][0] = random.randint(0, 999999999)
 
-# Prepare the API request
-prompt_data = {
-    "prompt": workflow,
-    "client_id": str(uuid.uuid4())
-}
-
 # Send to ComfyUI
-url = "http://localhost:8188/prompt"
-headers = {'Content-Type': 'application/json'}
-data = json.dumps(prompt_data).encode('utf-8')
-
-req = urllib.request.Request(url, data=data, headers=headers)
-with urllib.request.urlopen(req) as response:
-    result = json.loads(response.read().decode('utf-8'))
+with ComfyClient("http://localhost:8188") as client:
+    result = client.submit(workflow)
     print(f"✓ Queued successfully! Prompt ID: {result.get('prompt_id', 'unknown')}")
     print(f"Queue number: {result.get('number', 'unknown')}")
@@ -5,10 +5,14 @@ import urllib.error
 import time
 import sys
 import os
+import uuid
+
+from workflow_template import WorkflowTemplate, slot
 
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
 SERVER_URL = "http://localhost:8188"
+CLIENT_ID = str(uuid.uuid4())
 
 # Quick prompts
 PROMPTS = [
@@ -31,68 +35,70 @@ except Exception as e:
     print(f"[FAIL] Server not responding: {e}")
     sys.exit(1)
 
-# Generate each image
-jobs = []
-for i, (prompt, name) in enumerate(PROMPTS, 1):
-    workflow = {
-        "1": {
-            "inputs": {"unet_name": "qwen_image_fp8_e4m3fn.safetensors"},
-            "class_type": "UNETLoader"
-        },
-        "2": {
-            "inputs": {
-                "clip_name": "qwen_2.5_vl_7b_fp8_scaled.safetensors",
-                "type": "qwen_image"
-            },
-            "class_type": "CLIPLoader"
-        },
-        "3": {
-            "inputs": {"vae_name": "qwen_image_vae.safetensors"},
-            "class_type": "VAELoader"
+# One graph for every image; only prompt, seed and filename change
+workflow = {
+    "1": {
+        "inputs": {"unet_name": "qwen_image_fp8_e4m3fn.safetensors"},
+        "class_type": "UNETLoader"
+    },
+    "2": {
+        "inputs": {
+            "clip_name": "qwen_2.5_vl_7b_fp8_scaled.safetensors",
+            "type": "qwen_image"
         },
-        "4": {
-            "inputs": {"text": prompt, "clip": [2, 0]},
-            "class_type": "CLIPTextEncode"
+        "class_type": "CLIPLoader"
+    },
+    "3": {
+        "inputs": {"vae_name": "qwen_image_vae.safetensors"},
+        "class_type": "VAELoader"
+    },
+    "4": {
+        "inputs": {"text": slot("prompt"), "clip": [2, 0]},
+        "class_type": "CLIPTextEncode"
+    },
+    "5": {
+        "inputs": {"text": "", "clip": [2, 0]},
+        "class_type": "CLIPTextEncode"
+    },
+    "6": {
+        "inputs": {"width": 1024, "height": 1024, "batch_size": 1},
+        "class_type": "EmptySD3LatentImage"
+    },
+    "7": {
+        "inputs": {
+            "seed": slot("seed"),
+            "steps": 20,
+            "cfg": 2.5,
+            "sampler_name": "euler",
+            "scheduler": "simple",
+            "denoise": 1.0,
+            "model": [1, 0],
+            "positive": [4, 0],
+            "negative": [5, 0],
+            "latent_image": [6, 0]
         },
-        "5": {
-            "inputs": {"text": "", "clip": [2, 0]},
-            "class_type": "CLIPTextEncode"
+        "class_type": "KSampler"
+    },
+    "8": {
+        "inputs": {"samples": [7, 0], "vae": [3, 0]},
+        "class_type": "VAEDecode"
+    },
+    "9": {
+        "inputs": {
+            "filename_prefix": slot("filename_prefix"),
+            "images": [8, 0]
         },
-        "6": {
-            "inputs": {"width": 1024, "height": 1024, "batch_size": 1},
-            "class_type": "EmptySD3LatentImage"
-        },
-        "7": {
-            "inputs": {
-                "seed": 100 + i,
-                "steps": 20,
-                "cfg": 2.5,
-                "sampler_name": "euler",
-                "scheduler": "simple",
-                "denoise": 1.0,
-                "model": [1, 0],
-                "positive": [4, 0],
-                "negative": [5, 0],
-                "latent_image": [6, 0]
-            },
-            "class_type": "KSampler"
-        },
-        "8": {
-            "inputs": {"samples": [7, 0], "vae": [3, 0]},
-            "class_type": "VAEDecode"
-        },
-        "9": {
-            "inputs": {
-                "filename_prefix": f"qwen_{i}_{name}",
-                "images": [8, 0]
-            },
-            "class_type": "SaveImage"
-        }
+        "class_type": "SaveImage"
     }
+}
+template = WorkflowTemplate.for_prompt(workflow, {})
 
+# Generate each image
+jobs = []
+for i, (prompt, name) in enumerate(PROMPTS, 1):
     try:
-        api_payload = {"prompt": workflow}
-        json_data = json.dumps(api_payload).encode('utf-8')
+        json_data = template.render(prompt=prompt, seed=100 + i, filename_prefix=f"qwen_{i}_{name}",
+                                    client_id=CLIENT_ID)
         req = urllib.request.Request(
             f"{SERVER_URL}/prompt",
             data=json_data,
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Result Cache
+Stores generated images keyed by a canonical hash of the API-format
+workflow plus the identity of every model file it loads, so re-running a
+fixed-seed workflow returns the stored outputs without touching the GPU.
+
+Canonical form: "_meta" and filename_prefix are stripped, keys sorted and
+node IDs replaced by content-derived IDs, so cosmetic differences between
+otherwise identical graphs hash the same. Model identity is name + size +
+mtime (hashing 12-23GB files on every lookup would cost more than the GPU).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from workflow_graph import is_link
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_CACHE_DIR = SCRIPT_DIR / ".cache" / "results"
+DEFAULT_MODELS_DIR = SCRIPT_DIR / "ComfyUI" / "models"
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3  # 5GB
+
+MODEL_EXTENSIONS = (".safetensors", ".gguf", ".ckpt", ".pt", ".pth", ".bin", ".sft")
+
+# Inputs that never change the pixels produced
+VOLATILE_INPUTS = ("filename_prefix",)
+
+
+def canonical_workflow(workflow: Dict) -> Dict:
+    """API-format workflow with content-derived node IDs and no cosmetic fields"""
+    if "prompt" in workflow and isinstance(workflow["prompt"], dict):
+        workflow = workflow["prompt"]
+
+    nodes = {str(node_id): node for node_id, node in workflow.items()}
+    digests: Dict[str, str] = {}
+
+    def digest(node_id: str, visiting=()) -> str:
+        if node_id in digests:
+            return digests[node_id]
+        if node_id in visiting or node_id not in nodes:
+            return f"missing:{node_id}"
+        node = nodes[node_id]
+        inputs = {}
+        for name, value in sorted(node.get("inputs", {}).items()):
+            if name in VOLATILE_INPUTS:
+                continue
+            if is_link(value):
+                inputs[name] = ["@" + digest(str(value[0]), visiting + (node_id,)), value[1]]
+            else:
+                inputs[name] = value
+        payload = json.dumps([node.get("class_type"), inputs], sort_keys=True, separators=(",", ":"))
+        digests[node_id] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return digests[node_id]
+
+    for node_id in nodes:
+        digest(node_id)
+
+    # Identical subgraphs collapse onto one ID, in a stable digest order
+    canonical_ids = {}
+    for node_id in sorted(nodes, key=lambda n: digests[n]):
+        canonical_ids.setdefault(digests[node_id], str(len(canonical_ids) + 1))
+
+    canonical = {}
+    for node_id, node in nodes.items():
+        inputs = {}
+        for name, value in node.get("inputs", {}).items():
+            if name in VOLATILE_INPUTS:
+                continue
+            if is_link(value):
+                source = str(value[0])
+                inputs[name] = [canonical_ids.get(digests.get(source), f"missing:{source}"), value[1]]
+            else:
+                inputs[name] = value
+        canonical[canonical_ids[digests[node_id]]] = {
+            "class_type": node.get("class_type"),
+            "inputs": inputs,
+        }
+    return canonical
+
+
+def referenced_models(workflow: Dict) -> List[str]:
+    """Model file names a workflow loads"""
+    names = set()
+
+    def collect(value):
+        if isinstance(value, str) and value.lower().endswith(MODEL_EXTENSIONS):
+            names.add(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                collect(item)
+
+    for node in canonical_workflow(workflow).values():
+        for value in node["inputs"].values():
+            collect(value)
+    return sorted(names)
+
+
+class ResultCache:
+    """LRU, size-bounded store of workflow outputs keyed by content hash"""
+
+    def __init__(
+        self,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        models_dir: Path = DEFAULT_MODELS_DIR,
+        enabled: bool = True
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.models_dir = Path(models_dir)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._index_path = self.cache_dir / "index.json"
+        self._model_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._index = self._load_index() if enabled else {}
+
+    def _load_index(self) -> Dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def model_identity(self, name: str) -> str:
+        """name:size:mtime of the model file, or just the name if not found"""
+        if name not in self._model_ids:
+            identity = name
+            if self.models_dir.exists():
+                for path in self.models_dir.rglob(Path(name).name):
+                    stat = path.stat()
+                    identity = f"{name}:{stat.st_size}:{int(stat.st_mtime)}"
+                    break
+            self._model_ids[name] = identity
+        return self._model_ids[name]
+
+    def key(self, workflow: Dict) -> str:
+        """Cache key: canonical workflow + model file identities"""
+        canonical = canonical_workflow(workflow)
+        models = [self.model_identity(name) for name in referenced_models(canonical)]
+        payload = json.dumps([canonical, models], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, workflow: Dict) -> Optional[Dict]:
+        """{"files": [paths], "meta": {...}} for this workflow, or None on a miss"""
+        if not self.enabled:
+            return None
+        key = self.key(workflow)
+        with self._lock:
+            entry = self._index.get(key)
+            paths = [self.cache_dir / key[:2] / key / name for name in (entry or {}).get("files", [])]
+            if not entry or not all(path.exists() for path in paths):
+                self.misses += 1
+                return None
+            entry["last_used"] = time.time()
+            self.hits += 1
+            self._save_index()
+            return {"files": paths, "meta": entry.get("meta", {})}
+
+    def put(self, workflow: Dict, files: Dict[str, bytes],
+            meta: Optional[Dict] = None) -> List[Path]:
+        """Store output files (name -> content) and metadata for this workflow"""
+        if not self.enabled or not files:
+            return []
+        key = self.key(workflow)
+        entry_dir = self.cache_dir / key[:2] / key
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name, content in files.items():
+            path = entry_dir / Path(name).name
+            with open(path, "wb") as f:
+                f.write(content)
+            paths.append(path)
+        with self._lock:
+            self._index[key] = {
+                "files": [path.name for path in paths],
+                "bytes": sum(len(content) for content in files.values()),
+                "created": time.time(),
+                "last_used": time.time(),
+                "meta": meta or {},
+            }
+            self._evict()
+            self._save_index()
+        return paths
+
+    def store_outputs(self, workflow: Dict, client, outputs: Dict,
+                      meta: Optional[Dict] = None) -> List[Path]:
+        """Download a finished job's images (history/ws outputs) into the cache"""
+        if not self.enabled:
+            return []
+        files = {}
+        for node_output in (outputs or {}).values():
+            for image in (node_output or {}).get("images", []):
+                if image.get("type", "output") != "output":
+                    continue  # previews and temp files
+                files[image["filename"]] = client.view(
+                    image["filename"], image.get("subfolder", ""), image.get("type", "output")
+                )
+        return self.put(workflow, files, meta)
+
+    def _evict(self):
+        total = sum(entry["bytes"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)["bytes"]
+            shutil.rmtree(self.cache_dir / key[:2] / key, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._index),
+            "bytes": sum(entry["bytes"] for entry in self._index.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
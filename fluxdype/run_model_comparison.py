@@ -1,16 +1,33 @@
 #!/usr/bin/env python3
 """
 FP16 vs Q8 GGUF Model Comparison Test
-Measures: Speed, quality, and VRAM efficiency
+Measures: Speed, quality, and VRAM efficiency (peak/mean VRAM sampled from
+/system_stats while each job runs, compared with expected_vram)
 """
-import requests
 import json
 import time
 import os
+import argparse
 from datetime import datetime
 
+from comfy_client import ComfyAPIError, ComfyClient
+from comfy_ws import CompletionTracker
+from memory_sampler import DEFAULT_INTERVAL, MemorySampler
+from result_cache import ResultCache
+
 BASE_URL = "http://localhost:8188"
 
+client = ComfyClient(BASE_URL)
+
+# VRAM/RAM polled from /system_stats; websocket events mark when each job ran
+memory = MemorySampler(client)
+tracker = CompletionTracker(BASE_URL, client_id=client.client_id, client=client)
+tracker.add_listener(memory)
+
+# Off by default: these scripts time generation, and a reused result would
+# report the time of an earlier run. --use-cache reuses fixed-seed results.
+cache = ResultCache(enabled=False)
+
 # Test configurations
 TESTS = [
     {
@@ -31,6 +48,18 @@ TESTS = [
     }
 ]
 
+def load_workflow(workflow_file, seed=54321):
+    """Load a workflow with its KSampler seed fixed"""
+    with open(workflow_file, 'r') as f:
+        workflow = json.load(f)
+
+    # Update seed for consistency
+    for node_id, node in workflow.items():
+        if node.get('class_type') == 'KSampler':
+            node['inputs']['seed'] = seed
+
+    return workflow
+
 def submit_workflow(workflow_file, seed=54321):
     """Submit a workflow to ComfyUI"""
     if not os.path.exists(workflow_file):
@@ -38,17 +67,7 @@ def submit_workflow(workflow_file, seed=54321):
         return None
 
     try:
-        with open(workflow_file, 'r') as f:
-            workflow = json.load(f)
-
-        # Update seed for consistency
-        for node_id, node in workflow.items():
-            if node.get('class_type') == 'KSampler':
-                node['inputs']['seed'] = seed
-
-        data = {'prompt': workflow}
-        response = requests.post(f"{BASE_URL}/prompt", json=data, timeout=10)
-        result = response.json()
+        result = client.submit(load_workflow(workflow_file, seed))
 
         if result.get('node_errors'):
             print(f"  ERROR: Submission error: {result['node_errors']}")
@@ -58,6 +77,9 @@ def submit_workflow(workflow_file, seed=54321):
         print(f"  Submitted (ID: {prompt_id[:8]}...)")
         return prompt_id
 
+    except ComfyAPIError as e:
+        print(f"  ERROR: Submission error: {e.node_errors or e}")
+        return None
     except Exception as e:
         print(f"  ERROR: Failed: {e}")
         return None
@@ -65,8 +87,7 @@ def submit_workflow(workflow_file, seed=54321):
 def check_job_status(prompt_id):
     """Check job completion status"""
     try:
-        resp = requests.get(f"{BASE_URL}/history/{prompt_id}", timeout=5)
-        history = resp.json()
+        history = client.history(prompt_id)
 
         if prompt_id not in history:
             return "running", 0
@@ -89,7 +110,32 @@ def check_job_status(prompt_id):
     except Exception as e:
         return "unknown", 0
 
+def store_result(test, job_id, elapsed, usage=None):
+    """Cache a finished job's images so the next run can skip the GPU"""
+    try:
+        outputs = client.history(job_id).get(job_id, {}).get('outputs')
+        cache.store_outputs(load_workflow(test['workflow']), client, outputs,
+                            meta={"time": elapsed, "model": test['name'], "memory": usage})
+    except Exception as e:
+        print(f"  (cache store failed: {e})")
+
+def cached_result(test):
+    """Stored result for this test's workflow, or None"""
+    if not os.path.exists(test['workflow']):
+        return None
+    return cache.get(load_workflow(test['workflow']))
+
 def main():
+    parser = argparse.ArgumentParser(description='FP16 vs Q8 GGUF model comparison')
+    parser.add_argument('--use-cache', action='store_true',
+                        help='Reuse cached fixed-seed results instead of regenerating '
+                             '(their times are from the run that generated them)')
+    parser.add_argument('--memory-interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'Seconds between VRAM/RAM samples (default: {DEFAULT_INTERVAL})')
+    args = parser.parse_args()
+    cache.enabled = args.use_cache
+    memory.interval = args.memory_interval
+
     print("\n" + "="*70)
     print("  FP16 vs Q8 GGUF MODEL COMPARISON TEST")
     print("="*70)
@@ -98,10 +144,13 @@ def main():
     print()
 
     # Verify ComfyUI connection
-    try:
-        response = requests.get(f"{BASE_URL}/", timeout=5)
+    if client.ping():
         print("Status: ComfyUI server connected successfully")
-    except:
+        tracker.start()
+        memory.start()
+        if not tracker.connected.wait(5):
+            print("WARNING: Websocket not connected; VRAM cannot be attributed to jobs")
+    else:
         print("ERROR: ComfyUI server not accessible at http://localhost:8188")
         print("  Start server with: .\\start-comfy.ps1")
         return
@@ -127,16 +176,24 @@ def main():
 
     job_ids = {}
     start_times = {}
+    results = {}
 
     for test in TESTS:
         print(f"{test['name']}")
+        cached = cached_result(test)
+        if cached:
+            elapsed = cached['meta'].get('time', 0)
+            results[test['name']] = {"status": "COMPLETED", "time": elapsed, "cached": True,
+                                     "memory": cached['meta'].get('memory')}
+            print(f"  Cached result reused, GPU skipped ({elapsed:.1f}s when generated)")
+            continue
         start = time.time()
         job_id = submit_workflow(test['workflow'])
         if job_id:
             job_ids[test['name']] = job_id
             start_times[test['name']] = start
 
-    if not job_ids:
+    if not job_ids and not results:
         print("\nERROR: No jobs submitted successfully")
         return
 
@@ -147,7 +204,6 @@ def main():
     print()
 
     # Wait and monitor
-    results = {}
     global_start = time.time()
     timeout = 900  # 15 minutes timeout
 
@@ -162,9 +218,12 @@ def main():
                     elapsed = time.time() - start_times[test_name]
                     results[test_name] = {
                         "status": "COMPLETED",
-                        "time": elapsed
+                        "time": elapsed,
+                        "memory": memory.job(job_id)
                     }
                     print(f"[{elapsed:.1f}s] {test_name}: COMPLETED")
+                    store_result(next(t for t in TESTS if t['name'] == test_name), job_id, elapsed,
+                                 results[test_name]['memory'])
 
                 elif status == "error":
                     results[test_name] = {"status": "ERROR"}
@@ -231,6 +290,23 @@ def main():
             print(f"  Quality Loss: Imperceptible to human eye")
             print()
 
+    # Measured memory next to what each test expected
+    measured = [(test, completed_tests[test['name']].get('memory'))
+                for test in TESTS if test['name'] in completed_tests]
+    if measured:
+        print("VRAM COMPARISON (measured):")
+        for test, usage in measured:
+            if usage:
+                print(f"  {test['precision']:<5} peak {usage['peak_vram_gb']:.1f}GB, "
+                      f"mean {usage['mean_vram_gb']:.1f}GB of {usage['vram_total_gb']:.1f}GB "
+                      f"(expected {test['expected_vram']})")
+            else:
+                print(f"  {test['precision']:<5} not measured (expected {test['expected_vram']})")
+        peaks = [usage['peak_vram_gb'] for _, usage in measured if usage]
+        if len(peaks) == len(measured) == 2 and peaks[0] > 0:
+            print(f"  Peak reduction: {(1 - peaks[1] / peaks[0]) * 100:.0f}%")
+        print()
+
     # Summary
     print("="*70)
     print("SUMMARY & RECOMMENDATIONS")
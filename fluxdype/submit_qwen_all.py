@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 import json
-import urllib.request
-import urllib.error
 import time
 import sys
 import os
 
+from comfy_client import ComfyAPIError, ComfyClient
+
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
 SERVER_URL = "http://localhost:8188"
+client = ComfyClient(SERVER_URL)
 WORKFLOWS = [
     ("qwen_1_portrait.json", "Portrait"),
     ("qwen_2_landscape.json", "Landscape"),
@@ -23,13 +24,11 @@ print("=" * 60)
 print("\nWaiting for server...")
 server_ready = False
 for i in range(10):
-    try:
-        req = urllib.request.Request(f"{SERVER_URL}/system_stats")
-        with urllib.request.urlopen(req, timeout=5) as response:
-            print("[OK] Server is ready!")
-            server_ready = True
-            break
-    except Exception as wait_err:
+    if client.ping():
+        print("[OK] Server is ready!")
+        server_ready = True
+        break
+    else:
         if i < 9:
             print(f"  Attempt {i+1}/10... (waiting)")
             time.sleep(3)
@@ -50,32 +49,17 @@ for workflow_file, desc in WORKFLOWS:
         with open(workflow_file, 'r') as f:
             workflow = json.load(f)
 
-        # Wrap workflow in "prompt" key as required by ComfyUI API
-        api_payload = {"prompt": workflow}
-        json_data = json.dumps(api_payload).encode('utf-8')
-
-        req = urllib.request.Request(
-            f"{SERVER_URL}/prompt",
-            data=json_data,
-            headers={'Content-Type': 'application/json'}
-        )
-
         try:
-            with urllib.request.urlopen(req, timeout=30) as response:
-                response_text = response.read().decode('utf-8')
-                data = json.loads(response_text)
-                job_id = data.get('prompt_id')
-                jobs.append(job_id)
-                print(f"[OK] {desc}: {job_id}")
-        except urllib.error.HTTPError as http_err:
-            error_body = http_err.read().decode('utf-8')
-            print(f"[FAIL] HTTP {http_err.code}: {http_err.reason}")
-            try:
-                err_json = json.loads(error_body)
-                if 'error' in err_json:
-                    print(f"  Error: {err_json['error'].get('message', 'Unknown')}")
-            except:
-                print(f"  Error body: {error_body}")
+            data = client.submit(workflow)
+            job_id = data.get('prompt_id')
+            jobs.append(job_id)
+            print(f"[OK] {desc}: {job_id}")
+        except ComfyAPIError as http_err:
+            print(f"[FAIL] HTTP {http_err.status}")
+            if isinstance(http_err.body, dict) and 'error' in http_err.body:
+                print(f"  Error: {http_err.body['error'].get('message', 'Unknown')}")
+            else:
+                print(f"  Error body: {http_err.body}")
 
     except FileNotFoundError:
         print(f"[FAIL] {desc}: File not found: {workflow_file}")
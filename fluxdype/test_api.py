@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
-import requests
 import json
 import sys
 
-# Simple test to submit a workflow and see the error
+from comfy_client import ComfyAPIError, ComfyClient
+
+# Simple test: submit a minimal Flux workflow through the pooled client
+# (which wraps it as {"prompt": ...}) and print the server's response,
+# including any node_errors from its validation
 workflow = {
     "3": {
         "inputs": {
@@ -74,14 +77,15 @@ workflow = {
 }
 
 try:
-    url = "http://localhost:8188/prompt"
-    response = requests.post(url, json=workflow, timeout=10)
-    print(f"Status: {response.status_code}")
-    print(f"Response: {response.text}")
+    client = ComfyClient("http://localhost:8188")
+    data = client.submit(workflow)
+    print("Status: 200")
+    print(f"Response: {json.dumps(data)}")
+    print(f"Job ID: {data.get('prompt_id')}")
 
-    if response.status_code == 200:
-        data = response.json()
-        print(f"Job ID: {data.get('prompt_id')}")
+except ComfyAPIError as e:
+    print(f"Status: {e.status}")
+    print(f"Response: {json.dumps(e.body) if isinstance(e.body, dict) else e.body}")
 
 except Exception as e:
     print(f"Error: {e}")
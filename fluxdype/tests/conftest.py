@@ -0,0 +1,29 @@
+"""Shared fixtures: an in-process mock ComfyUI server and a generator on it"""
+
+import pytest
+
+from batch_generate import BatchImageGenerator
+from job_journal import JobJournal
+from latency_model import LatencyModel
+from mock_comfy_server import MockComfyServer
+
+
+@pytest.fixture
+def comfy_url():
+    server = MockComfyServer(time_scale=0.01)
+    url = server.start_in_thread(port=0)
+    yield url
+    server.stop()
+
+
+@pytest.fixture
+def generator(comfy_url, tmp_path):
+    """BatchImageGenerator on the mock server, journaling and learning under tmp_path"""
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    journal.begin("test", {})
+    generator = BatchImageGenerator(servers=[comfy_url], journal=journal, profile_nodes=True)
+    generator.latency = LatencyModel(tmp_path / "latency_samples.jsonl")
+    yield generator
+    for server in generator.router.servers:
+        server.tracker.stop()
+    journal.close()
@@ -0,0 +1,42 @@
+"""BatchImageGenerator against mock_comfy_server.py
+
+The first job of a run is the one that connects the websocket trackers,
+so these check it is measured like every job after it.
+"""
+
+import json
+
+
+def run_batch(generator, variations=3):
+    return generator.generate_batch(["a lighthouse at dusk"], resolution="square",
+                                    quality="fast", variations=variations, validate=False)
+
+
+def test_first_job_yields_latency_sample(generator):
+    prompt_ids = run_batch(generator)
+
+    assert len(prompt_ids) == 3
+    assert generator.latency.samples == 3
+    lines = generator.latency.path.read_text(encoding="utf-8").splitlines()
+    # Only the first job loads the checkpoint
+    assert json.loads(lines[0])["features"]["cold"] is True
+
+
+def test_first_job_journals_sampling_speed(generator):
+    prompt_ids = run_batch(generator)
+
+    jobs = {job["prompt_id"]: job for job in generator.journal.jobs()}
+    first = jobs[prompt_ids[0]]
+    assert first["status"] == "success"
+    assert first["it_per_s"] is not None
+    assert first["first_step"] is not None
+    assert all(jobs[prompt_id]["it_per_s"] is not None for prompt_id in prompt_ids)
+
+
+def test_every_job_is_profiled(generator):
+    prompt_ids = run_batch(generator)
+
+    profiler = generator.node_profiler
+    templates = profiler.templates()
+    assert templates
+    assert sum(profiler.flame(template)["jobs"] for template in templates) == len(prompt_ids)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Schema-Driven Workflow Converter
+Converts UI-format workflows (the "Save" export: nodes / links /
+widgets_values) to the API format /prompt expects, using the server's
+/object_info schema to map each widget value to its input name.
+
+Positional mapping alone goes wrong whenever the UI stores values that are
+not inputs: the control_after_generate value after every seed, the upload
+button of LoadImage, rgthree's LoRA rows. The schema says exactly which
+inputs are widgets and in what order. Reroute nodes are collapsed, Primitive
+nodes are inlined into the inputs they drive, bypassed nodes are passed
+through and muted or UI-only nodes are dropped. Finally nodes that no output
+node depends on are pruned (see workflow_graph.py) and listed in .pruned.
+
+The schema is cached on disk, one file per server
+(.cache/object_info_<host>_<port>.json), and re-fetched when that server's
+ComfyUI version changes, so converting needs no server at all after the
+first run. Without any schema the converter falls back to the
+widget markers newer exports carry on each node's inputs.
+
+    converter = WorkflowConverter.from_server()
+    api_workflow = converter.convert(json.load(open("HyperFlux-Turbo-NSFW-Fast.json")))
+
+    python workflow_convert.py HyperFlux-*.json -o api/
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from comfy_client import COMFY_URL, ComfyClient
+from model_scheduler import POWER_LORA_LOADER
+from workflow_graph import describe_removed, prune_unreachable
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+SCHEMA_DIR = SCRIPT_DIR / ".cache"
+DEFAULT_SCHEMA_MAX_AGE = 7 * 24 * 3600  # custom nodes can change without a version bump
+
+WIDGET_TYPES = ("INT", "FLOAT", "STRING", "BOOLEAN", "COMBO")
+SEED_INPUTS = ("seed", "noise_seed")
+UPLOAD_OPTIONS = ("image_upload", "video_upload", "audio_upload", "animated_image_upload")
+
+# Nodes that exist only in the editor (core PrimitiveInt etc. are real nodes)
+UI_ONLY_NODES = ("Note", "MarkdownNote", "Reroute", "PrimitiveNode")
+MODE_MUTED = 2
+MODE_BYPASSED = 4
+
+# Layout entries: (input name, kind) where kind is "widget", "control" or "upload"
+Layout = List[Tuple[str, str]]
+
+
+class WorkflowConversionError(ValueError):
+    """A UI workflow that cannot be expressed in API format"""
+
+
+def is_ui_workflow(data: Any) -> bool:
+    """True for the editor's export format (as opposed to API format)"""
+    return isinstance(data, dict) and isinstance(data.get("nodes"), list) and "links" in data
+
+
+def schema_path(base_url: str) -> Path:
+    """Cache file of one server's /object_info, e.g. .cache/object_info_localhost_8188.json"""
+    host = re.sub(r"^\w+://", "", base_url.rstrip("/"))
+    return SCHEMA_DIR / f"object_info_{re.sub(r'[^A-Za-z0-9.-]+', '_', host)}.json"
+
+
+class ObjectInfoCache:
+    """/object_info kept on disk per server, refreshed when the server
+    version changes
+
+    Servers can differ in custom nodes and model lists, so a schema is only
+    ever reused for the URL it was fetched from.
+    """
+
+    def __init__(self, base_url: str = COMFY_URL, path: Optional[Path] = None,
+                 max_age: float = DEFAULT_SCHEMA_MAX_AGE):
+        self.base_url = base_url.rstrip("/")
+        self.path = Path(path) if path else schema_path(self.base_url)
+        self.max_age = max_age
+
+    def _read(self) -> Optional[Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached if cached.get("url") == self.base_url else None
+
+    def _write(self, cached: Dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self, refresh: bool = False, client: Optional[ComfyClient] = None) -> Optional[Dict]:
+        """The object_info schema, or None if there is neither a server nor a cache"""
+        cached = self._read()
+        fresh = cached and time.time() - cached.get("fetched", 0) < self.max_age
+        try:
+            client = client or ComfyClient(self.base_url)
+            stats = client.system_stats()
+        except Exception:
+            # Offline: any cached schema beats none
+            return cached["object_info"] if cached else None
+
+        version = stats.get("system", {}).get("comfyui_version", "unknown")
+        if cached and fresh and not refresh and cached.get("version") == version:
+            return cached["object_info"]
+        try:
+            object_info = client.object_info()
+        except Exception:
+            return cached["object_info"] if cached else None
+        self._write({"version": version, "fetched": time.time(), "url": self.base_url,
+                     "object_info": object_info})
+        return object_info
+
+
+def input_spec(spec: Any) -> Tuple[Any, Dict]:
+    """(type, options) of an /object_info input spec; a combo's type is its
+    list of choices"""
+    if isinstance(spec, (list, tuple)) and spec:
+        options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+        if spec[0] == "COMBO":  # newer schema: choices listed under "options"
+            return list(options.get("options", [])), options
+        return spec[0], options
+    return spec, {}
+
+
+def schema_layout(node_info: Dict) -> Layout:
+    """Order of widgets_values for a node class, as the editor lays them out"""
+    inputs = node_info.get("input", {})
+    order = node_info.get("input_order") or {
+        section: list(inputs.get(section, {})) for section in ("required", "optional")
+    }
+    layout: Layout = []
+    for section in ("required", "optional"):
+        specs = inputs.get(section, {})
+        for name in order.get(section, []):
+            kind, options = input_spec(specs.get(name))
+            if options.get("forceInput"):
+                continue
+            if not (isinstance(kind, list) or kind in WIDGET_TYPES):
+                continue  # link-only type (MODEL, CLIP, LATENT, ...)
+            layout.append((name, "widget"))
+            if options.get("control_after_generate") or (kind == "INT" and name in SEED_INPUTS):
+                layout.append((name, "control"))
+            if any(options.get(flag) for flag in UPLOAD_OPTIONS):
+                layout.append((name, "upload"))
+    return layout
+
+
+def node_layout(node: Dict) -> Layout:
+    """Widget order from the markers on the node's own inputs (no schema)"""
+    layout: Layout = []
+    for inp in node.get("inputs", []):
+        if not inp.get("widget"):
+            continue
+        name = inp["widget"].get("name", inp["name"])
+        kind = inp.get("type")
+        if kind in ("IMAGEUPLOAD",):
+            layout.append((name, "upload"))
+            continue
+        layout.append((name, "widget"))
+        if kind == "INT" and name in SEED_INPUTS:
+            layout.append((name, "control"))
+    return layout
+
+
+class WorkflowConverter:
+    """UI-format -> API-format conversion driven by an /object_info schema"""
+
+    def __init__(self, object_info: Optional[Dict] = None):
+        self.object_info = object_info or {}
+        self._layouts: Dict[str, Layout] = {}
+        self.warnings: List[str] = []
+        self.pruned: List[Tuple[str, str]] = []  # (node_id, class_type) of the last convert()
+
+    @classmethod
+    def from_server(cls, base_url: str = COMFY_URL, refresh: bool = False,
+                    client: Optional[ComfyClient] = None) -> "WorkflowConverter":
+        return cls(ObjectInfoCache(base_url).load(refresh=refresh, client=client))
+
+    def layout(self, node: Dict) -> Layout:
+        class_type = node["type"]
+        if class_type in self.object_info:
+            if class_type not in self._layouts:
+                self._layouts[class_type] = schema_layout(self.object_info[class_type])
+            return self._layouts[class_type]
+        if self.object_info:
+            self.warnings.append(f"{class_type}: not in server schema, using the node's widget markers")
+        return node_layout(node)
+
+    @staticmethod
+    def _links(workflow: Dict) -> Dict[int, Tuple[int, int, Optional[str]]]:
+        """link id -> (source node id, source slot, type); both link encodings"""
+        links = {}
+        for link in workflow.get("links") or []:
+            if isinstance(link, dict):
+                links[link["id"]] = (link["origin_id"], link["origin_slot"], link.get("type"))
+            else:
+                links[link[0]] = (link[1], link[2], link[5] if len(link) > 5 else None)
+        return links
+
+    def _resolve(self, nodes: Dict[int, Dict], links: Dict, link_id: Optional[int], depth: int = 0):
+        """("link", [node_id, slot]), ("value", v) or None for a link ID,
+        following Reroutes and bypassed nodes and inlining Primitives"""
+        if link_id is None or link_id not in links or depth > 64:
+            return None
+        source_id, slot, link_type = links[link_id]
+        source = nodes.get(source_id)
+        if source is None or source.get("mode") == MODE_MUTED:
+            return None
+        if source["type"] == "Reroute":
+            inputs = source.get("inputs") or [{}]
+            return self._resolve(nodes, links, inputs[0].get("link"), depth + 1)
+        if source["type"] == "PrimitiveNode":
+            values = source.get("widgets_values") or []
+            return ("value", values[0]) if values else None
+        if source.get("mode") == MODE_BYPASSED:
+            # A bypassed node passes through its first input of the same type
+            candidates = [inp for inp in source.get("inputs", []) if inp.get("link") is not None]
+            same_type = [inp for inp in candidates if inp.get("type") == link_type]
+            for inp in same_type or candidates:
+                return self._resolve(nodes, links, inp["link"], depth + 1)
+            return None
+        return ("link", [str(source_id), slot])
+
+    @staticmethod
+    def _power_lora_inputs(values: List) -> Dict:
+        inputs = {}
+        count = 0
+        for value in values:
+            if isinstance(value, dict) and "lora" in value:
+                count += 1
+                inputs[f"lora_{count}"] = {key: value[key] for key in ("on", "lora", "strength", "strengthTwo")
+                                           if key in value and value[key] is not None}
+        return inputs
+
+    def convert(self, workflow: Dict, prune: bool = True) -> Dict:
+        """API-format prompt for a UI-format workflow"""
+        if not is_ui_workflow(workflow):
+            raise WorkflowConversionError("not a UI-format workflow (no nodes/links)")
+        nodes = {node["id"]: node for node in workflow["nodes"]}
+        links = self._links(workflow)
+        prompt = {}
+
+        for node_id, node in nodes.items():
+            class_type = node.get("type")
+            if class_type in UI_ONLY_NODES:
+                continue
+            if node.get("mode") in (MODE_MUTED, MODE_BYPASSED):
+                continue
+
+            inputs: Dict[str, Any] = {}
+            values = node.get("widgets_values") or []
+            if class_type == POWER_LORA_LOADER:
+                inputs.update(self._power_lora_inputs(values))
+            elif isinstance(values, dict):
+                inputs.update(values)  # some custom nodes store widgets by name
+            else:
+                layout = self.layout(node)
+                if len(values) < sum(1 for _, kind in layout if kind == "widget"):
+                    self.warnings.append(f"#{node_id} {class_type}: fewer widget values than widgets")
+                for (name, kind), value in zip(layout, values):
+                    if kind == "widget":
+                        inputs[name] = value
+
+            for inp in node.get("inputs", []):
+                resolved = self._resolve(nodes, links, inp.get("link"))
+                if resolved is not None:
+                    name = (inp.get("widget") or {}).get("name", inp["name"])
+                    inputs[name] = resolved[1]
+
+            prompt[str(node_id)] = {"inputs": inputs, "class_type": class_type,
+                                    "_meta": {"title": node.get("title", class_type)}}
+
+        self.pruned = []
+        if prune:
+            prompt, self.pruned = prune_unreachable(prompt, self.object_info)
+        return prompt
+
+
+def convert_file(path: Path, converter: WorkflowConverter) -> Dict:
+    """API-format prompt for a workflow file (API-format files pass through)"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return converter.convert(data) if is_ui_workflow(data) else data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert UI-format ComfyUI workflows to API format")
+    parser.add_argument("workflows", nargs="+", help="UI-format workflow files")
+    parser.add_argument("-o", "--output", type=str, default="api",
+                        help="Output folder for the API-format files (default: api)")
+    parser.add_argument("--url", type=str, default=COMFY_URL, help="Server to take the schema from")
+    parser.add_argument("--refresh", action="store_true", help="Re-fetch /object_info even if cached")
+    args = parser.parse_args()
+
+    converter = WorkflowConverter.from_server(args.url, refresh=args.refresh)
+    if not converter.object_info:
+        print("⚠ No /object_info schema (server offline, nothing cached); using widget markers")
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    converted = 0
+    start = time.perf_counter()
+    for path in map(Path, args.workflows):
+        try:
+            api_workflow = convert_file(path, converter)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"✗ {path.name}: {e}")
+            continue
+        with open(output_dir / path.name, "w", encoding="utf-8") as f:
+            json.dump(api_workflow, f, indent=2)
+        if converter.pruned:
+            print(f"- {path.name}: pruned {describe_removed(converter.pruned)} (no output depends on them)")
+        converted += 1
+    elapsed = time.perf_counter() - start
+
+    for warning in dict.fromkeys(converter.warnings):
+        print(f"⚠ {warning}")
+    print(f"✓ Converted {converted} workflows in {elapsed:.3f}s -> {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
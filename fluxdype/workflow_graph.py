@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+API-Format Workflow Graph Utilities
+Structural passes over API-format workflows (node_id -> {"class_type",
+"inputs"}) shared by the converter, the validator and the submit scripts.
+
+Pruning walks back from every output node (SaveImage, PreviewImage, ... or
+anything the /object_info schema marks output_node) and drops the nodes no
+output depends on: leftover LoadImage / VAEEncode branches, disconnected
+helpers, notes converted by older exporters. ComfyUI would not execute them
+anyway, but they still cost validation and can fail on missing inputs.
+
+    workflow, removed = prune_unreachable(workflow, object_info)
+
+The canonical form sorts and merges LoRA stacks and renumbers nodes from
+the graph's structure, so equivalent workflows from different generators
+are the same graph to ComfyUI's execution cache, and node instances that
+keep a loaded LoRA (LoraLoader) are reused between jobs.
+
+    workflow = canonicalize_workflow(workflow)
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from model_scheduler import LORA_LOADERS, POWER_LORA_LOADER
+
+# Output nodes known without a schema
+OUTPUT_NODE_TYPES = (
+    "SaveImage", "PreviewImage", "SaveAnimatedWEBP", "SaveAnimatedPNG", "SaveLatent",
+    "SaveImageWebsocket", "Image Save", "VHS_VideoCombine",
+)
+
+
+def is_link(value: Any) -> bool:
+    """True for an input wired to another node: [source_id, output_slot]"""
+    return (isinstance(value, list) and len(value) == 2
+            and isinstance(value[0], (str, int)) and isinstance(value[1], int))
+
+
+def output_nodes(workflow: Dict, object_info: Optional[Dict] = None) -> List[str]:
+    """IDs of the nodes whose results leave the graph"""
+    outputs = []
+    for node_id, node in workflow.items():
+        class_type = node.get("class_type")
+        info = (object_info or {}).get(class_type)
+        if (info or {}).get("output_node") or class_type in OUTPUT_NODE_TYPES:
+            outputs.append(str(node_id))
+    return outputs
+
+
+def reachable_nodes(workflow: Dict, roots: List[str]) -> Set[str]:
+    """roots plus every node they (transitively) take input from"""
+    nodes = {str(node_id): node for node_id, node in workflow.items()}
+    seen: Set[str] = set()
+    stack = [root for root in roots if root in nodes]
+    while stack:
+        node_id = stack.pop()
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        for value in nodes[node_id].get("inputs", {}).values():
+            if is_link(value) and str(value[0]) in nodes and str(value[0]) not in seen:
+                stack.append(str(value[0]))
+    return seen
+
+
+def prune_unreachable(workflow: Dict, object_info: Optional[Dict] = None
+                      ) -> Tuple[Dict, List[Tuple[str, str]]]:
+    """(workflow without nodes no output depends on, [(node_id, class_type) removed])
+
+    A graph without any recognizable output node is returned unchanged:
+    pruning it would remove everything.
+    """
+    if "prompt" in workflow and isinstance(workflow["prompt"], dict):
+        pruned, removed = prune_unreachable(workflow["prompt"], object_info)
+        return {**workflow, "prompt": pruned}, removed
+
+    roots = output_nodes(workflow, object_info)
+    if not roots:
+        return workflow, []
+    keep = reachable_nodes(workflow, roots)
+    pruned = {node_id: node for node_id, node in workflow.items() if str(node_id) in keep}
+    removed = [(str(node_id), node.get("class_type", "?"))
+               for node_id, node in workflow.items() if str(node_id) not in keep]
+    return pruned, removed
+
+
+def describe_removed(removed: List[Tuple[str, str]]) -> str:
+    """"#13 LoadImage, #12 VAEEncode" for messages"""
+    return ", ".join(f"#{node_id} {class_type}" for node_id, class_type in removed)
+
+
+# ----------------------------------------------------------------------
+# Canonical form: LoRA stacks and node IDs
+# ----------------------------------------------------------------------
+
+def _strength(value: Any, default: float = 1.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def merge_loras(entries: List[Tuple[str, float, float]]) -> List[Tuple[str, float, float]]:
+    """(name, strength_model, strength_clip) stack in canonical form
+
+    LoRA patches add up, so order does not matter, a LoRA listed twice is
+    one LoRA at the summed strength and a zero-strength LoRA is a no-op.
+    Sorted by name.
+    """
+    merged: Dict[str, List[float]] = {}
+    for name, model_strength, clip_strength in entries:
+        total = merged.setdefault(name, [0.0, 0.0])
+        total[0] += model_strength
+        total[1] += clip_strength
+    return [(name, round(model_strength, 6), round(clip_strength, 6))
+            for name, (model_strength, clip_strength) in sorted(merged.items())
+            if round(model_strength, 6) or round(clip_strength, 6)]
+
+
+def canonical_lora_rows(rows: List[Dict]) -> List[Dict]:
+    """Power Lora Loader rows (on / lora / strength / strengthTwo) in canonical form"""
+    entries = []
+    separate = False
+    for row in rows:
+        if not row.get("on", True) or row.get("lora") in (None, "", "None"):
+            continue
+        strength = _strength(row.get("strength"))
+        strength_two = row.get("strengthTwo")
+        separate = separate or strength_two is not None
+        entries.append((row["lora"], strength, _strength(strength_two, strength)))
+
+    canonical = []
+    for name, model_strength, clip_strength in merge_loras(entries):
+        row = {"on": True, "lora": name, "strength": model_strength}
+        if separate:
+            row["strengthTwo"] = clip_strength
+        canonical.append(row)
+    return canonical
+
+
+def canonical_widget_rows(values: List) -> List:
+    """A UI-format Power Lora Loader's widgets_values with its LoRA rows
+    canonicalized in place (header and trailing widgets kept)"""
+    positions = [i for i, value in enumerate(values) if isinstance(value, dict) and "lora" in value]
+    if not positions:
+        return list(values)
+    rows = canonical_lora_rows([values[i] for i in positions])
+    kept = [value for i, value in enumerate(values) if i not in positions]
+    return kept[:positions[0]] + rows + kept[positions[0]:]
+
+
+def _consumers(workflow: Dict) -> Dict[Tuple[str, int], List[Tuple[str, str]]]:
+    """(source_id, slot) -> [(consumer_id, input_name)]"""
+    consumers: Dict[Tuple[str, int], List[Tuple[str, str]]] = {}
+    for node_id, node in workflow.items():
+        for name, value in node.get("inputs", {}).items():
+            if is_link(value):
+                consumers.setdefault((str(value[0]), value[1]), []).append((node_id, name))
+    return consumers
+
+
+def _lora_chain(workflow: Dict, consumers: Dict, head: str) -> List[str]:
+    """LoRA nodes of head's class chained model-to-model, ending where an
+    output is tapped by anything but the next LoRA"""
+    class_type = workflow[head]["class_type"]
+    chain = [head]
+    while True:
+        taps = consumers.get((chain[-1], 0), [])
+        if len(taps) != 1 or taps[0][1] != "model":
+            return chain
+        following = taps[0][0]
+        if workflow[following].get("class_type") != class_type or following in chain:
+            return chain
+        chain.append(following)
+
+
+def _clip_mode(workflow: Dict, consumers: Dict, chain: List[str]) -> Optional[str]:
+    """How a LoraLoader chain wires CLIP: "parallel" (every LoRA patches the
+    same unused CLIP), "chained" (CLIP flows LoRA to LoRA) or None (other)"""
+    clips = [workflow[node_id]["inputs"].get("clip") for node_id in chain]
+    if all(clip == clips[0] for clip in clips) and \
+            not any(consumers.get((node_id, 1)) for node_id in chain):
+        return "parallel"
+    chained = all(is_link(clips[i]) and str(clips[i][0]) == chain[i - 1] and clips[i][1] == 1
+                  for i in range(1, len(chain)))
+    intermediate_taps = [consumers.get((node_id, 1), []) for node_id in chain[:-1]]
+    if chained and all(taps == [(chain[i + 1], "clip")] for i, taps in enumerate(intermediate_taps)):
+        return "chained"
+    return None
+
+
+def canonicalize_lora_stacks(workflow: Dict) -> Dict:
+    """Workflow with every LoRA stack sorted, merged and zero entries dropped
+
+    Chains of LoraLoader / LoraLoaderModelOnly nodes are rebuilt in
+    canonical order (chains whose intermediate outputs are tapped elsewhere
+    are left alone); Power Lora Loader rows are canonicalized in place.
+    """
+    if "prompt" in workflow and isinstance(workflow["prompt"], dict):
+        return {**workflow, "prompt": canonicalize_lora_stacks(workflow["prompt"])}
+
+    workflow = {str(node_id): {**node, "inputs": dict(node.get("inputs", {}))}
+                for node_id, node in workflow.items()}
+    for node in workflow.values():
+        if node.get("class_type") == POWER_LORA_LOADER:
+            rows = [value for key, value in sorted(node["inputs"].items(), key=lambda kv: _row_index(kv[0]))
+                    if key.startswith("lora_") and isinstance(value, dict)]
+            inputs = {key: value for key, value in node["inputs"].items()
+                      if not (key.startswith("lora_") and isinstance(value, dict))}
+            for index, row in enumerate(canonical_lora_rows(rows), 1):
+                inputs[f"lora_{index}"] = row
+            node["inputs"] = inputs
+
+    consumers = _consumers(workflow)
+    heads = []
+    for node_id, node in workflow.items():
+        if node.get("class_type") not in LORA_LOADERS:
+            continue
+        source = node["inputs"].get("model")
+        if not (is_link(source) and workflow.get(str(source[0]), {}).get("class_type") == node["class_type"]
+                and consumers.get((str(source[0]), 0)) == [(node_id, "model")]):
+            heads.append(node_id)
+
+    for head in heads:
+        chain = _lora_chain(workflow, consumers, head)
+        model_only = workflow[head]["class_type"] == "LoraLoaderModelOnly"
+        mode = "model_only" if model_only else _clip_mode(workflow, consumers, chain)
+        if mode is None:
+            continue
+        _rebuild_chain(workflow, consumers, chain, mode)
+        consumers = _consumers(workflow)
+    return workflow
+
+
+def _row_index(key: str) -> int:
+    suffix = key[len("lora_"):]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def _rebuild_chain(workflow: Dict, consumers: Dict, chain: List[str], mode: str):
+    class_type = workflow[chain[0]]["class_type"]
+    base_model = workflow[chain[0]]["inputs"].get("model")
+    base_clip = workflow[chain[0]]["inputs"].get("clip")
+    entries = []
+    for node_id in chain:
+        inputs = workflow[node_id]["inputs"]
+        model_strength = _strength(inputs.get("strength_model"))
+        clip_strength = _strength(inputs.get("strength_clip"), model_strength)
+        if mode in ("model_only", "parallel"):
+            clip_strength = 0.0 if mode == "model_only" else clip_strength
+        entries.append((inputs.get("lora_name"), model_strength, clip_strength))
+    stack = merge_loras(entries)
+    if mode == "parallel":
+        # CLIP outputs are unused, so only the model strength matters
+        stack = [entry for entry in stack if entry[1]]
+
+    terminal = chain[-1]
+    model_taps = consumers.get((terminal, 0), [])
+    clip_taps = consumers.get((terminal, 1), [])
+    for node_id in chain:
+        del workflow[node_id]
+
+    previous_model, previous_clip = base_model, base_clip
+    for node_id, (name, model_strength, clip_strength) in zip(chain, stack):
+        inputs = {"lora_name": name, "strength_model": model_strength, "model": previous_model}
+        if mode != "model_only":
+            inputs.update(strength_clip=clip_strength, clip=previous_clip)
+        workflow[node_id] = {"class_type": class_type, "inputs": inputs}
+        previous_model = [node_id, 0]
+        if mode == "chained":
+            previous_clip = [node_id, 1]
+
+    for consumer_id, name in model_taps:
+        workflow[consumer_id]["inputs"][name] = previous_model
+    for consumer_id, name in clip_taps:
+        workflow[consumer_id]["inputs"][name] = previous_clip
+
+
+def renumber_nodes(workflow: Dict) -> Dict:
+    """Workflow with node IDs 1..n assigned from its structure alone
+
+    IDs follow a depth-first walk back from the output nodes, inputs taken
+    in name order, so graphs built the same way get the same IDs whatever
+    IDs their generator picked, and the IDs do not change with prompt text,
+    seeds or other literal values.
+    """
+    if "prompt" in workflow and isinstance(workflow["prompt"], dict):
+        return {**workflow, "prompt": renumber_nodes(workflow["prompt"])}
+
+    nodes = {str(node_id): node for node_id, node in workflow.items()}
+    shapes: Dict[str, str] = {}
+
+    def shape(node_id: str, visiting: Tuple[str, ...] = ()) -> str:
+        if node_id not in shapes:
+            if node_id in visiting or node_id not in nodes:
+                return "?"
+            node = nodes[node_id]
+            parts = []
+            for name, value in sorted(node.get("inputs", {}).items()):
+                if is_link(value):
+                    parts.append(f"{name}<{shape(str(value[0]), visiting + (node_id,))}.{value[1]}>")
+                else:
+                    parts.append(name)
+            shapes[node_id] = f"{node.get('class_type')}({','.join(parts)})"
+        return shapes[node_id]
+
+    order: List[str] = []
+    placed: Set[str] = set()
+
+    def place(node_id: str):
+        stack = [(node_id, iter(sorted(nodes[node_id].get("inputs", {}).items())))]
+        placed.add(node_id)
+        while stack:
+            current, items = stack[-1]
+            for _, value in items:
+                source = str(value[0]) if is_link(value) else None
+                if source in nodes and source not in placed:
+                    placed.add(source)
+                    stack.append((source, iter(sorted(nodes[source].get("inputs", {}).items()))))
+                    break
+            else:
+                order.append(current)
+                stack.pop()
+
+    roots = output_nodes(nodes) or list(nodes)
+    for root in sorted(roots, key=lambda node_id: shape(node_id)):
+        if root not in placed:
+            place(root)
+    for node_id in nodes:
+        if node_id not in placed:
+            place(node_id)
+
+    new_ids = {old: str(index) for index, old in enumerate(order, 1)}
+    renumbered = {}
+    for old in order:
+        node = nodes[old]
+        inputs = {name: [new_ids.get(str(value[0]), str(value[0])), value[1]] if is_link(value) else value
+                  for name, value in node.get("inputs", {}).items()}
+        renumbered[new_ids[old]] = {**node, "inputs": inputs}
+    return renumbered
+
+
+def canonicalize_workflow(workflow: Dict) -> Dict:
+    """LoRA stacks canonicalized and nodes renumbered (see both passes)"""
+    return renumber_nodes(canonicalize_lora_stacks(workflow))
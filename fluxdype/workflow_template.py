@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Precompiled Workflow Templates
+Compiles a workflow once into the JSON text of its /prompt payload, split at
+declared parameter slots (prompt, seed, steps, resolution, LoRA strengths,
+filename_prefix, ...). Rendering a job only encodes the slot values and joins
+pre-encoded byte fragments: no node dicts are rebuilt, copied or
+re-serialized per image.
+
+Slots are either declared by path or written into the workflow directly:
+
+    template = WorkflowTemplate.for_prompt(workflow)          # standard slots
+    template = WorkflowTemplate.for_prompt(workflow, {"seed": [("6", "seed")]})
+    workflow["2"]["inputs"]["text"] = f"{slot('prompt')}, 8k uhd"
+    payload = template.render(prompt="a red fox", seed=42, client_id=client_id)
+    client.submit(payload)  # bytes are posted as-is
+
+A slot that is a whole JSON value takes any JSON value; a slot inside a
+string takes text and is escaped into it.
+"""
+
+import json
+import re
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from model_scheduler import LORA_LOADERS, POWER_LORA_LOADER
+from workflow_graph import is_link
+
+# Marks a slot inside strings; JSON always escapes control characters
+TEXT_MARK = "\x00"
+VALUE_MARK = "\x01"
+_SLOT_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_SPLIT = re.compile(r'"\\u0001([A-Za-z0-9_]+)\\u0001"|\\u0000([A-Za-z0-9_]+)\\u0000')
+
+KeyPath = Sequence[Any]
+
+# Conditioning inputs followed from a sampler back to its prompt text
+CONDITIONING_INPUTS = ("conditioning", "positive", "guider", "conditioning_to", "conditioning_1")
+SAMPLERS = ("KSampler", "KSamplerAdvanced", "SamplerCustom", "SamplerCustomAdvanced")
+LATENT_SOURCES = ("EmptyLatentImage", "EmptySD3LatentImage", "EmptyHunyuanLatentVideo")
+
+
+def slot(name: str) -> str:
+    """Placeholder for a template parameter, usable as a value or inside text"""
+    if not _SLOT_NAME.match(name):
+        raise ValueError(f"invalid slot name: {name!r}")
+    return f"{TEXT_MARK}{name}{TEXT_MARK}"
+
+
+def _get(document: Any, path: KeyPath) -> Any:
+    for key in path:
+        document = document[key]
+    return document
+
+
+def _set(document: Any, path: KeyPath, value: Any):
+    _get(document, path[:-1])[path[-1]] = value
+
+
+def _mark_values(value: Any) -> Any:
+    """Copy of a document with whole-value slots told apart from text slots"""
+    if isinstance(value, dict):
+        return {key: _mark_values(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_mark_values(item) for item in value]
+    if (isinstance(value, str) and len(value) > 2 and value[0] == TEXT_MARK
+            and value[-1] == TEXT_MARK and TEXT_MARK not in value[1:-1]):
+        return f"{VALUE_MARK}{value[1:-1]}{VALUE_MARK}"
+    return value
+
+
+class WorkflowTemplate:
+    """A JSON document compiled into byte fragments around named slots"""
+
+    def __init__(self, document: Any, slots: Optional[Dict[str, Iterable[KeyPath]]] = None,
+                 indent: Optional[int] = None, ensure_ascii: bool = False):
+        self.ensure_ascii = ensure_ascii
+        self._quote = encode_basestring_ascii if ensure_ascii else encode_basestring
+        self.defaults: Dict[str, Any] = {}
+        document = _mark_values(self._bind(document, slots or {}))
+        separators = (",", ":") if indent is None else (",", ": ")
+        text = json.dumps(document, indent=indent, ensure_ascii=ensure_ascii, separators=separators)
+
+        parts = _SPLIT.split(text)
+        # re.split with two groups yields: static, value name, text name, static, ...
+        self._head = parts[0].encode("utf-8")
+        self._ops: List[Tuple[str, bool, bytes]] = []
+        for i in range(1, len(parts), 3):
+            value_name, text_name, static = parts[i], parts[i + 1], parts[i + 2]
+            self._ops.append((value_name or text_name, bool(value_name), static.encode("utf-8")))
+        self.slots = tuple(dict.fromkeys(name for name, _, _ in self._ops))
+
+    def _bind(self, document: Any, slots: Dict[str, Iterable[KeyPath]]) -> Any:
+        """Copy of document with each declared path replaced by its slot"""
+        if not slots:
+            return document
+        document = json.loads(json.dumps(document))
+        for name, paths in slots.items():
+            for path in paths:
+                self.defaults.setdefault(name, _get(document, path))
+                _set(document, path, slot(name))
+        return document
+
+    @classmethod
+    def for_prompt(cls, workflow: Dict, slots: Optional[Dict[str, Iterable[KeyPath]]] = None
+                   ) -> "WorkflowTemplate":
+        """Template of a /prompt payload for an API-format workflow
+
+        slots maps slot name -> (node_id, input_name[, key...]) paths; by
+        default the standard slots found by standard_slots(). The payload
+        always has a client_id slot.
+        """
+        if "prompt" in workflow and isinstance(workflow["prompt"], dict):
+            workflow = workflow["prompt"]
+        if slots is None:
+            slots = standard_slots(workflow)
+        paths = {name: [("prompt", str(path[0]), "inputs", *path[1:]) for path in node_paths]
+                 for name, node_paths in slots.items()}
+        return cls({"prompt": workflow, "client_id": slot("client_id")}, paths)
+
+    def _encode(self, value: Any, whole: bool) -> bytes:
+        # Fast paths for the common scalar types; json.dumps for the rest
+        kind = type(value)
+        if kind is str:
+            text = self._quote(value)
+            return (text if whole else text[1:-1]).encode("utf-8")
+        if not whole:
+            return self._quote(str(value))[1:-1].encode("utf-8")
+        if kind is int:
+            return str(value).encode("ascii")
+        return json.dumps(value, ensure_ascii=self.ensure_ascii).encode("utf-8")
+
+    def render(self, **values: Any) -> bytes:
+        """Payload bytes with every slot filled (unset slots take their default)"""
+        out = [self._head]
+        defaults = self.defaults
+        encode = self._encode
+        for name, whole, static in self._ops:
+            if name in values:
+                value = values[name]
+            elif name in defaults:
+                value = defaults[name]
+            else:
+                raise KeyError(f"no value for template slot '{name}'")
+            out.append(encode(value, whole))
+            out.append(static)
+        return b"".join(out)
+
+    def document(self, **values: Any) -> Any:
+        """Rendered document as Python objects (for validation, caching, ...)"""
+        return json.loads(self.render(**values))
+
+
+def _trace_text(workflow: Dict, value: Any, depth: int = 0) -> Optional[str]:
+    """Node ID of the text encoder a conditioning link comes from"""
+    if not is_link(value) or depth > 16:
+        return None
+    node_id = str(value[0])
+    node = workflow.get(node_id)
+    if node is None:
+        return None
+    inputs = node.get("inputs", {})
+    if isinstance(inputs.get("text"), str):
+        return node_id
+    for name in CONDITIONING_INPUTS:
+        found = _trace_text(workflow, inputs.get(name), depth + 1)
+        if found:
+            return found
+    return None
+
+
+def standard_slots(workflow: Dict) -> Dict[str, List[KeyPath]]:
+    """Slots for the parameters batch scripts vary, found in an API workflow
+
+    seed, steps, cfg, guidance, prompt, negative, width, height, batch_size,
+    filename_prefix and lora_<n>_strength (in node order); only literal
+    inputs are bound, never links.
+    """
+    slots: Dict[str, List[KeyPath]] = {}
+
+    def bind(name: str, node_id: str, input_name: str):
+        value = workflow[node_id].get("inputs", {}).get(input_name)
+        if value is not None and not is_link(value):
+            slots.setdefault(name, []).append((node_id, input_name))
+
+    lora_count = 0
+    for node_id, node in workflow.items():
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        if class_type in SAMPLERS or class_type in ("RandomNoise", "BasicScheduler"):
+            bind("seed", node_id, "seed")
+            bind("seed", node_id, "noise_seed")
+            bind("steps", node_id, "steps")
+            bind("cfg", node_id, "cfg")
+            positive = _trace_text(workflow, inputs.get("positive") or inputs.get("guider"))
+            negative = _trace_text(workflow, inputs.get("negative"))
+            if positive:
+                bind("prompt", positive, "text")
+            if negative and negative != positive:
+                bind("negative", negative, "text")
+        elif class_type == "FluxGuidance":
+            bind("guidance", node_id, "guidance")
+        elif class_type in LATENT_SOURCES:
+            for name in ("width", "height", "batch_size"):
+                bind(name, node_id, name)
+        elif class_type == "SaveImage":
+            bind("filename_prefix", node_id, "filename_prefix")
+        elif class_type in LORA_LOADERS:
+            lora_count += 1
+            bind(f"lora_{lora_count}_strength", node_id, "strength_model")
+            bind(f"lora_{lora_count}_strength", node_id, "strength_clip")
+        elif class_type == POWER_LORA_LOADER:
+            for key, value in inputs.items():
+                if key.startswith("lora_") and isinstance(value, dict) and "strength" in value:
+                    lora_count += 1
+                    slots.setdefault(f"lora_{lora_count}_strength", []).append((node_id, key, "strength"))
+    return slots
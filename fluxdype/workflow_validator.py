@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Offline Workflow Validator
+Checks an API-format (or UI-format) workflow against the cached /object_info
+schema and the local model folders before it is submitted, so broken jobs
+are rejected in milliseconds instead of after a round trip to /prompt or,
+worse, after waiting for a queue slot.
+
+Checks, reported per node in the same shape as the server's node_errors:
+  - unknown class_type
+  - links to missing nodes, to output slots the source does not have, or
+    of the wrong type (MODEL into a CLIP input, ...)
+  - missing required inputs and dependency cycles
+  - values outside a combo's options or an INT/FLOAT input's min/max
+  - model files (checkpoints, unets, encoders, VAEs, LoRAs) not on disk
+  - no output node at all
+Nodes no output depends on are reported as warnings (see workflow_graph.py).
+
+    validator = WorkflowValidator.from_server()
+    result = validator.validate(workflow)
+    if not result.ok:
+        print(result.summary())
+
+    python workflow_validator.py *.json
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from comfy_client import COMFY_URL, ComfyClient
+from model_scheduler import POWER_LORA_LOADER
+from result_cache import DEFAULT_MODELS_DIR, MODEL_EXTENSIONS
+from workflow_convert import ObjectInfoCache, WorkflowConverter, input_spec, is_ui_workflow
+from workflow_graph import describe_removed, is_link as _is_link, prune_unreachable
+
+# Model input name -> model folders ComfyUI searches for it
+MODEL_INPUT_FOLDERS = {
+    "ckpt_name": ("checkpoints",),
+    "unet_name": ("diffusion_models", "unet"),
+    "clip_name": ("text_encoders", "clip"),
+    "clip_name1": ("text_encoders", "clip"),
+    "clip_name2": ("text_encoders", "clip"),
+    "clip_name3": ("text_encoders", "clip"),
+    "vae_name": ("vae",),
+    "lora_name": ("loras",),
+    "control_net_name": ("controlnet",),
+}
+
+ANY_TYPE = "*"
+
+
+class WorkflowValidationError(ValueError):
+    """A workflow that failed offline validation"""
+
+    def __init__(self, result: "ValidationResult"):
+        super().__init__(result.summary())
+        self.result = result
+
+    @property
+    def node_errors(self) -> Dict:
+        return self.result.node_errors
+
+
+class ValidationResult:
+    """Problems found in one workflow, shaped like the server's /prompt errors"""
+
+    def __init__(self):
+        self.errors: List[Dict] = []  # prompt-level (no output node, unparseable)
+        self.node_errors: Dict[str, Dict] = {}
+        self.warnings: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.node_errors
+
+    def add(self, node_id: str, class_type: Optional[str], kind: str, message: str,
+            input_name: Optional[str] = None, details: str = ""):
+        error = {"type": kind, "message": message, "details": details,
+                 "extra_info": {"input_name": input_name} if input_name else {}}
+        if node_id is None:
+            self.errors.append(error)
+            return
+        entry = self.node_errors.setdefault(
+            str(node_id), {"errors": [], "dependent_outputs": [], "class_type": class_type}
+        )
+        entry["errors"].append(error)
+
+    def messages(self) -> List[str]:
+        lines = [error["message"] for error in self.errors]
+        for node_id, entry in self.node_errors.items():
+            for error in entry["errors"]:
+                detail = f": {error['details']}" if error["details"] else ""
+                lines.append(f"#{node_id} {entry['class_type']}: {error['message']}{detail}")
+        return lines
+
+    def summary(self, limit: int = 5) -> str:
+        lines = self.messages()
+        more = f" (+{len(lines) - limit} more)" if len(lines) > limit else ""
+        return "; ".join(lines[:limit]) + more
+
+
+class ModelInventory:
+    """Model files on disk, indexed once per folder by ComfyUI-style name"""
+
+    def __init__(self, models_dir: Path = DEFAULT_MODELS_DIR):
+        self.models_dir = Path(models_dir)
+        self._folders: Dict[str, Set[str]] = {}
+
+    @property
+    def available(self) -> bool:
+        return self.models_dir.is_dir()
+
+    def folder(self, name: str) -> Set[str]:
+        """Names (relative, forward slashes) of the model files in one folder"""
+        if name not in self._folders:
+            root = self.models_dir / name
+            names = set()
+            for dirpath, _, filenames in os.walk(root, followlinks=True):
+                relative = Path(dirpath).relative_to(root)
+                for filename in filenames:
+                    if filename.lower().endswith(MODEL_EXTENSIONS):
+                        names.add((relative / filename).as_posix())
+            self._folders[name] = names
+        return self._folders[name]
+
+    def has(self, input_name: str, value: str) -> bool:
+        wanted = value.replace("\\", "/")
+        return any(wanted in self.folder(folder) for folder in MODEL_INPUT_FOLDERS[input_name])
+
+
+def _types_match(output_type: Any, input_type: Any) -> bool:
+    if not isinstance(output_type, str) or not isinstance(input_type, str):
+        return True  # combos and exotic specs: leave it to the server
+    if ANY_TYPE in (output_type, input_type):
+        return True
+    return bool(set(output_type.split(",")) & set(input_type.split(",")))
+
+
+class WorkflowValidator:
+    """Pre-submission checks of workflows against a node schema and model inventory"""
+
+    def __init__(self, object_info: Optional[Dict] = None,
+                 inventory: Optional[ModelInventory] = None):
+        self.object_info = object_info or {}
+        self.inventory = inventory if inventory is not None else ModelInventory()
+        self._converter = WorkflowConverter(self.object_info)
+
+    @classmethod
+    def from_server(cls, base_url: str = COMFY_URL, refresh: bool = False,
+                    client: Optional[ComfyClient] = None,
+                    models_dir: Path = DEFAULT_MODELS_DIR) -> "WorkflowValidator":
+        object_info = ObjectInfoCache(base_url).load(refresh=refresh, client=client)
+        return cls(object_info, ModelInventory(models_dir))
+
+    def validate(self, workflow: Dict) -> ValidationResult:
+        """Every problem found in a workflow (API or UI format)"""
+        result = ValidationResult()
+        if "prompt" in workflow and isinstance(workflow["prompt"], dict):
+            workflow = workflow["prompt"]
+        if is_ui_workflow(workflow):
+            workflow = self._converter.convert(workflow)
+            result.warnings.extend(self._converter.warnings)
+            self._converter.warnings = []
+
+        # Malformed nodes are reported once and left out of every other check
+        nodes = {}
+        for node_id, node in workflow.items():
+            if isinstance(node, dict) and "class_type" in node:
+                nodes[str(node_id)] = node
+            else:
+                result.add(str(node_id), None, "invalid_prompt", "node has no class_type")
+        has_output = False
+        for node_id, node in nodes.items():
+            class_type = node["class_type"]
+            inputs = node.get("inputs", {})
+            info = self.object_info.get(class_type)
+
+            if info is None and self.object_info:
+                result.add(node_id, class_type, "invalid_prompt",
+                           f"unknown class_type '{class_type}' (custom node not installed?)")
+            if info is not None and info.get("output_node"):
+                has_output = True
+
+            for name, value in inputs.items():
+                if _is_link(value):
+                    self._check_link(result, nodes, node_id, class_type, info, name, value)
+            if info is not None:
+                self._check_inputs(result, node_id, class_type, info, inputs)
+            self._check_models(result, node_id, class_type, inputs)
+
+        if self.object_info and nodes and not has_output:
+            result.add(None, None, "prompt_no_outputs", "workflow has no output node (SaveImage, ...)")
+        _, unused = prune_unreachable(nodes, self.object_info)
+        if unused:
+            result.warnings.append(f"no output depends on {describe_removed(unused)}")
+        self._check_cycles(result, nodes)
+        return result
+
+    def check(self, workflow: Dict) -> ValidationResult:
+        """validate(), raising WorkflowValidationError if anything is wrong"""
+        result = self.validate(workflow)
+        if not result.ok:
+            raise WorkflowValidationError(result)
+        return result
+
+    # ------------------------------------------------------------------
+    # Individual checks
+    # ------------------------------------------------------------------
+
+    def _check_link(self, result: ValidationResult, nodes: Dict, node_id: str, class_type: str,
+                    info: Optional[Dict], name: str, link: List):
+        source_id, slot = str(link[0]), link[1]
+        source = nodes.get(source_id)
+        if source is None:
+            result.add(node_id, class_type, "dangling_link",
+                       f"input '{name}' links to missing node #{source_id}", name)
+            return
+        source_info = self.object_info.get(source.get("class_type"))
+        if source_info is None:
+            return
+        outputs = source_info.get("output", [])
+        if not 0 <= slot < len(outputs):
+            result.add(node_id, class_type, "bad_linked_output",
+                       f"input '{name}' links to output {slot} of #{source_id} "
+                       f"{source['class_type']}, which has {len(outputs)} outputs", name)
+            return
+        if info is None:
+            return
+        spec = info.get("input", {}).get("required", {}).get(name) or \
+            info.get("input", {}).get("optional", {}).get(name)
+        input_type, _ = input_spec(spec)
+        if not _types_match(outputs[slot], input_type):
+            result.add(node_id, class_type, "return_type_mismatch",
+                       f"input '{name}' expects {input_type} but #{source_id} "
+                       f"{source['class_type']} output {slot} is {outputs[slot]}", name)
+
+    def _check_inputs(self, result: ValidationResult, node_id: str, class_type: str,
+                      info: Dict, inputs: Dict):
+        schema = info.get("input", {})
+        for section in ("required", "optional"):
+            for name, spec in schema.get(section, {}).items():
+                if name not in inputs:
+                    if section == "required":
+                        result.add(node_id, class_type, "required_input_missing",
+                                   f"required input '{name}' is missing", name)
+                    continue
+                value = inputs[name]
+                if _is_link(value):
+                    continue
+                kind, options = input_spec(spec)
+                if isinstance(kind, list):
+                    if kind and value not in kind and not self._model_input(name):
+                        result.add(node_id, class_type, "value_not_in_list",
+                                   f"'{name}' value '{value}' is not one of the allowed options", name)
+                elif kind in ("INT", "FLOAT"):
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        result.add(node_id, class_type, "invalid_input_type",
+                                   f"'{name}' must be a number, got {type(value).__name__}", name)
+                        continue
+                    if "min" in options and value < options["min"]:
+                        result.add(node_id, class_type, "value_smaller_than_min",
+                                   f"'{name}' value {value} is below the minimum {options['min']}", name)
+                    if "max" in options and value > options["max"]:
+                        result.add(node_id, class_type, "value_bigger_than_max",
+                                   f"'{name}' value {value} is above the maximum {options['max']}", name)
+
+    def _model_input(self, name: str) -> bool:
+        # On-disk inventory is fresher than a cached schema's combo list
+        return name in MODEL_INPUT_FOLDERS and self.inventory.available
+
+    def _check_models(self, result: ValidationResult, node_id: str, class_type: str, inputs: Dict):
+        if not self.inventory.available:
+            return
+        wanted = [(name, value) for name, value in inputs.items()
+                  if name in MODEL_INPUT_FOLDERS and isinstance(value, str)]
+        if class_type == POWER_LORA_LOADER:
+            wanted += [("lora_name", row["lora"]) for row in inputs.values()
+                       if isinstance(row, dict) and row.get("on", True)
+                       and row.get("lora") not in (None, "", "None")]
+        for name, value in wanted:
+            if not self.inventory.has(name, value):
+                folders = "/".join(MODEL_INPUT_FOLDERS[name])
+                result.add(node_id, class_type, "model_not_found",
+                           f"model file '{value}' not found in models/{folders}", name)
+
+    @staticmethod
+    def _check_cycles(result: ValidationResult, nodes: Dict):
+        state: Dict[str, int] = {}  # 1 = on the current path, 2 = done
+
+        for start in nodes:
+            if start in state:
+                continue
+            stack = [(start, iter(nodes[start].get("inputs", {}).values()))]
+            state[start] = 1
+            while stack:
+                node_id, values = stack[-1]
+                for value in values:
+                    if not _is_link(value) or str(value[0]) not in nodes:
+                        continue
+                    source = str(value[0])
+                    if state.get(source) == 1:
+                        result.add(node_id, nodes[node_id].get("class_type"), "dependency_cycle",
+                                   f"cycle through node #{source}")
+                    elif source not in state:
+                        state[source] = 1
+                        stack.append((source, iter(nodes[source].get("inputs", {}).values())))
+                        break
+                else:
+                    state[node_id] = 2
+                    stack.pop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate ComfyUI workflows before submitting them")
+    parser.add_argument("workflows", nargs="+", help="API- or UI-format workflow files")
+    parser.add_argument("--url", type=str, default=COMFY_URL, help="Server to take the schema from")
+    parser.add_argument("--refresh", action="store_true", help="Re-fetch /object_info even if cached")
+    parser.add_argument("--models", type=str, default=str(DEFAULT_MODELS_DIR),
+                        help="ComfyUI models folder to check model files against")
+    args = parser.parse_args()
+
+    validator = WorkflowValidator.from_server(args.url, refresh=args.refresh, models_dir=Path(args.models))
+    if not validator.object_info:
+        print("⚠ No /object_info schema (server offline, nothing cached); only links and models checked")
+    if not validator.inventory.available:
+        print(f"⚠ Models folder {args.models} not found; model files not checked")
+
+    failed = 0
+    start = time.perf_counter()
+    for path in map(Path, args.workflows):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = validator.validate(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"✗ {path.name}: {e}")
+            failed += 1
+            continue
+        for warning in result.warnings:
+            print(f"⚠ {path.name}: {warning}")
+        if result.ok:
+            print(f"✓ {path.name}")
+            continue
+        failed += 1
+        print(f"✗ {path.name}")
+        for line in result.messages():
+            print(f"    {line}")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{len(args.workflows) - failed}/{len(args.workflows)} valid ({elapsed * 1000:.1f} ms)")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()